@@ -1,4 +1,3 @@
 from . import figaro
-from . import figaroSupport
 
-__all__ = ["figaro", "figaroSupport"]
+__all__ = ["figaro"]
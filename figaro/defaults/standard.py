@@ -6,3 +6,23 @@ subsample = -1
 percentile = 83
 forwardPrimerLength = 19
 reversePrimerLength = 19
+lite = False
+fullGridSearch = False
+expectedErrorMatrices = False
+maxExpectedErrorSearchLimit = 0
+qualityReport = False
+compositionReport = False
+truncQ = []
+estimateUniqueSequences = False
+estimateMergeRate = False
+estimateAmpliconLength = False
+singleEnd = False
+minimumReadLength = 0
+topResultCount = 0
+paretoFront = False
+bootstrapReplicates = 0
+bootstrapSamples = False
+influenceReport = False
+sampleRetentionReport = False
+equalSampleWeights = False
+retentionPrecision = 1.0
@@ -108,12 +108,19 @@ class ParallelExpectedErrorAverageAgent(object):
 
 class ParallelExpectedErrorPercentileAgent(object):
 
-    def __init__(self, subsample: int = 0, percentile: int = 83, primerLength: int = 0):
+    def __init__(
+        self,
+        subsample: int = 0,
+        percentile: int = 83,
+        primerLength: int = 0,
+        readLimit: int = 0,
+    ):
         if subsample == 0:
             subsample = 1
         self.subsample = subsample
         self.percentile = percentile
         self.primerLength = primerLength
+        self.readLimit = readLimit
 
     def calculateAverageExpectedError(self, fastq: fileNamingStandards.NamingStandard):
         percentileExpectedError = makeExpectedErrorPercentileArrayForFastq(
@@ -121,47 +128,46 @@ class ParallelExpectedErrorPercentileAgent(object):
         )
         return fastq, percentileExpectedError
 
+    def makeExpectedErrorHistogram(self, fastq: fileNamingStandards.NamingStandard):
+        expectedErrorHistogram = fastqAnalysis.buildExpectedErrorHistogram(
+            fastq.filePath,
+            subsample=self.subsample,
+            leftTrim=self.primerLength,
+            readLimit=self.readLimit,
+        )
+        return fastq, expectedErrorHistogram
+
 
 def makeExpectedErrorAverageArrayForFastq(
     path: str, subsample: int = 0, primerLength: int = 0
 ):
-    expectedErrorMatrix = fastqAnalysis.buildExpectedErrorMatrix(
-        path, subsample=subsample, leftTrim=primerLength
+    return numpy.array(
+        fastqAnalysis.makeAverageExpectedErrorLine(
+            path, subsample=subsample, leftTrim=primerLength
+        )
     )
-    meanArray = numpy.mean(expectedErrorMatrix, axis=0)
-    return meanArray
 
 
 def makeExpectedErrorPercentileArrayForFastq(
     path: str, subsample: int = 0, percentile: int = 83, primerLength: int = 0
 ):
-    expectedErrorMatrix = fastqAnalysis.buildExpectedErrorMatrix(
+    expectedErrorHistogram = fastqAnalysis.buildExpectedErrorHistogram(
         path, subsample=subsample, leftTrim=primerLength
     )
-    percentileList = []
-    for positionArray in expectedErrorMatrix.transpose():
-        percentileList.append(numpy.percentile(positionArray, percentile))
-    return numpy.array(percentileList)
+    return expectedErrorHistogram.calculatePercentiles(percentile)
 
 
 def makeExpectedErrorPercentileArrayForFastqList(
     fastqList: list, subsample: int = 0, percentile: int = 83, primerLength: int = 0
 ):
-    try:
-        from . import easyMultiprocessing
-    except ImportError:
-        import easyMultiprocessing
-    parallelAgent = ParallelExpectedErrorPercentileAgent(
-        subsample, percentile, primerLength
-    )
-    expectedErrorReturns = easyMultiprocessing.parallelProcessRunner(
-        parallelAgent.calculateAverageExpectedError, fastqList
+    """
+    Finds the pooled percentile of expected error at each position across all of the given files.
+    Each file is reduced to a small per-position histogram in parallel, and the histograms are added together before reading off the percentile.
+    """
+    combinedHistogram = makeCombinedExpectedErrorHistogramForFastqList(
+        fastqList, subsample, primerLength
     )
-    averageExpectedErrorMatrix = numpy.stack(
-        [expectedErrorArray[1] for expectedErrorArray in expectedErrorReturns]
-    )
-    averageExpectedErrorArray = numpy.mean(averageExpectedErrorMatrix, axis=0)
-    return averageExpectedErrorArray
+    return combinedHistogram.calculatePercentiles(percentile)
 
 
 def makeExpectedErrorPercentileArraysForDirectory(
@@ -247,6 +253,24 @@ def calculateExpectedErrorCurvesForFastqFolder(
     return forwardCurve, reverseCurve
 
 
+def makeCombinedExpectedErrorHistogramForFastqList(
+    fastqList: list, subsample: int = 0, primerLength: int = 0, readLimit: int = 0
+):
+    try:
+        from . import easyMultiprocessing
+    except ImportError:
+        import easyMultiprocessing
+    parallelAgent = ParallelExpectedErrorPercentileAgent(
+        subsample, primerLength=primerLength, readLimit=readLimit
+    )
+    expectedErrorHistograms = easyMultiprocessing.parallelProcessRunner(
+        parallelAgent.makeExpectedErrorHistogram, fastqList
+    )
+    return fastqAnalysis.combineExpectedErrorHistograms(
+        [histogram[1] for histogram in expectedErrorHistograms]
+    )
+
+
 def calculateExpectedErrorCurvesForFastqList(
     fastqList,
     subsample: int = 0,
@@ -256,35 +280,101 @@ def calculateExpectedErrorCurvesForFastqList(
     forwardPrimerLength: int = 0,
     reversePrimerLength: int = 0,
 ):
+    return calculateExpectedErrorCurvesForFastqListAtPercentiles(
+        fastqList,
+        subsample,
+        [percentile],
+        makePNG,
+        sampleGroupID,
+        forwardPrimerLength,
+        reversePrimerLength,
+    )[0]
+
+
+def calculateExpectedErrorCurvesForFastqListAtPercentiles(
+    fastqList,
+    subsample: int = 0,
+    percentiles: collections.Iterable = (83,),
+    makePNG: bool = False,
+    sampleGroupID: str = None,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+    readLimit: int = 0,
+):
+    """
+    Fits forward and reverse expected error curves for several percentiles, scanning the files only once.
+    :param readLimit: read at most this many reads from each file, spread across it (0 to read them all)
+    :return: list of (forward curve, reverse curve) tuples in the same order as the percentiles
+    """
     if not sampleGroupID:
         sampleGroupID = fastqList[0].group
     forwardFastqs = [fastq for fastq in fastqList if fastq.direction == 1]
     reverseFastqs = [fastq for fastq in fastqList if fastq.direction == 2]
-    forwardExpectedErrorArray = makeExpectedErrorPercentileArrayForFastqList(
-        forwardFastqs, subsample, percentile, forwardPrimerLength
+    forwardHistogram = makeCombinedExpectedErrorHistogramForFastqList(
+        forwardFastqs, subsample, forwardPrimerLength, readLimit
     )
-    reverseExpectedErrorArray = makeExpectedErrorPercentileArrayForFastqList(
-        reverseFastqs, subsample, percentile, reversePrimerLength
-    )
-    forwardPositions, forwardValues = makeXAndYValuesForPositionArray(
-        forwardExpectedErrorArray
+    reverseHistogram = makeCombinedExpectedErrorHistogramForFastqList(
+        reverseFastqs, subsample, reversePrimerLength, readLimit
     )
-    reversePositions, reverseValues = makeXAndYValuesForPositionArray(
-        reverseExpectedErrorArray
-    )
-    forwardCurve = fitExponentialCurve(
-        forwardPositions,
-        forwardValues,
-        makePNG,
-        "%s forward reads. %s percentile" % (sampleGroupID, ordinal(percentile)),
-    )
-    reverseCurve = fitExponentialCurve(
-        reversePositions,
-        reverseValues,
-        makePNG,
-        "%s reverse reads. %s percentile" % (sampleGroupID, ordinal(percentile)),
+    curves = []
+    for percentile in percentiles:
+        forwardPositions, forwardValues = makeXAndYValuesForPositionArray(
+            forwardHistogram.calculatePercentiles(percentile)
+        )
+        reversePositions, reverseValues = makeXAndYValuesForPositionArray(
+            reverseHistogram.calculatePercentiles(percentile)
+        )
+        forwardCurve = fitExponentialCurve(
+            forwardPositions,
+            forwardValues,
+            makePNG,
+            "%s forward reads. %s percentile" % (sampleGroupID, ordinal(percentile)),
+        )
+        reverseCurve = fitExponentialCurve(
+            reversePositions,
+            reverseValues,
+            makePNG,
+            "%s reverse reads. %s percentile" % (sampleGroupID, ordinal(percentile)),
+        )
+        curves.append((forwardCurve, reverseCurve))
+    return curves
+
+
+def calculateExpectedErrorCurvesForOneDirectionAtPercentiles(
+    fastqList,
+    subsample: int = 0,
+    percentiles: collections.Iterable = (83,),
+    makePNG: bool = False,
+    sampleGroupID: str = None,
+    primerLength: int = 0,
+    directionName: str = "forward",
+    readLimit: int = 0,
+):
+    """
+    Fits expected error curves for several percentiles from the files of a single read direction, scanning them only once. Used for single-end data.
+    :param readLimit: read at most this many reads from each file, spread across it (0 to read them all)
+    :return: list of curves in the same order as the percentiles
+    """
+    if not sampleGroupID:
+        sampleGroupID = fastqList[0].group
+    histogram = makeCombinedExpectedErrorHistogramForFastqList(
+        fastqList, subsample, primerLength, readLimit
     )
-    return forwardCurve, reverseCurve
+    curves = []
+    for percentile in percentiles:
+        positions, values = makeXAndYValuesForPositionArray(
+            histogram.calculatePercentiles(percentile)
+        )
+        curves.append(
+            fitExponentialCurve(
+                positions,
+                values,
+                makePNG,
+                "%s %s reads. %s percentile"
+                % (sampleGroupID, directionName, ordinal(percentile)),
+            )
+        )
+    return curves
 
 
 def ordinal(number: int):
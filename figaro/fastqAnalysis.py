@@ -1,6 +1,23 @@
 import logging
+import numpy
 
 logger = logging.getLogger(__name__)
+expectedErrorHistogramLowestValue = 1e-4
+expectedErrorHistogramDecades = 7
+expectedErrorHistogramBinsPerDecade = 100
+uniqueSequenceSketchInterval = 10
+uniqueSequenceSketchPrecision = 12
+primerCheckSearchLength = 40
+primerCheckKmerLength = 4
+# bits, allows a primer with a couple of 2-fold degenerate bases in one k-mer
+primerCheckEntropyLimit = 2.5
+# bits, the most a 2-fold degenerate base can have
+primerCheckBaseEntropyLimit = 1.0
+try:
+    from . import qualityScoreHandler
+    from . import fastqHandler
+except ImportError:
+    import qualityScoreHandler, fastqHandler
 
 
 def buildQualityMatrix(path: str):
@@ -21,109 +38,955 @@ def buildQualityMatrixPaired(forward: str, reverse: str):
     return buildQualityMatrix(forward), buildQualityMatrix(reverse)
 
 
+def convertExpectedErrorBlock(expectedErrorBlock, fixedPoint: bool = False):
+    if fixedPoint:
+        return qualityScoreHandler.expectedErrorToFixedPoint(
+            expectedErrorBlock
+        )  # exact to 1/256 for comparisons against max expected error values
+    return expectedErrorBlock.astype(
+        "float16"
+    )  # low precision floating point. Usually users are looking for whole numbers anyway
+
+
+def stackExpectedErrorBlocks(expectedErrorBlocks: list, fixedPoint: bool = False):
+    import numpy
+
+    if fixedPoint:
+        dataType = "uint16"
+        padValue = qualityScoreHandler.expectedErrorFixedPointMax
+    else:
+        dataType = "float16"
+        padValue = numpy.inf
+    if not expectedErrorBlocks:
+        return numpy.array([], dataType)
+    width = max([block.shape[1] for block in expectedErrorBlocks])
+    for index, block in enumerate(expectedErrorBlocks):
+        if block.shape[1] < width:
+            # positions past the end of a short read can never pass a filter
+            expectedErrorBlocks[index] = numpy.pad(
+                block, ((0, 0), (0, width - block.shape[1])), constant_values=padValue
+            )
+    return numpy.asfortranarray(numpy.concatenate(expectedErrorBlocks))
+
+
 def buildExpectedErrorMatrix(
     path: str,
-    superLean: bool = False,
+    fixedPoint: bool = False,
+    startPosition: int = 0,
+    subsample: int = 0,
+    leftTrim: int = 0,
+    rightTrim: int = 0,
+):
+    fastq = fastqHandler.FastqFile(
+        path, depth=0, subsample=subsample, leftTrim=leftTrim, rightTrim=rightTrim
+    )
+    expectedErrorBlocks = []
+    for block in fastq.readBlocks():
+        expectedErrorBlock = qualityScoreHandler.cumulativeExpectedErrorBlock(
+            block.qualities, fastq.qualityScoreScheme
+        )[:, startPosition:]
+        expectedErrorBlocks.append(
+            convertExpectedErrorBlock(expectedErrorBlock, fixedPoint)
+        )
+    return stackExpectedErrorBlocks(expectedErrorBlocks, fixedPoint)
+
+
+def buildExpectedErrorMatrixAndFirstFailureArrays(
+    path: str,
+    fixedPoint: bool = True,
     startPosition: int = 0,
     subsample: int = 0,
     leftTrim: int = 0,
     rightTrim: int = 0,
+    lowQualityScore: int = 2,
 ):
+    """
+    Builds the expected error matrix along with the first N base and first low quality base positions for each read in a single pass through the file.
+    :param path: path of the Fastq to analyze
+    :param fixedPoint: store expected errors as uint16 fixed point instead of float16
+    :param startPosition: first position (after left trimming) to keep in the expected error matrix
+    :param subsample: analyze approximately 1/x reads
+    :param leftTrim: bases to remove from the start of each read (such as primers)
+    :param rightTrim: bases to remove from the end of each read
+    :param lowQualityScore: quality score at or below which a base counts as low quality (dada2's truncQ)
+    :return: expected error matrix (reads as rows), uint16 array of first N positions, uint16 array of first low quality positions
+    """
     import numpy
 
-    try:
-        from . import qualityScoreHandler
-        from .fastqHandler import FastqFile
-    except ImportError:
-        import qualityScoreHandler
-        from fastqHandler import FastqFile
-    fastq = FastqFile(
+    fastq = fastqHandler.FastqFile(
         path, depth=0, subsample=subsample, leftTrim=leftTrim, rightTrim=rightTrim
     )
-    expectedErrorMatrix = []
-    dataType = "float16"
-    if superLean:
-        dataType = "uint8"
-    for line in fastq:
-        expectedErrorLineList = qualityScoreHandler.cumulativeExpectedErrorArray(
-            line.quality, fastq.qualityScoreScheme
-        )[startPosition:]
-        expectedErrorMatrix.append(
-            expectedErrorLineList
-        )  # low precision floating point. Usually users are looking for whole numbers anyway
-    fastq.close()
-    return numpy.array(expectedErrorMatrix, dataType, order="F")
+    expectedErrorBlocks = []
+    firstNBaseBlocks = []
+    firstLowQualityBlocks = []
+    for block in fastq.readBlocks():
+        expectedErrorBlock = qualityScoreHandler.cumulativeExpectedErrorBlock(
+            block.qualities, fastq.qualityScoreScheme
+        )[:, startPosition:]
+        expectedErrorBlocks.append(
+            convertExpectedErrorBlock(expectedErrorBlock, fixedPoint)
+        )
+        firstNBasePositions, firstLowQualityPositions = (
+            fastqHandler.findFirstNBaseAndLowQualityPositions(
+                block, fastq.qualityScoreScheme, lowQualityScore
+            )
+        )
+        firstNBaseBlocks.append(firstNBasePositions)
+        firstLowQualityBlocks.append(firstLowQualityPositions)
+    expectedErrorMatrix = stackExpectedErrorBlocks(expectedErrorBlocks, fixedPoint)
+    firstNBaseArray = numpy.concatenate(firstNBaseBlocks + [numpy.array([], "uint16")])
+    firstLowQualityArray = numpy.concatenate(
+        firstLowQualityBlocks + [numpy.array([], "uint16")]
+    )
+    return expectedErrorMatrix, firstNBaseArray, firstLowQualityArray
+
+
+class ExpectedErrorCrossingTable(object):
+    """
+    Compact stand-in for an expected error matrix. For each whole-number max expected error level from 1 to maxLevel, it holds the number of leading positions of each read that stay at or under that level.
+    A read passes a max expected error at a zero-indexed trim position when its crossing for that level is greater than the trim position.
+    This takes maxLevel values per read instead of one per position.
+    It can also carry each read's first position at or below several candidate truncQ values, so that the table for any of them can be made later without rereading the file.
+    Tables combined from several samples keep the column where each sample's reads start.
+    """
+
+    __slots__ = [
+        "crossings",
+        "truncQValues",
+        "truncQPositions",
+        "sampleOffsets",
+        "readWeights",
+    ]
+
+    def __init__(
+        self,
+        crossings: [numpy.ndarray, None],
+        truncQValues: tuple = (),
+        truncQPositions: [numpy.ndarray, None] = None,
+        sampleOffsets: [numpy.ndarray, None] = None,
+        readWeights: [numpy.ndarray, None] = None,
+    ):
+        self.crossings = (
+            crossings  # uint16, levels as rows (row 0 is level 1), reads as columns
+        )
+        self.truncQValues = tuple(truncQValues)
+        # uint16, truncQ values as rows (in truncQValues order), reads as columns
+        self.truncQPositions = truncQPositions
+        if sampleOffsets is None:
+            sampleOffsets = numpy.zeros(1, dtype="int64")
+        # int64, first column of each sample's reads in sample order
+        self.sampleOffsets = sampleOffsets
+        # float64 weight of each read when counting kept reads, or None to count every read once
+        self.readWeights = readWeights
+
+    @property
+    def maxLevel(self):
+        return self.crossings.shape[0]
+
+    @property
+    def readCount(self):
+        return self.crossings.shape[1]
+
+    def getLevelRow(self, maxExpectedError: [int, float]):
+        level = int(maxExpectedError)
+        if level < 1:
+            raise ValueError(
+                "Crossing tables only hold whole-number max expected errors of 1 or more. %s was requested."
+                % maxExpectedError
+            )
+        if level > self.maxLevel:
+            raise ValueError(
+                "Max expected error %s is above the highest level (%s) in this crossing table."
+                % (maxExpectedError, self.maxLevel)
+            )
+        return level - 1
+
+    def passingMask(self, trimPosition: int, maxExpectedError: [int, float]):
+        return self.crossings[self.getLevelRow(maxExpectedError)] > trimPosition
+
+    def limitToFirstFailures(self, firstFailurePositions: numpy.ndarray):
+        """
+        Caps each read's crossings at a position where it will be lost regardless of expected error, such as its first N base or first Q<=2 base.
+        """
+        numpy.minimum(
+            self.crossings,
+            firstFailurePositions[numpy.newaxis, :].astype("uint16"),
+            out=self.crossings,
+        )
+
+    def limitedToTruncQ(self, truncQ: int):
+        """
+        Makes the table dada2 would see with this truncQ, where a read is truncated at its first base at or below truncQ and lost if that leaves it shorter than the trim position.
+        """
+        if truncQ not in self.truncQValues:
+            raise ValueError(
+                "truncQ %s was not gathered for this crossing table. Available values: %s"
+                % (truncQ, self.truncQValues)
+            )
+        limitedTable = ExpectedErrorCrossingTable(
+            self.crossings.copy(),
+            sampleOffsets=self.sampleOffsets,
+            readWeights=self.readWeights,
+        )
+        limitedTable.limitToFirstFailures(
+            self.truncQPositions[self.truncQValues.index(truncQ)]
+        )
+        return limitedTable
+
+    def __len__(self):
+        return self.readCount
+
+
+def combineCrossingTables(orderedTables: list):
+    truncQValues = orderedTables[0].truncQValues if orderedTables else ()
+    truncQPositions = None
+    if truncQValues:
+        truncQPositions = numpy.concatenate(
+            [table.truncQPositions for table in orderedTables], axis=1
+        )
+    sampleReadCounts = [table.readCount for table in orderedTables]
+    return ExpectedErrorCrossingTable(
+        numpy.concatenate([table.crossings for table in orderedTables], axis=1),
+        truncQValues,
+        truncQPositions,
+        numpy.cumsum([0] + sampleReadCounts[:-1], dtype="int64"),
+    )
+
+
+def buildExpectedErrorCrossingTable(
+    path: str,
+    maxLevel: int,
+    subsample: int = 0,
+    leftTrim: int = 0,
+    rightTrim: int = 0,
+    limitToFirstFailures: bool = False,
+    lowQualityScore: int = 2,
+    blockAccumulators: list = None,
+    truncQValues: list = None,
+    readLimit: int = 0,
+):
+    """
+    Builds a crossing table for a fastq file instead of a full expected error matrix.
+    :param path: path of the Fastq to analyze
+    :param maxLevel: highest whole-number max expected error that will be tested
+    :param subsample: analyze approximately 1/x reads
+    :param leftTrim: bases to remove from the start of each read (such as primers)
+    :param rightTrim: bases to remove from the end of each read
+    :param limitToFirstFailures: also cap each read at its first N base or first low quality base, found in the same pass
+    :param lowQualityScore: quality score at or below which a base counts as low quality (dada2's truncQ)
+    :param blockAccumulators: optional objects (such as a QualityScoreHistogram) whose addBlock method is given every block read, to gather other statistics in the same pass
+    :param truncQValues: candidate dada2 truncQ values. If given, each read's first base at or below each of them is kept in the table for ExpectedErrorCrossingTable.limitedToTruncQ, and limitToFirstFailures only applies the first N base cap
+    :param readLimit: stop after this many reads (after subsampling), 0 to read the whole file. Widen the subsampling interval to spread them across the file (see fastqHandler.findSpreadSubsample)
+    :return: ExpectedErrorCrossingTable for the file
+    """
+    fastq = fastqHandler.FastqFile(
+        path, depth=0, subsample=subsample, leftTrim=leftTrim, rightTrim=rightTrim
+    )
+    crossingBlocks = [numpy.zeros((maxLevel, 0), dtype="uint16")]
+    if blockAccumulators is None:
+        blockAccumulators = []
+    if truncQValues is None:
+        truncQValues = []
+    truncQBlocks = [numpy.zeros((len(truncQValues), 0), dtype="uint16")]
+    for block in fastq.readBlocks(readLimit=readLimit):
+        for accumulator in blockAccumulators:
+            accumulator.addBlock(block, fastq.qualityScoreScheme)
+        expectedErrorBlock = qualityScoreHandler.cumulativeExpectedErrorBlock(
+            block.qualities, fastq.qualityScoreScheme
+        )
+        crossingBlock = qualityScoreHandler.expectedErrorCrossingBlock(
+            expectedErrorBlock, maxLevel
+        )
+        if limitToFirstFailures:
+            firstNBasePositions, firstLowQualityPositions = (
+                fastqHandler.findFirstNBaseAndLowQualityPositions(
+                    block, fastq.qualityScoreScheme, lowQualityScore
+                )
+            )
+            if truncQValues:
+                firstFailurePositions = firstNBasePositions
+            else:
+                firstFailurePositions = numpy.minimum(
+                    firstNBasePositions, firstLowQualityPositions
+                )
+            numpy.minimum(crossingBlock, firstFailurePositions, out=crossingBlock)
+        if truncQValues:
+            truncQBlocks.append(
+                fastqHandler.findFirstLowQualityPositionsForScores(
+                    block, fastq.qualityScoreScheme, truncQValues
+                )
+            )
+        crossingBlocks.append(crossingBlock)
+    truncQPositions = None
+    if truncQValues:
+        truncQPositions = numpy.concatenate(truncQBlocks, axis=1)
+    return ExpectedErrorCrossingTable(
+        numpy.concatenate(crossingBlocks, axis=1), truncQValues, truncQPositions
+    )
+
+
+class ExpectedErrorHistogram(object):
+    """
+    Per-position histogram of cumulative expected error values, built while streaming through reads so its size does not depend on the read count.
+    Bins are spaced logarithmically (expectedErrorHistogramBinsPerDecade per decade starting at expectedErrorHistogramLowestValue), so each bin is a fixed small fraction of its value wide.
+    The first bin holds everything at or below the lowest value and the last bin holds everything past the highest edge, including positions past the end of short reads.
+    Histograms from different files merge by simple addition, giving pooled percentiles exact to the bin.
+    """
+
+    __slots__ = ["counts"]
+
+    binCount = expectedErrorHistogramDecades * expectedErrorHistogramBinsPerDecade + 2
+
+    def __init__(self, counts: [numpy.ndarray, None] = None):
+        if counts is None:
+            counts = numpy.zeros((0, self.binCount), dtype="int64")
+        self.counts = counts  # int64, positions as rows, bins as columns
+
+    @property
+    def positionCount(self):
+        return self.counts.shape[0]
+
+    @property
+    def readCount(self):
+        if not self.positionCount:
+            return 0
+        return int(self.counts[0].sum())
+
+    @classmethod
+    def getBinUpperEdges(cls):
+        exponents = (
+            numpy.log10(expectedErrorHistogramLowestValue)
+            + numpy.arange(cls.binCount - 1) / expectedErrorHistogramBinsPerDecade
+        )
+        return numpy.append(10**exponents, numpy.inf)
+
+    @classmethod
+    def findBins(cls, expectedErrorValues: numpy.ndarray):
+        scaledLogs = (
+            numpy.log10(expectedErrorValues)
+            - numpy.log10(expectedErrorHistogramLowestValue)
+        ) * expectedErrorHistogramBinsPerDecade
+        return numpy.clip(numpy.ceil(scaledLogs), 0, cls.binCount - 1).astype("int64")
+
+    def extendPositions(self, positionCount: int):
+        if positionCount <= self.positionCount:
+            return
+        extension = numpy.zeros(
+            (positionCount - self.positionCount, self.binCount), dtype="int64"
+        )
+        # reads seen so far were too short to reach these positions
+        extension[:, -1] = self.readCount
+        self.counts = numpy.concatenate((self.counts, extension))
+
+    def addBlock(self, expectedErrorBlock: numpy.ndarray):
+        """
+        Adds a block of cumulative expected errors (reads as rows, positions as columns) to the histogram.
+        """
+        readCount, width = expectedErrorBlock.shape
+        self.extendPositions(width)
+        flatBins = self.findBins(expectedErrorBlock) + (
+            numpy.arange(width, dtype="int64") * self.binCount
+        )
+        self.counts[:width] += numpy.bincount(
+            flatBins.ravel(), minlength=width * self.binCount
+        ).reshape(width, self.binCount)
+        self.counts[width:, -1] += readCount
+
+    def merge(self, other):
+        merged = ExpectedErrorHistogram(self.counts.copy())
+        other = ExpectedErrorHistogram(other.counts)
+        merged.extendPositions(other.positionCount)
+        other.extendPositions(merged.positionCount)
+        merged.counts += other.counts
+        return merged
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def calculatePercentiles(self, percentile: [int, float]):
+        """
+        Finds the given percentile of expected error at each position, reported as the upper edge of the bin holding it.
+        Stops at the first position where the percentile falls in the overflow bin (past the end of too many reads), so every value returned is finite.
+        :param percentile: percentile to find (0 to 100)
+        :return: numpy array of the percentile value at each position
+        """
+        targetRank = int(numpy.ceil((percentile / 100) * (self.readCount - 1)))
+        cumulativeCounts = numpy.cumsum(self.counts, axis=1)
+        percentileBins = numpy.argmax(cumulativeCounts > targetRank, axis=1)
+        overflowPositions = numpy.flatnonzero(percentileBins == self.binCount - 1)
+        if overflowPositions.size:
+            percentileBins = percentileBins[: overflowPositions[0]]
+        return self.getBinUpperEdges()[percentileBins]
+
+
+def buildExpectedErrorHistogram(
+    path: str,
+    subsample: int = 0,
+    leftTrim: int = 0,
+    rightTrim: int = 0,
+    readLimit: int = 0,
+):
+    """
+    Streams through a fastq file, accumulating a per-position histogram of cumulative expected error without holding an expected error matrix.
+    :param path: path of the Fastq to analyze
+    :param subsample: analyze approximately 1/x reads
+    :param leftTrim: bases to remove from the start of each read (such as primers)
+    :param rightTrim: bases to remove from the end of each read
+    :param readLimit: read at most this many reads, with the subsampling interval widened to spread them across the file (0 to read the whole file)
+    :return: ExpectedErrorHistogram for the file
+    """
+    if readLimit:
+        subsample = fastqHandler.findSpreadSubsample(path, readLimit, subsample)
+    fastq = fastqHandler.FastqFile(
+        path, depth=0, subsample=subsample, leftTrim=leftTrim, rightTrim=rightTrim
+    )
+    histogram = ExpectedErrorHistogram()
+    for block in fastq.readBlocks(readLimit=readLimit):
+        histogram.addBlock(
+            qualityScoreHandler.cumulativeExpectedErrorBlock(
+                block.qualities, fastq.qualityScoreScheme
+            )
+        )
+    return histogram
+
+
+def combineExpectedErrorHistograms(histograms: list):
+    combinedHistogram = ExpectedErrorHistogram()
+    for histogram in histograms:
+        combinedHistogram = combinedHistogram.merge(histogram)
+    return combinedHistogram
+
+
+class QualityScoreHistogram(object):
+    """
+    Per-position counts of each quality score, built block by block while streaming through reads. Only positions within each read are counted.
+    Histograms from different files merge by simple addition. Scores below zero (possible with Solexa encoding) are counted as zero.
+    """
+
+    __slots__ = ["counts"]
+
+    def __init__(self, counts: [numpy.ndarray, None] = None):
+        if counts is None:
+            counts = numpy.zeros((0, 0), dtype="int64")
+        self.counts = counts  # int64, positions as rows, quality scores as columns
+
+    @property
+    def positionCount(self):
+        return self.counts.shape[0]
+
+    @property
+    def scoreCount(self):
+        return self.counts.shape[1]
+
+    @property
+    def readCounts(self):
+        return self.counts.sum(axis=1)
+
+    def resize(self, positionCount: int, scoreCount: int):
+        if positionCount <= self.positionCount and scoreCount <= self.scoreCount:
+            return
+        resizedCounts = numpy.zeros(
+            (
+                max(positionCount, self.positionCount),
+                max(scoreCount, self.scoreCount),
+            ),
+            dtype="int64",
+        )
+        resizedCounts[: self.positionCount, : self.scoreCount] = self.counts
+        self.counts = resizedCounts
+
+    def addBlock(
+        self,
+        block: fastqHandler.FastqReadBlock,
+        qualityScoreScheme: qualityScoreHandler.EncodingScheme,
+    ):
+        width = block.qualities.shape[1]
+        positions = numpy.arange(width, dtype="int64")
+        withinRead = positions < block.readLengths[:, numpy.newaxis]
+        scores = numpy.maximum(
+            block.qualities[withinRead].astype("int64") - qualityScoreScheme.base, 0
+        )
+        highestScore = int(scores.max()) if scores.size else 0
+        self.resize(width, max(qualityScoreScheme.range, highestScore) + 1)
+        flatBins = (
+            numpy.broadcast_to(positions, withinRead.shape)[withinRead]
+            * self.scoreCount
+            + scores
+        )
+        self.counts[:width] += numpy.bincount(
+            flatBins, minlength=width * self.scoreCount
+        ).reshape(width, self.scoreCount)
+
+    def merge(self, other):
+        merged = QualityScoreHistogram(self.counts.copy())
+        merged.resize(other.positionCount, other.scoreCount)
+        merged.counts[: other.positionCount, : other.scoreCount] += other.counts
+        return merged
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def calculateMeans(self):
+        readCounts = self.readCounts
+        scoreSums = self.counts @ numpy.arange(self.scoreCount)
+        return numpy.divide(
+            scoreSums,
+            readCounts,
+            out=numpy.zeros(self.positionCount),
+            where=readCounts > 0,
+        )
+
+    def calculatePercentiles(self, percentile: [int, float]):
+        """
+        Finds the given percentile of quality score at each position.
+        :param percentile: percentile to find (0 to 100)
+        :return: int64 numpy array of the percentile score at each position
+        """
+        targetRanks = numpy.ceil(
+            (percentile / 100) * numpy.maximum(self.readCounts - 1, 0)
+        )
+        cumulativeCounts = numpy.cumsum(self.counts, axis=1)
+        return numpy.argmax(
+            cumulativeCounts > targetRanks[:, numpy.newaxis], axis=1
+        ).astype("int64")
+
+    def makeReports(self, direction: str, positionOffset: int = 0):
+        return {
+            "%sQualityDistribution.tsv" % direction: self.makeReport(positionOffset)
+        }
+
+    def makeReport(self, positionOffset: int = 0):
+        """
+        Makes a tab-separated per-position quality distribution table, similar to FastQC's per base sequence quality module, followed by the count of every quality score.
+        :param positionOffset: bases trimmed from the start of each read before counting (such as primers), so that reported positions match the untrimmed read
+        :return: report as a string
+        """
+        header = ["position", "reads", "mean", "10th", "25th", "median", "75th", "90th"]
+        header += ["Q%s" % score for score in range(self.scoreCount)]
+        columns = [
+            numpy.arange(self.positionCount) + positionOffset + 1,
+            self.readCounts,
+            numpy.round(self.calculateMeans(), 2),
+        ]
+        columns += [
+            self.calculatePercentiles(percentile) for percentile in (10, 25, 50, 75, 90)
+        ]
+        lines = ["\t".join(header)]
+        for row, scoreCounts in zip(zip(*columns), self.counts):
+            lines.append("\t".join([str(value) for value in row + tuple(scoreCounts)]))
+        return "\n".join(lines) + "\n"
+
+
+class BaseCompositionAccumulator(object):
+    """
+    Streams base composition statistics block by block: the count of each base at each position and a histogram of per-read GC content in whole percents.
+    Accumulators from different files merge by simple addition.
+    """
+
+    __slots__ = ["positionCounts", "gcPercentCounts"]
+
+    def __init__(
+        self,
+        positionCounts: [numpy.ndarray, None] = None,
+        gcPercentCounts: [numpy.ndarray, None] = None,
+    ):
+        if positionCounts is None:
+            positionCounts = numpy.zeros(
+                (0, len(fastqHandler.compositionBases)), dtype="int64"
+            )
+        if gcPercentCounts is None:
+            gcPercentCounts = numpy.zeros(101, dtype="int64")
+        self.positionCounts = positionCounts  # int64, positions as rows, bases (in fastqHandler.compositionBases order) as columns
+        # int64, read counts for 0 to 100 percent GC
+        self.gcPercentCounts = gcPercentCounts
+
+    @property
+    def positionCount(self):
+        return self.positionCounts.shape[0]
+
+    def extendPositions(self, positionCount: int):
+        if positionCount <= self.positionCount:
+            return
+        self.positionCounts = numpy.pad(
+            self.positionCounts, ((0, positionCount - self.positionCount), (0, 0))
+        )
+
+    def addBlock(
+        self,
+        block: fastqHandler.FastqReadBlock,
+        qualityScoreScheme: qualityScoreHandler.EncodingScheme = None,
+    ):
+        perReadCounts, perPositionCounts = fastqHandler.countBlockBaseComposition(block)
+        self.extendPositions(len(perPositionCounts))
+        self.positionCounts[: len(perPositionCounts)] += perPositionCounts
+        gcPercents = numpy.round(
+            fastqHandler.calculateGCContentFromCounts(perReadCounts) * 100
+        ).astype("int64")
+        self.gcPercentCounts += numpy.bincount(gcPercents, minlength=101)
+
+    def merge(self, other):
+        merged = BaseCompositionAccumulator(
+            self.positionCounts.copy(), self.gcPercentCounts + other.gcPercentCounts
+        )
+        merged.extendPositions(other.positionCount)
+        merged.positionCounts[: other.positionCount] += other.positionCounts
+        return merged
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def makeReports(self, direction: str, positionOffset: int = 0):
+        return {
+            "%sBaseComposition.tsv"
+            % direction: self.makePositionReport(positionOffset),
+            "%sGCContent.tsv" % direction: self.makeGCContentReport(),
+        }
+
+    def makePositionReport(self, positionOffset: int = 0):
+        """
+        Makes a tab-separated table of base counts and GC fraction at each position.
+        :param positionOffset: bases trimmed from the start of each read before counting (such as primers), so that reported positions match the untrimmed read
+        """
+        gcContent = numpy.round(
+            fastqHandler.calculateGCContentFromCounts(self.positionCounts), 4
+        )
+        lines = ["\t".join(["position"] + list(fastqHandler.compositionBases) + ["GC"])]
+        for position, (baseCounts, gcFraction) in enumerate(
+            zip(self.positionCounts.tolist(), gcContent.tolist())
+        ):
+            lines.append(
+                "\t".join(
+                    [str(position + positionOffset + 1)]
+                    + [str(count) for count in baseCounts]
+                    + [str(gcFraction)]
+                )
+            )
+        return "\n".join(lines) + "\n"
+
+    def makeGCContentReport(self):
+        lines = ["GCPercent\treads"]
+        for gcPercent, readCount in enumerate(self.gcPercentCounts.tolist()):
+            lines.append("%s\t%s" % (gcPercent, readCount))
+        return "\n".join(lines) + "\n"
+
+
+def countLeadingZeros64(values: numpy.ndarray):
+    """
+    Counts the leading zero bits of each uint64 value by halving the search window six times, which stays exact where a floating point log2 would not.
+    """
+    values = values.copy()
+    leadingZeros = numpy.zeros(values.shape, dtype="uint8")
+    for shift in (32, 16, 8, 4, 2, 1):
+        topBitsEmpty = values < numpy.uint64(1 << (64 - shift))
+        leadingZeros[topBitsEmpty] += shift
+        values[topBitsEmpty] <<= numpy.uint64(shift)
+    leadingZeros[values == 0] = 64
+    return leadingZeros
+
+
+class UniqueSequenceSketch(object):
+    """
+    HyperLogLog sketches of read prefixes at a coarse grid of lengths (every uniqueSequenceSketchInterval bases), estimating how many unique sequences would remain after trimming reads to each length.
+    Memory is fixed by the precision (2 ** precision one-byte registers per length) no matter how many reads are added, and sketches from different files merge by taking the register maximums.
+    """
+
+    __slots__ = ["registers", "readCounts", "interval", "precision"]
+
+    def __init__(
+        self,
+        interval: int = uniqueSequenceSketchInterval,
+        precision: int = uniqueSequenceSketchPrecision,
+    ):
+        self.interval = interval
+        self.precision = precision
+        # uint8, prefix lengths as rows (row i is length (i + 1) * interval), registers as columns
+        self.registers = numpy.zeros((0, 2**precision), dtype="uint8")
+        # int64, number of reads long enough to reach each prefix length
+        self.readCounts = numpy.zeros(0, dtype="int64")
+
+    @property
+    def lengthCount(self):
+        return self.registers.shape[0]
+
+    @property
+    def prefixLengths(self):
+        return (numpy.arange(self.lengthCount) + 1) * self.interval
+
+    def extendLengths(self, lengthCount: int):
+        if lengthCount <= self.lengthCount:
+            return
+        self.registers = numpy.pad(
+            self.registers, ((0, lengthCount - self.lengthCount), (0, 0))
+        )
+        self.readCounts = numpy.pad(
+            self.readCounts, (0, lengthCount - len(self.readCounts))
+        )
+
+    def addBlock(
+        self,
+        block: fastqHandler.FastqReadBlock,
+        qualityScoreScheme: qualityScoreHandler.EncodingScheme = None,
+    ):
+        if not len(block):
+            return
+        self.extendLengths(int(block.readLengths.max()) // self.interval)
+        prefixLengths = self.prefixLengths.tolist()
+        prefixHashes = fastqHandler.hashBlockPrefixes(block, prefixLengths)
+        registerIndices = (prefixHashes >> numpy.uint64(64 - self.precision)).astype(
+            "int64"
+        )
+        ranks = numpy.minimum(
+            countLeadingZeros64(prefixHashes << numpy.uint64(self.precision)) + 1,
+            64 - self.precision + 1,
+        )
+        for row, prefixLength in enumerate(prefixLengths):
+            longEnough = block.readLengths >= prefixLength
+            numpy.maximum.at(
+                self.registers[row],
+                registerIndices[row, longEnough],
+                ranks[row, longEnough],
+            )
+            self.readCounts[row] += int(longEnough.sum())
+
+    def merge(self, other):
+        if (self.interval, self.precision) != (other.interval, other.precision):
+            raise ValueError(
+                "Unable to merge unique sequence sketches with different intervals or precisions."
+            )
+        merged = UniqueSequenceSketch(self.interval, self.precision)
+        merged.extendLengths(max(self.lengthCount, other.lengthCount))
+        for sketch in (self, other):
+            numpy.maximum(
+                merged.registers[: sketch.lengthCount],
+                sketch.registers,
+                out=merged.registers[: sketch.lengthCount],
+            )
+            merged.readCounts[: sketch.lengthCount] += sketch.readCounts
+        return merged
+
+    def __add__(self, other):
+        return self.merge(other)
+
+    def estimateUniqueCounts(self):
+        """
+        Standard HyperLogLog estimate for each prefix length, switching to linear counting while registers are still empty.
+        :return: float64 array of estimated unique sequence counts in prefixLengths order
+        """
+        registerCount = 2**self.precision
+        alpha = 0.7213 / (1 + 1.079 / registerCount)
+        rawEstimates = (alpha * registerCount**2) / numpy.sum(
+            numpy.exp2(-self.registers.astype("float64")), axis=1
+        )
+        emptyRegisters = numpy.sum(self.registers == 0, axis=1)
+        linearCounts = registerCount * numpy.log(
+            registerCount / numpy.maximum(emptyRegisters, 1)
+        )
+        useLinearCount = (rawEstimates <= 2.5 * registerCount) & (emptyRegisters > 0)
+        return numpy.where(useLinearCount, linearCounts, rawEstimates)
+
+    def estimateUniqueCountsAtLengths(self, lengths: list):
+        """
+        :param lengths: prefix lengths in bases, each rounded to the nearest sketched length
+        :return: int64 array of estimated unique sequence counts in the same order
+        """
+        if not self.lengthCount:
+            return numpy.zeros(len(lengths), dtype="int64")
+        rows = numpy.clip(
+            numpy.round(numpy.asarray(lengths) / self.interval).astype("int64") - 1,
+            0,
+            self.lengthCount - 1,
+        )
+        return numpy.round(self.estimateUniqueCounts()[rows]).astype("int64")
+
+    def makeReports(self, direction: str, positionOffset: int = 0):
+        return {"%sUniqueSequences.tsv" % direction: self.makeReport(positionOffset)}
+
+    def makeReport(self, positionOffset: int = 0):
+        """
+        :param positionOffset: bases trimmed from the start of each read before hashing (such as primers), so that reported trim positions match the untrimmed read
+        """
+        lines = ["trimPosition\treads\testimatedUniqueSequences"]
+        for prefixLength, readCount, uniqueCount in zip(
+            self.prefixLengths.tolist(),
+            self.readCounts.tolist(),
+            self.estimateUniqueCounts().tolist(),
+        ):
+            lines.append(
+                "%s\t%s\t%s"
+                % (prefixLength + positionOffset, readCount, int(round(uniqueCount)))
+            )
+        return "\n".join(lines) + "\n"
+
+
+def buildQualityScoreHistogram(
+    path: str, subsample: int = 0, leftTrim: int = 0, rightTrim: int = 0
+):
+    fastq = fastqHandler.FastqFile(
+        path, depth=0, subsample=subsample, leftTrim=leftTrim, rightTrim=rightTrim
+    )
+    histogram = QualityScoreHistogram()
+    for block in fastq.readBlocks():
+        histogram.addBlock(block, fastq.qualityScoreScheme)
+    return histogram
+
+
+def combineBlockAccumulators(accumulators: list):
+    """
+    Merges a list of block accumulators of the same kind (such as per-sample QualityScoreHistograms) into one.
+    """
+    combinedAccumulator = accumulators[0]
+    for accumulator in accumulators[1:]:
+        combinedAccumulator = combinedAccumulator.merge(accumulator)
+    return combinedAccumulator
+
+
+def calculateKmerEntropies(
+    block: fastqHandler.FastqReadBlock,
+    kmerLength: int = primerCheckKmerLength,
+    searchLength: int = primerCheckSearchLength,
+):
+    """
+    Calculates the Shannon entropy of the k-mers starting at each of the first positions of a block of reads, counting all of them with one bincount.
+    K-mers with an N or running past the end of a read are left out.
+    :return: entropy in bits for each k-mer start position
+    """
+    baseCodes = fastqHandler.baseCodeTable[block.sequences[:, :searchLength]].astype(
+        "int64"
+    )
+    windowCount = max(baseCodes.shape[1] - kmerLength + 1, 0)
+    kmerCount = 4**kmerLength
+    kmerCodes = numpy.zeros((len(block), windowCount), dtype="int64")
+    calledKmers = numpy.ones((len(block), windowCount), dtype=bool)
+    for offset in range(kmerLength):
+        window = baseCodes[:, offset : offset + windowCount]
+        kmerCodes = kmerCodes * 4 + numpy.minimum(window, 3)
+        calledKmers &= window < 4
+    kmerCodes += numpy.arange(windowCount)[numpy.newaxis, :] * kmerCount
+    kmerCounts = numpy.bincount(
+        kmerCodes[calledKmers], minlength=windowCount * kmerCount
+    ).reshape(windowCount, kmerCount)
+    totals = kmerCounts.sum(axis=1, keepdims=True)
+    frequencies = numpy.divide(
+        kmerCounts,
+        totals,
+        out=numpy.zeros(kmerCounts.shape),
+        where=totals > 0,
+    )
+    logFrequencies = numpy.log2(
+        frequencies, out=numpy.zeros(frequencies.shape), where=frequencies > 0
+    )
+    return -(frequencies * logFrequencies).sum(axis=1)
+
+
+def estimateConservedPrefixLength(
+    block: fastqHandler.FastqReadBlock,
+    kmerLength: int = primerCheckKmerLength,
+    searchLength: int = primerCheckSearchLength,
+    entropyLimit: float = primerCheckEntropyLimit,
+):
+    """
+    Estimates how many bases at the start of the reads are shared by nearly all of them, which is where an amplicon primer would be.
+    The first k-mer whose entropy jumps past entropyLimit holds the first variable base, which is the first base in it with more entropy than a 2-fold degenerate primer base can have.
+    :return: length of the conserved start, or the number of bases searched if it never ends
+    """
+    variableKmers = (
+        calculateKmerEntropies(block, kmerLength, searchLength) > entropyLimit
+    )
+    if not variableKmers.any():
+        return min(searchLength, block.sequences.shape[1])
+    firstVariableKmer = int(numpy.argmax(variableKmers))
+    baseEntropies = calculateKmerEntropies(block, 1, firstVariableKmer + kmerLength)
+    variableBases = (
+        baseEntropies[firstVariableKmer:] > primerCheckBaseEntropyLimit
+    ).tolist()
+    if True in variableBases:
+        return firstVariableKmer + variableBases.index(True)
+    return firstVariableKmer + kmerLength - 1
 
 
 def buildExpectedErrorMatrixPaired(
     forward: str,
     reverse: str,
-    superLean: bool = False,
+    fixedPoint: bool = False,
     startPositions: tuple = (0, 0),
     subsample: int = 0,
 ):
     return buildExpectedErrorMatrix(
-        forward, superLean, startPositions[0]
-    ), buildExpectedErrorMatrix(reverse, superLean, startPositions[1])
+        forward, fixedPoint, startPositions[0]
+    ), buildExpectedErrorMatrix(reverse, fixedPoint, startPositions[1])
 
 
-def findCutoffByPercentile(path: str, phredScore: int, percentile: int):
+def findCutoffByPercentile(
+    path: str, phredScore: int, percentile: int, subsample: int = 0
+):
     """
     This will analyze a fastq file to find where the given percentile of reads is at or below the given phred score (such as finding the read where the 10th percentile of reads is phred=10.
     Value returned is the position *INDEXED TO ZERO*
+    Quality scores are streamed into a per-position histogram, so memory use does not depend on the size of the file.
     :param path: path of the Fastq to analyze
     :param phredScore:  score to use in cutoff
     :param percentile:  percentile to use in cutoff
+    :param subsample: analyze approximately 1/x reads
     :return:base position (integer)
     """
-    import numpy
-
-    qualityMatrix = buildQualityMatrix(
-        path
-    ).transpose()  # faster calclation of percentiles if we have positions as rows and reads as columns
-    for position, row in enumerate(qualityMatrix):
-        nthPercentile = numpy.percentile(row, percentile)
-        if nthPercentile < percentile:
-            return position
-    return numpy.size(qualityMatrix, 0)
+    qualityScoreHistogram = buildQualityScoreHistogram(path, subsample)
+    nthPercentiles = qualityScoreHistogram.calculatePercentiles(percentile)
+    belowCutoff = numpy.flatnonzero(nthPercentiles < phredScore)
+    if belowCutoff.size:
+        return int(belowCutoff[0])
+    return qualityScoreHistogram.positionCount
 
 
 def makeQualityMatrix(path: str):
-    import numpy
-    from . import fastqHandler
-
-    readLength, variance = fastqHandler.estimateReadLength(path, getVariance=True)
-    if variance != 0:
-        readLength = fastqHandler.getLongestReadInFile(path)
-    fastq = fastqHandler.FastqFile(path, depth=1)
-    qualityRange = fastq.qualityScoreScheme.range
-    readLengthMatrix = [0] * readLength
-    qualityCountMatrix = []
-    for i in range(qualityRange + 1):
-        qualityCountMatrix.append(readLengthMatrix.copy())
     """
-    Building a matrix here where the correspond to all possibly quality scores and columns represent each base position of each read (indexed to zero)
-    Calling a specific value is done by qualityMatrix[qualityScore][readPosition]
+    Counts how many times each quality score appears at each position in a single pass through the file.
+    Calling a specific value is done by qualityMatrix[qualityScore, readPosition] (positions indexed to zero)
+    :param path: path of the Fastq to analyze
+    :return: numpy matrix with quality scores as rows and read positions as columns
     """
-    for read in fastq:
-        for position, phred in enumerate(read.quality.phredScores):
-            qualityCountMatrix[phred][position] = (
-                qualityCountMatrix[phred][position] + 1
-            )
-    fastq.close()
-    qualityCountMatrix = numpy.matrix(qualityCountMatrix)
-    return qualityCountMatrix
-
+    qualityScoreHistogram = buildQualityScoreHistogram(path)
+    return numpy.matrix(qualityScoreHistogram.counts.transpose())
 
-def makeAverageExpectedErrorLine(path: str):
-    import numpy
 
-    expectedErrorMatrix = buildExpectedErrorMatrix(path)
-    expectedErrorMatrix = expectedErrorMatrix.transpose()
-    means = []
-    for line in expectedErrorMatrix:
-        means.append(numpy.mean(line))
-    return means
+def makeAverageExpectedErrorLine(
+    path: str, subsample: int = 0, leftTrim: int = 0, rightTrim: int = 0
+):
+    """
+    Finds the mean cumulative expected error at each position, using running sums so that memory use does not depend on the size of the file.
+    Each position is averaged over the reads long enough to reach it.
+    :param path: path of the Fastq to analyze
+    :param subsample: analyze approximately 1/x reads
+    :param leftTrim: bases to remove from the start of each read (such as primers)
+    :param rightTrim: bases to remove from the end of each read
+    :return: list of mean expected errors by position (indexed to zero)
+    """
+    fastq = fastqHandler.FastqFile(
+        path, depth=0, subsample=subsample, leftTrim=leftTrim, rightTrim=rightTrim
+    )
+    expectedErrorSums = numpy.zeros(0)
+    readCounts = numpy.zeros(0, dtype="int64")
+    for block in fastq.readBlocks():
+        expectedErrorBlock = qualityScoreHandler.cumulativeExpectedErrorBlock(
+            block.qualities, fastq.qualityScoreScheme
+        )
+        width = expectedErrorBlock.shape[1]
+        if width > len(expectedErrorSums):
+            expectedErrorSums = numpy.pad(
+                expectedErrorSums, (0, width - len(expectedErrorSums))
+            )
+            readCounts = numpy.pad(readCounts, (0, width - len(readCounts)))
+        withinRead = numpy.arange(width) < block.readLengths[:, numpy.newaxis]
+        expectedErrorSums[:width] += numpy.where(withinRead, expectedErrorBlock, 0).sum(
+            axis=0
+        )
+        readCounts[:width] += numpy.count_nonzero(withinRead, axis=0)
+    means = numpy.divide(
+        expectedErrorSums,
+        readCounts,
+        out=numpy.zeros(len(expectedErrorSums)),
+        where=readCounts > 0,
+    )
+    return means.tolist()
 
 
 def getEstimatedFastqFileSizeSumFromList(fastqList: list):
@@ -3,6 +3,7 @@ import logging
 import typing
 
 logger = logging.getLogger(__name__)
+defaultReadBlockSize = 10000
 try:
     from . import qualityScoreHandler
     from . import fileNamingStandards
@@ -180,11 +181,9 @@ class SequenceLine(object):
             self.gcContent = self.calculateGCContent()
 
     def getBaseFrequencyTable(self):
-        freq = {"A": 0, "G": 0, "C": 0, "T": 0, "N": 0}
-        for base in self.sequence:
-            try:
-                freq[base] += 1
-            except KeyError:
+        freq = {base: self.sequence.count(base) for base in "AGCTN"}
+        if sum(freq.values()) != self.length:
+            for base in set(self.sequence) - set(freq):
                 logger.error(
                     "Found a sequence with an invalid character. Character: %s  Sequence: %s"
                     % (base, self.sequence)
@@ -281,6 +280,212 @@ def reanalyzeFastqLineSet(
     )
 
 
+def stringListToByteMatrix(strings: list, width: int = 0):
+    import numpy
+
+    if not width:
+        width = max([len(string) for string in strings] + [1])
+    byteStrings = numpy.array(strings, dtype="S%s" % width)
+    return byteStrings.view("uint8").reshape(len(strings), width)
+
+
+class FastqReadBlock(object):
+    """
+    Holds a block of reads as 2-D uint8 arrays of their raw characters with reads as rows and positions as columns.
+    Reads shorter than the longest read in the block are padded on the right with zero bytes; readLengths holds the real lengths.
+    """
+
+    __slots__ = ["sequences", "qualities", "readLengths"]
+
+    def __init__(self, sequences: list, qualities: list):
+        import numpy
+
+        self.readLengths = numpy.array(
+            [len(quality) for quality in qualities], dtype="uint16"
+        )
+        width = max(
+            int(self.readLengths.max()),
+            max([len(sequence) for sequence in sequences]),
+            1,
+        )
+        self.sequences = stringListToByteMatrix(sequences, width)
+        self.qualities = stringListToByteMatrix(qualities, width)
+
+    def __len__(self):
+        return len(self.readLengths)
+
+
+def findFirstTruePositions(mask, readLengths):
+    """
+    Finds the first True column in each row of a block mask.
+    :param mask: 2-D boolean array with reads as rows and positions as columns
+    :param readLengths: length of each read, used for rows with no True value before the end of the read
+    :return: uint16 array of zero-indexed positions
+    """
+    import numpy
+
+    firstPositions = numpy.argmax(mask, axis=1)
+    firstPositions[~mask.any(axis=1)] = mask.shape[1]
+    return numpy.minimum(firstPositions, readLengths).astype("uint16")
+
+
+def findFirstNBaseAndLowQualityPositions(
+    block: FastqReadBlock,
+    qualityScoreScheme: qualityScoreHandler.EncodingScheme,
+    lowQualityScore: int = 2,
+):
+    """
+    Finds the first N base and the first base at or below a quality score in every read of a block at once.
+    Reads without either get their length as the position, the same way the per-read builders handle it.
+    :param block: block of reads
+    :param qualityScoreScheme: quality score encoding of the reads
+    :param lowQualityScore: quality score at or below which a base counts as low quality
+    :return: uint16 arrays of first N base positions and first low quality positions
+    """
+    sequences = block.sequences
+    nBaseMask = (
+        (sequences == ord("N")) | (sequences == ord("n")) | (sequences == ord("."))
+    )
+    firstNBasePositions = findFirstTruePositions(nBaseMask, block.readLengths)
+    lowQualityMask = block.qualities <= qualityScoreScheme.base + lowQualityScore
+    firstLowQualityPositions = findFirstTruePositions(lowQualityMask, block.readLengths)
+    return firstNBasePositions, firstLowQualityPositions
+
+
+def findFirstLowQualityPositionsForScores(
+    block: FastqReadBlock,
+    qualityScoreScheme: qualityScoreHandler.EncodingScheme,
+    lowQualityScores: list,
+):
+    """
+    Finds the first base at or below each of several quality scores (such as candidate dada2 truncQ values) in every read of a block at once.
+    The running minimum quality along each read never goes up, so the first position at or below a score is the count of positions still above it.
+    :param block: block of reads
+    :param qualityScoreScheme: quality score encoding of the reads
+    :param lowQualityScores: quality scores at or below which a base counts as low quality
+    :return: uint16 array with one row per low quality score (in the order given) and one column per read
+    """
+    import numpy
+
+    # zero bytes padding short reads are below any score, so reads without a low quality base get their length
+    runningMinimums = numpy.minimum.accumulate(block.qualities, axis=1)
+    firstLowQualityPositions = numpy.empty(
+        (len(lowQualityScores), len(block)), dtype="uint16"
+    )
+    for row, lowQualityScore in enumerate(lowQualityScores):
+        firstLowQualityPositions[row] = (
+            runningMinimums > qualityScoreScheme.base + lowQualityScore
+        ).sum(axis=1)
+    return firstLowQualityPositions
+
+
+compositionBases = "ACGTN"
+
+
+def makeBaseCodeTable():
+    """
+    Makes a lookup table from sequence byte value to the base's index in compositionBases (upper or lower case, with "." counted as N).
+    Anything else, including the zero bytes padding short reads in a block, gets len(compositionBases).
+    """
+    import numpy
+
+    baseCodeTable = numpy.full(256, len(compositionBases), dtype="uint8")
+    for index, base in enumerate(compositionBases):
+        baseCodeTable[ord(base)] = index
+        baseCodeTable[ord(base.lower())] = index
+    baseCodeTable[ord(".")] = compositionBases.index("N")
+    return baseCodeTable
+
+
+baseCodeTable = makeBaseCodeTable()
+
+
+def countBlockBaseComposition(block: FastqReadBlock):
+    """
+    Counts each base in every read and at every position of a block at once.
+    :param block: block of reads
+    :return: int64 arrays of per-read counts (reads as rows) and per-position counts (positions as rows), with columns in compositionBases order
+    """
+    import numpy
+
+    baseCount = len(compositionBases)
+    baseCodes = baseCodeTable[block.sequences].astype("int64")
+    readCount, width = baseCodes.shape
+    perReadCounts = numpy.bincount(
+        (
+            numpy.arange(readCount, dtype="int64")[:, numpy.newaxis] * (baseCount + 1)
+            + baseCodes
+        ).ravel(),
+        minlength=readCount * (baseCount + 1),
+    ).reshape(readCount, baseCount + 1)[:, :baseCount]
+    perPositionCounts = numpy.bincount(
+        (
+            numpy.arange(width, dtype="int64")[numpy.newaxis, :] * (baseCount + 1)
+            + baseCodes
+        ).ravel(),
+        minlength=width * (baseCount + 1),
+    ).reshape(width, baseCount + 1)[:, :baseCount]
+    return perReadCounts, perPositionCounts
+
+
+def calculateGCContentFromCounts(baseCounts):
+    """
+    Vectorized version of SequenceLine.calculateGCContent for arrays of base counts in compositionBases order (N bases are left out).
+    :return: GC fraction for each row of counts, 0 where there are no called bases
+    """
+    import numpy
+
+    calledBases = baseCounts[..., :4].sum(axis=-1)
+    gcBases = (
+        baseCounts[..., compositionBases.index("G")]
+        + baseCounts[..., compositionBases.index("C")]
+    )
+    return numpy.divide(
+        gcBases,
+        calledBases,
+        out=numpy.zeros(numpy.shape(calledBases)),
+        where=calledBases > 0,
+    )
+
+
+prefixHashMultiplier = 0x100000001B3  # 64-bit FNV prime
+
+
+def mixHashValues(values):
+    """
+    Scrambles uint64 hash values with the splitmix64 finalizer so every output bit depends on every input bit.
+    """
+    import numpy
+
+    values = values ^ (values >> numpy.uint64(30))
+    values = values * numpy.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> numpy.uint64(27))
+    values = values * numpy.uint64(0x94D049BB133111EB)
+    return values ^ (values >> numpy.uint64(31))
+
+
+def hashBlockPrefixes(block: FastqReadBlock, prefixLengths: list):
+    """
+    Hashes the first bases of every read in a block at several prefix lengths at once, using a polynomial rolling hash that wraps around at 64 bits.
+    :param block: block of reads
+    :param prefixLengths: increasing prefix lengths to hash at
+    :return: uint64 array of mixed hashes with one row per prefix length and one column per read. Hashes for reads shorter than the prefix length are meaningless and should be masked out using block.readLengths.
+    """
+    import numpy
+
+    baseCodes = baseCodeTable[block.sequences].astype("uint64") + numpy.uint64(1)
+    prefixHashes = numpy.zeros((len(prefixLengths), len(block)), dtype="uint64")
+    rollingHashes = numpy.zeros(len(block), dtype="uint64")
+    multiplier = numpy.uint64(prefixHashMultiplier)
+    hashedLength = 0
+    for row, prefixLength in enumerate(prefixLengths):
+        for position in range(hashedLength, min(prefixLength, baseCodes.shape[1])):
+            rollingHashes = rollingHashes * multiplier + baseCodes[:, position]
+            hashedLength = position + 1
+        prefixHashes[row] = mixHashValues(rollingHashes)
+    return prefixHashes
+
+
 class FastqFile(object):
 
     def __init__(
@@ -345,7 +550,7 @@ class FastqFile(object):
             import gzipIdentifier
         return gzipIdentifier.isGzipped(path)
 
-    def getNextRead(self):
+    def getNextRawRead(self):
 
         def read4Lines():
             readBuffer = []
@@ -383,6 +588,10 @@ class FastqFile(object):
             includedLine = (
                 self.currentLine - 1
             ) % self.subsample == 0 or self.reachedEnd
+        return readBuffer
+
+    def getNextRead(self):
+        readBuffer = self.getNextRawRead()
         if not readBuffer:
             return readBuffer
         else:
@@ -411,6 +620,37 @@ class FastqFile(object):
                     )
             return fastqLineSet
 
+    def getNextReadBlock(self, blockSize: int = defaultReadBlockSize):
+        sequences = []
+        qualities = []
+        while len(sequences) < blockSize:
+            readBuffer = self.getNextRawRead()
+            if not readBuffer or self.reachedEnd:
+                break
+            sequences.append(readBuffer[1])
+            qualities.append(readBuffer[3])
+        if not sequences:
+            return None
+        return FastqReadBlock(sequences, qualities)
+
+    def readBlocks(self, blockSize: int = defaultReadBlockSize, readLimit: int = 0):
+        """
+        :param readLimit: stop after this many reads (0 to read the whole file)
+        """
+        remainingReads = readLimit
+        if readLimit:
+            blockSize = min(blockSize, remainingReads)
+        block = self.getNextReadBlock(blockSize)
+        while block:
+            yield block
+            if readLimit:
+                remainingReads -= len(block.readLengths)
+                if remainingReads <= 0:
+                    break
+                blockSize = min(blockSize, remainingReads)
+            block = self.getNextReadBlock(blockSize)
+        self.close()
+
     def close(self):
         if not self.filehandle.closed:
             self.filehandle.close()
@@ -647,15 +887,22 @@ def validFastqPair(pe1Path: str, pe2Path: str):
     return readCount
 
 
-def estimateReadLength(path: str, samplesize: int = 100, getVariance=False):
-    lengths = []
+def readProbeBlock(path: str, readCount: int = 100):
+    """
+    Reads the first reads of a file as one block, for quick checks before the full analysis.
+    """
     fastq = FastqFile(path)
-    read = fastq.getNextRead()
-    while read:
-        lengths.append(len(read.sequence))
-        if len(lengths) >= samplesize:
-            break
-        read = fastq.getNextRead()
+    block = fastq.getNextReadBlock(readCount)
+    fastq.close()
+    if block is None:
+        raise FastqFormatError("Unable to find any reads in %s" % path)
+    return block
+
+
+def estimateReadLengthFromBlock(
+    block: FastqReadBlock, samplesize: int = 100, getVariance=False
+):
+    lengths = block.readLengths[:samplesize].tolist()
     meanReadLength = sum(lengths) / len(lengths)
     if getVariance:
         import statistics
@@ -668,6 +915,12 @@ def estimateReadLength(path: str, samplesize: int = 100, getVariance=False):
     return round(meanReadLength)
 
 
+def estimateReadLength(path: str, samplesize: int = 100, getVariance=False):
+    return estimateReadLengthFromBlock(
+        readProbeBlock(path, samplesize), samplesize, getVariance
+    )
+
+
 def getLongestReadInFile(path: str):
     longestReadLength = 0
     fastq = FastqFile(path)
@@ -689,6 +942,46 @@ def countReads(path: str):
     return readCount
 
 
+def estimateReadCount(path: str, probeReadCount: int = 100):
+    """
+    Estimates how many reads a file holds from its size and the size of its first reads, without reading it through. Gzipped files are assumed to be about 3.5 times smaller than their contents.
+    """
+    try:
+        from . import gzipIdentifier
+    except ImportError:
+        import gzipIdentifier
+    fileSize = os.path.getsize(path)
+    if gzipIdentifier.isGzipped(path):
+        fileSize *= 3.5
+    fastq = FastqFile(path)
+    probeBytes = 0
+    probeReads = 0
+    while probeReads < probeReadCount:
+        readBuffer = fastq.getNextRawRead()
+        if not readBuffer or fastq.reachedEnd:
+            break
+        probeBytes += sum([len(line) + 1 for line in readBuffer])
+        probeReads += 1
+    fastq.close()
+    if not probeReads:
+        return 0
+    return int(fileSize * probeReads / probeBytes)
+
+
+def findSpreadSubsample(path: str, readLimit: int, subsample: int = 0):
+    """
+    Finds the subsampling interval that spreads readLimit reads across the whole file instead of taking them from its start.
+    :param readLimit: number of reads wanted from the file (0 for all of them)
+    :param subsample: subsampling interval already in use (0 or 1 for none)
+    :return: a multiple of the given interval, so the reads it keeps are a subset of the ones the given interval keeps
+    """
+    subsample = max(int(subsample), 1)
+    if not readLimit:
+        return subsample
+    availableReads = estimateReadCount(path) // subsample
+    return subsample * max(1, availableReads // readLimit)
+
+
 def findQualityScoreEncoding(path: str, lineLimit: int = 100):
     candidates = qualityScoreHandler.makeEncodingTable()
     for i in range(len(candidates)):
@@ -721,6 +1014,62 @@ def findQualityScoreEncoding(path: str, lineLimit: int = 100):
             return candidate
 
 
+def reencodeFastqFile(
+    inputPath: str,
+    outputPath: str,
+    outputScheme: qualityScoreHandler.EncodingScheme = qualityScoreHandler.encodingSchemes.illumina,
+    inputScheme: qualityScoreHandler.EncodingScheme = None,
+    blockSize: int = defaultReadBlockSize,
+):
+    """
+    Streams a fastq file to a new file with its quality lines converted to another encoding (such as old Illumina 1.5 or Solexa data to Illumina 1.8+).
+    Lines are handled as raw bytes in blocks of reads and quality lines are converted with a precalculated translation table, so there is no per-character Python work.
+    :param inputPath: fastq file to convert, gzipped or not
+    :param outputPath: path for the converted file, which will be gzipped if it ends in .gz
+    :param outputScheme: encoding to convert to
+    :param inputScheme: encoding of the input file, detected from the file if not given
+    :param blockSize: number of reads to convert at a time
+    :return: number of reads written
+    """
+    import itertools
+    import gzip
+
+    try:
+        from . import gzipIdentifier
+    except ImportError:
+        import gzipIdentifier
+    if inputScheme is None:
+        inputScheme = findQualityScoreEncoding(inputPath)
+        if inputScheme is None:
+            raise FastqValidationError(
+                "Unable to determine the quality score encoding of %s" % inputPath
+            )
+    conversionTable = qualityScoreHandler.getConversionTable(inputScheme, outputScheme)
+    if gzipIdentifier.isGzipped(inputPath):
+        openInput = gzip.open
+    else:
+        openInput = open
+    if outputPath.endswith(".gz"):
+        openOutput = gzip.open
+    else:
+        openOutput = open
+    readCount = 0
+    with openInput(inputPath, "rb") as inputFile, openOutput(
+        outputPath, "wb"
+    ) as outputFile:
+        while True:
+            lines = list(itertools.islice(inputFile, blockSize * 4))
+            if not lines:
+                break
+            lines[3::4] = [
+                line.rstrip(b"\r\n").translate(conversionTable) + b"\n"
+                for line in lines[3::4]
+            ]
+            outputFile.writelines(lines)
+            readCount += len(lines) // 4
+    return readCount
+
+
 def findSamplesInFolder(
     directory: str,
     namingStandard: typing.Type[
@@ -27,12 +27,35 @@ def getApplicationParameters():
     parameters.addParameter(
         "outputFileName", str, default=default.outputFileName, externalValidation=True
     )
-    parameters.addParameter("ampliconLength", int, lowerBound=0, required=True)
+    parameters.addParameter("singleEnd", bool, default=default.singleEnd)
+    parameters.addParameter(
+        "estimateAmpliconLength", bool, default=default.estimateAmpliconLength
+    )
+    parameters.addParameter(
+        "ampliconLength",
+        int,
+        default=0,
+        lowerBound=0,
+        required=not (
+            parameters.singleEnd.value or parameters.estimateAmpliconLength.value
+        ),
+    )
     parameters.addParameter(
         "forwardPrimerLength", int, required=True, lowerBound=0, upperBound=50
     )
     parameters.addParameter(
-        "reversePrimerLength", int, required=True, lowerBound=0, upperBound=50
+        "reversePrimerLength",
+        int,
+        default=0,
+        required=not parameters.singleEnd.value,
+        lowerBound=0,
+        upperBound=50,
+    )
+    parameters.addParameter(
+        "minimumReadLength",
+        int,
+        default=default.minimumReadLength,
+        lowerBound=0,
     )
     parameters.addParameter(
         "inputDirectory", str, default=default.inputFolder, expectedDirectory=True
@@ -45,11 +68,57 @@ def getApplicationParameters():
     )
     parameters.addParameter("subsample", int, default=default.subsample, lowerBound=-1)
     parameters.addParameter(
-        "percentile", int, default=default.percentile, lowerBound=1, upperBound=100
+        "percentile", str, default=str(default.percentile), externalValidation=True
     )
     parameters.addParameter(
         "fileNamingStandard", str, default="nononsense", externalValidation=True
     )
+    parameters.addParameter("lite", bool, default=default.lite)
+    parameters.addParameter("fullGridSearch", bool, default=default.fullGridSearch)
+    parameters.addParameter(
+        "expectedErrorMatrices", bool, default=default.expectedErrorMatrices
+    )
+    parameters.addParameter("qualityReport", bool, default=default.qualityReport)
+    parameters.addParameter(
+        "compositionReport", bool, default=default.compositionReport
+    )
+    parameters.addParameter(
+        "estimateUniqueSequences", bool, default=default.estimateUniqueSequences
+    )
+    parameters.addParameter(
+        "estimateMergeRate", bool, default=default.estimateMergeRate
+    )
+    parameters.addParameter(
+        "topResultCount", int, default=default.topResultCount, lowerBound=0
+    )
+    parameters.addParameter("paretoFront", bool, default=default.paretoFront)
+    parameters.addParameter(
+        "bootstrapReplicates", int, default=default.bootstrapReplicates, lowerBound=0
+    )
+    parameters.addParameter("bootstrapSamples", bool, default=default.bootstrapSamples)
+    parameters.addParameter("influenceReport", bool, default=default.influenceReport)
+    parameters.addParameter(
+        "sampleRetentionReport", bool, default=default.sampleRetentionReport
+    )
+    parameters.addParameter(
+        "equalSampleWeights", bool, default=default.equalSampleWeights
+    )
+    parameters.addParameter(
+        "retentionPrecision", float, default=default.retentionPrecision, lowerBound=0
+    )
+    parameters.addParameter(
+        "maxExpectedErrorSearchLimit",
+        int,
+        default=default.maxExpectedErrorSearchLimit,
+        lowerBound=0,
+        upperBound=100,
+    )
+    parameters.addParameter(
+        "truncQ",
+        str,
+        default=",".join([str(truncQ) for truncQ in default.truncQ]),
+        externalValidation=True,
+    )
     parameters.checkCreatedFileStructures()
     if (
         not parameters.fileNamingStandard.value.lower()
@@ -59,6 +128,26 @@ def getApplicationParameters():
             "%s is not a valid naming standard alias"
             % parameters.fileNamingStandard.value
         )
+    parsePercentiles(parameters.percentile.value)
+    parseTruncQValues(parameters.truncQ.value)
+    if parameters.singleEnd.value and not parameters.minimumReadLength.value > 0:
+        raise ValueError("Single-end mode requires a minimum read length.")
+    if parameters.singleEnd.value:
+        checkSingleEndOptions(
+            {
+                "FULLGRIDSEARCH": parameters.fullGridSearch.value,
+                "EXPECTEDERRORMATRICES": parameters.expectedErrorMatrices.value,
+                "TRUNCQ": parseTruncQValues(parameters.truncQ.value),
+                "ESTIMATEUNIQUESEQUENCES": parameters.estimateUniqueSequences.value,
+                "ESTIMATEMERGERATE": parameters.estimateMergeRate.value,
+                "ESTIMATEAMPLICONLENGTH": parameters.estimateAmpliconLength.value,
+                "PARETOFRONT": parameters.paretoFront.value,
+                "BOOTSTRAPREPLICATES": parameters.bootstrapReplicates.value,
+                "BOOTSTRAPSAMPLES": parameters.bootstrapSamples.value,
+                "INFLUENCEREPORT": parameters.influenceReport.value,
+                "SAMPLERETENTIONREPORT": parameters.sampleRetentionReport.value,
+            }
+        )
     combinedReadLengths = (
         parameters.ampliconLength.value + parameters.minimumOverlap.value
     )
@@ -81,6 +170,73 @@ def getApplicationParameters():
     return parameters
 
 
+def parsePercentiles(percentiles: str):
+    """
+    Reads one or more comma separated percentiles, such as "83" or "50,75,83,90,95".
+    :return: list of integer percentiles in the order given
+    """
+    percentileList = []
+    for percentile in percentiles.replace(" ", ",").split(","):
+        if not percentile:
+            continue
+        try:
+            percentile = int(percentile)
+        except ValueError:
+            raise ValueError(
+                "Percentiles must be integer values between 1 and 100. %s was given."
+                % percentile
+            )
+        if percentile < 1 or percentile > 100:
+            raise ValueError(
+                "Percentile must be an integer value between 1 and 100. %s was given."
+                % percentile
+            )
+        if percentile not in percentileList:
+            percentileList.append(percentile)
+    if not percentileList:
+        raise ValueError("No percentile was given.")
+    return percentileList
+
+
+def parseTruncQValues(truncQValues: str):
+    """
+    Reads zero or more comma separated dada2 truncQ values, such as "2,5,10".
+    :return: list of integer truncQ values in the order given (empty if none were given)
+    """
+    truncQList = []
+    for truncQ in truncQValues.replace(" ", ",").split(","):
+        if not truncQ:
+            continue
+        try:
+            truncQ = int(truncQ)
+        except ValueError:
+            raise ValueError(
+                "truncQ values must be integer values between 0 and 41. %s was given."
+                % truncQ
+            )
+        if truncQ < 0 or truncQ > 41:
+            raise ValueError(
+                "truncQ must be an integer value between 0 and 41. %s was given."
+                % truncQ
+            )
+        if truncQ not in truncQList:
+            truncQList.append(truncQ)
+    return truncQList
+
+
+def checkSingleEndOptions(pairedEndOptions: dict):
+    """
+    Rejects options that only apply to paired reads, so that they are not silently ignored in single-end mode.
+    :param pairedEndOptions: name: value for each paired-end only option, named the way the user gave it
+    """
+    requestedOptions = [name for name, value in pairedEndOptions.items() if value]
+    if requestedOptions:
+        raise ValueError(
+            "These options only apply to paired reads and cannot be used in single-end mode: %s"
+            % ", ".join(requestedOptions)
+        )
+
+
 def parseArgs():
     import argparse
     import os
@@ -92,8 +248,8 @@ def parseArgs():
     parser.add_argument(
         "-a",
         "--ampliconLength",
-        help="Length of amplicon (not including primers)",
-        required=True,
+        help="Length of amplicon (not including primers). Required unless running in single-end mode or estimating it with -A",
+        default=None,
         type=int,
     )
     parser.add_argument(
@@ -106,8 +262,8 @@ def parseArgs():
     parser.add_argument(
         "-r",
         "--reversePrimerLength",
-        help="Length of reverse primer",
-        required=True,
+        help="Length of reverse primer. Required unless running in single-end mode",
+        default=None,
         type=int,
     )
     parser.add_argument(
@@ -139,9 +295,9 @@ def parseArgs():
     parser.add_argument(
         "-p",
         "--percentile",
-        help="Percentile to use for expected error model",
-        default=default.percentile,
-        type=int,
+        help="Percentile(s) to use for expected error model. Several can be given (space or comma separated) to get one result table for each",
+        default=[str(default.percentile)],
+        nargs="+",
     )
     parser.add_argument(
         "-F",
@@ -150,6 +306,132 @@ def parseArgs():
         default="nononsense",
     )
     parser.add_argument("-l", "--logFile", help="Log file path", default=None)
+    parser.add_argument(
+        "-L",
+        "--lite",
+        help="Only model expected error (skips the first N base and Q<=2 truncation checks)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-G",
+        "--fullGridSearch",
+        help="Test every forward and reverse trim position pair reaching the minimum combined length, not just the pairs that exactly reach it",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-X",
+        "--expectedErrorMatrices",
+        help="Test trim parameters on full expected error matrices instead of crossing tables. Gives the same results more slowly, and cannot be combined with options that need crossing tables",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-E",
+        "--maxExpectedErrorSearchLimit",
+        help="Search every pair of max expected errors up to this value for each trim position pair instead of using the values from the expected error curves (0 to disable)",
+        default=default.maxExpectedErrorSearchLimit,
+        type=int,
+    )
+    parser.add_argument(
+        "-Q",
+        "--qualityReport",
+        help="Write per-position quality score distributions for each read direction, gathered while testing trim parameters",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-C",
+        "--compositionReport",
+        help="Write per-position base composition and per-read GC content distributions for each read direction, gathered while testing trim parameters",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-T",
+        "--truncQ",
+        help="Candidate dada2 truncQ values (space or comma separated) to test every trim parameter set under, in place of the fixed Q<=2 check",
+        default=[str(truncQ) for truncQ in default.truncQ],
+        nargs="+",
+    )
+    parser.add_argument(
+        "-U",
+        "--estimateUniqueSequences",
+        help="Estimate the unique forward and reverse sequences left after each trim (a guide to dada2 run time) from sketches gathered while testing trim parameters",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-M",
+        "--estimateMergeRate",
+        help="Estimate how many read pairs would merge at each trim from the overlap of a sample of read pairs",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-A",
+        "--estimateAmpliconLength",
+        help="Find the amplicon length of a sample of read pairs from their overlaps, and report the distribution and a suggested amplicon length. The suggestion is used if no amplicon length is given",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-k",
+        "--topResultCount",
+        help="Only report this many of the best scoring trim parameter sets (0 for all of them)",
+        default=default.topResultCount,
+        type=int,
+    )
+    parser.add_argument(
+        "-P",
+        "--paretoFront",
+        help="Also write the trim parameter sets that no other set matches or beats on read retention, total max expected error and combined trim length at once",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-B",
+        "--bootstrapReplicates",
+        help="Bootstrap the read retention of the best scoring trim parameter sets this many times, adding confidence intervals and how often each set scored best (0 to disable)",
+        default=default.bootstrapReplicates,
+        type=int,
+    )
+    parser.add_argument(
+        "-b",
+        "--bootstrapSamples",
+        help="Resample whole samples instead of reads for the bootstrap",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-I",
+        "--influenceReport",
+        help="Find the recommended trim parameters with each sample left out, and flag samples whose removal changes the recommendation",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-D",
+        "--sampleRetentionReport",
+        help="Write each sample's read retention at the best scoring trim parameter sets, to spot samples that would fall below a useful read depth",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-W",
+        "--equalSampleWeights",
+        help="Score read retention as the average of each sample's own retention, so that deep samples do not outweigh the rest",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-c",
+        "--retentionPrecision",
+        help="With equal sample weights, only read as many reads from each sample as needed for its read retention to have this standard error in percentage points (0 to read them all)",
+        default=default.retentionPrecision,
+        type=float,
+    )
+    parser.add_argument(
+        "-S",
+        "--singleEnd",
+        help="Analyze forward reads only, ranking a single trim length and max expected error for single-end or Deblur-style workflows",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-R",
+        "--minimumReadLength",
+        help="Shortest read length (not including the primer) to consider trimming to in single-end mode",
+        default=default.minimumReadLength,
+        type=int,
+    )
     return parser.parse_args()
 
 
@@ -164,7 +446,19 @@ def getApplicationParametersFromCommandLine():
             "%s is not a valid naming standard alias" % args.fileNamingStandard
         )
     fileNamingStandard = args.fileNamingStandard
-    if not ampliconLength > 0:
+    singleEnd = args.singleEnd
+    minimumReadLength = args.minimumReadLength
+    if singleEnd:
+        if not minimumReadLength > 0:
+            raise ValueError(
+                "Single-end mode requires a positive minimum read length. %s was given"
+                % minimumReadLength
+            )
+        if ampliconLength is None:
+            ampliconLength = 0
+    elif ampliconLength is None and args.estimateAmpliconLength:
+        ampliconLength = 0
+    elif ampliconLength is None or not ampliconLength > 0:
         raise ValueError(
             "Amplicon length must be a positive integer. %s was given" % ampliconLength
         )
@@ -175,6 +469,12 @@ def getApplicationParametersFromCommandLine():
             % forwardPrimerLength
         )
     reversePrimerLength = args.reversePrimerLength
+    if reversePrimerLength is None:
+        if not singleEnd:
+            raise ValueError(
+                "A reverse primer length is required unless running in single-end mode"
+            )
+        reversePrimerLength = 0
     if not reversePrimerLength >= 0:
         raise ValueError(
             "Reverse primer length must be a positive integer. %s was given"
@@ -202,11 +502,47 @@ def getApplicationParametersFromCommandLine():
         )
         fastqGigabytes = totalFileSize / 1000000000
         subsample = round(fastqGigabytes * 10)
-    percentile = args.percentile
-    if percentile < 0 or percentile > 100:
+    percentiles = parsePercentiles(",".join(args.percentile))
+    truncQValues = parseTruncQValues(",".join(args.truncQ))
+    maxExpectedErrorSearchLimit = args.maxExpectedErrorSearchLimit
+    if maxExpectedErrorSearchLimit < 0 or maxExpectedErrorSearchLimit > 100:
+        raise ValueError(
+            "Max expected error search limit must be an integer value between 0 and 100. %s was given."
+            % maxExpectedErrorSearchLimit
+        )
+    topResultCount = args.topResultCount
+    if topResultCount < 0:
+        raise ValueError(
+            "Top result count must be zero or a positive integer. %s was given."
+            % topResultCount
+        )
+    bootstrapReplicates = args.bootstrapReplicates
+    if bootstrapReplicates < 0:
+        raise ValueError(
+            "Bootstrap replicates must be zero or a positive integer. %s was given."
+            % bootstrapReplicates
+        )
+    retentionPrecision = args.retentionPrecision
+    if retentionPrecision < 0:
         raise ValueError(
-            "Percentile must be an integer value between 0 and 100. %s was given."
-            % percentile
+            "Retention precision must be zero or a positive number. %s was given."
+            % retentionPrecision
+        )
+    if singleEnd:
+        checkSingleEndOptions(
+            {
+                "-G/--fullGridSearch": args.fullGridSearch,
+                "-X/--expectedErrorMatrices": args.expectedErrorMatrices,
+                "-T/--truncQ": truncQValues,
+                "-U/--estimateUniqueSequences": args.estimateUniqueSequences,
+                "-M/--estimateMergeRate": args.estimateMergeRate,
+                "-A/--estimateAmpliconLength": args.estimateAmpliconLength,
+                "-P/--paretoFront": args.paretoFront,
+                "-B/--bootstrapReplicates": bootstrapReplicates,
+                "-b/--bootstrapSamples": args.bootstrapSamples,
+                "-I/--influenceReport": args.influenceReport,
+                "-D/--sampleRetentionReport": args.sampleRetentionReport,
+            }
         )
     combinedReadLengths = ampliconLength + minimumOverlap
     # side-load args into parameter types
@@ -219,9 +555,37 @@ def getApplicationParametersFromCommandLine():
     parameters.sideLoadParameter("outputDirectory", outputDirectory)
     parameters.sideLoadParameter("minimumOverlap", minimumOverlap)
     parameters.sideLoadParameter("subsample", subsample)
-    parameters.sideLoadParameter("percentile", percentile)
+    parameters.sideLoadParameter(
+        "percentile", ",".join([str(percentile) for percentile in percentiles])
+    )
     parameters.sideLoadParameter("minimumCombinedReadLength", combinedReadLengths)
     parameters.sideLoadParameter("fileNamingStandard", fileNamingStandard)
+    parameters.sideLoadParameter("lite", args.lite)
+    parameters.sideLoadParameter("fullGridSearch", args.fullGridSearch)
+    parameters.sideLoadParameter("expectedErrorMatrices", args.expectedErrorMatrices)
+    parameters.sideLoadParameter(
+        "maxExpectedErrorSearchLimit", maxExpectedErrorSearchLimit
+    )
+    parameters.sideLoadParameter("qualityReport", args.qualityReport)
+    parameters.sideLoadParameter("compositionReport", args.compositionReport)
+    parameters.sideLoadParameter(
+        "estimateUniqueSequences", args.estimateUniqueSequences
+    )
+    parameters.sideLoadParameter("estimateMergeRate", args.estimateMergeRate)
+    parameters.sideLoadParameter("estimateAmpliconLength", args.estimateAmpliconLength)
+    parameters.sideLoadParameter("topResultCount", topResultCount)
+    parameters.sideLoadParameter("paretoFront", args.paretoFront)
+    parameters.sideLoadParameter("bootstrapReplicates", bootstrapReplicates)
+    parameters.sideLoadParameter("bootstrapSamples", args.bootstrapSamples)
+    parameters.sideLoadParameter("influenceReport", args.influenceReport)
+    parameters.sideLoadParameter("sampleRetentionReport", args.sampleRetentionReport)
+    parameters.sideLoadParameter("equalSampleWeights", args.equalSampleWeights)
+    parameters.sideLoadParameter("retentionPrecision", retentionPrecision)
+    parameters.sideLoadParameter("singleEnd", singleEnd)
+    parameters.sideLoadParameter("minimumReadLength", minimumReadLength)
+    parameters.sideLoadParameter(
+        "truncQ", ",".join([str(truncQ) for truncQ in truncQValues])
+    )
     return parameters
 
 
@@ -298,15 +662,26 @@ def makeResultJSON(resultTable: list, indent: int = 0):
     return json.dumps(resultDictList, indent=indent)
 
 
+def addFileNameTag(fileName: str, tag: str = None):
+    import os
+
+    if not tag:
+        return fileName
+    fileNameBase, extension = os.path.splitext(fileName)
+    return "%s.%s%s" % (fileNameBase, tag, extension)
+
+
 def saveResultOutput(
     outputDirectory: str,
     outputResultTableFileName: str,
     resultTable: list,
     forwardCurve,
-    reverseCurve,
+    reverseCurve=None,
+    fileNameTag: str = None,
 ):
     import os
 
+    outputResultTableFileName = addFileNameTag(outputResultTableFileName, fileNameTag)
     outputResultTablePath = os.path.join(outputDirectory, outputResultTableFileName)
     outputResultTableFile = open(outputResultTablePath, "w")
     outputResultTableFile.write(makeResultJSON(resultTable, indent=4))
@@ -317,16 +692,16 @@ def saveResultOutput(
         import base64
 
         outputForwardCurvePath = os.path.join(
-            outputDirectory, "forwardExpectedError.png"
+            outputDirectory, addFileNameTag("forwardExpectedError.png", fileNameTag)
         )
         outputForwardCurveFile = open(outputForwardCurvePath, "wb")
         outputForwardCurveFile.write(base64.b64decode(forwardCurve.curvePNG))
         outputForwardCurveFile.close()
-    if reverseCurve.curvePNG:
+    if reverseCurve is not None and reverseCurve.curvePNG:
         import base64
 
         outputReverseCurvePath = os.path.join(
-            outputDirectory, "reverseExpectedError.png"
+            outputDirectory, addFileNameTag("reverseExpectedError.png", fileNameTag)
         )
         outputReverseCurveFile = open(outputReverseCurvePath, "wb")
         outputReverseCurveFile.write(base64.b64decode(reverseCurve.curvePNG))
@@ -334,6 +709,19 @@ def saveResultOutput(
     return outputResultTablePath, outputForwardCurvePath, outputReverseCurvePath
 
 
+def saveReports(outputDirectory: str, reports: dict):
+    import os
+
+    reportPaths = []
+    for reportFileName, report in reports.items():
+        reportPath = os.path.join(outputDirectory, reportFileName)
+        reportFile = open(reportPath, "w")
+        reportFile.write(report)
+        reportFile.close()
+        reportPaths.append(reportPath)
+    return reportPaths
+
+
 def runAnalysis(
     inputDirectory: str,
     ampliconLength: int,
@@ -342,7 +730,28 @@ def runAnalysis(
     minimumOverlap: int = 20,
     fileNamingStandard: str = "nononsense",
     subsample: int = -1,
-    percentile: int = 83,
+    percentile: [int, list] = 83,
+    lite: bool = False,
+    fullGridSearch: bool = False,
+    maxExpectedErrorSearchLimit: int = 0,
+    truncQ: list = None,
+    topResultCount: int = 0,
+    bootstrapReplicates: int = 0,
+    bootstrapSamples: bool = False,
+    singleEnd: bool = False,
+    minimumReadLength: int = 0,
+    equalSampleWeights: bool = False,
+    retentionPrecision: float = default.retentionPrecision,
+    useCrossingTables: bool = True,
+    qualityReport: bool = False,
+    compositionReport: bool = False,
+    estimateUniqueSequences: bool = False,
+    estimateMergeRate: bool = False,
+    estimateAmpliconLength: bool = False,
+    paretoFront: bool = False,
+    influenceReport: bool = False,
+    sampleRetentionReport: bool = False,
+    reports: dict = None,
 ):
     import os
 
@@ -354,18 +763,75 @@ def runAnalysis(
         )
         fastqGigabytes = totalFileSize / 1000000000
         subsample = round(fastqGigabytes * 10)
-    resultTable, forwardCurve, reverseCurve = (
-        trimParameterPrediction.performAnalysisLite(
+    if isinstance(percentile, int):
+        percentiles = [percentile]
+    else:
+        percentiles = list(percentile)
+    if singleEnd:
+        checkSingleEndOptions(
+            {
+                "fullGridSearch": fullGridSearch,
+                "useCrossingTables=False": not useCrossingTables,
+                "truncQ": truncQ,
+                "estimateUniqueSequences": estimateUniqueSequences,
+                "estimateMergeRate": estimateMergeRate,
+                "estimateAmpliconLength": estimateAmpliconLength,
+                "paretoFront": paretoFront,
+                "bootstrapReplicates": bootstrapReplicates,
+                "bootstrapSamples": bootstrapSamples,
+                "influenceReport": influenceReport,
+                "sampleRetentionReport": sampleRetentionReport,
+            }
+        )
+        results = trimParameterPrediction.performSingleEndAnalysis(
+            inputDirectory,
+            minimumReadLength,
+            subsample=subsample,
+            percentiles=percentiles,
+            primerLength=forwardPrimerLength,
+            namingStandardAlias=fileNamingStandard,
+            maxExpectedErrorSearchLimit=maxExpectedErrorSearchLimit,
+            topResultCount=topResultCount,
+            lite=lite,
+            qualityReport=qualityReport,
+            compositionReport=compositionReport,
+            equalSampleWeights=equalSampleWeights,
+            retentionPrecision=retentionPrecision,
+            reports=reports,
+        )
+    else:
+        results = trimParameterPrediction.performAnalysisForPercentiles(
             inputDirectory,
-            ampliconLength + minimumOverlap,
+            (ampliconLength or 0) + minimumOverlap,
             subsample=subsample,
-            percentile=percentile,
+            percentiles=percentiles,
             forwardPrimerLength=forwardPrimerLength,
             reversePrimerLength=reversePrimerLength,
             namingStandardAlias=fileNamingStandard,
+            useCrossingTables=useCrossingTables,
+            fullGridSearch=fullGridSearch,
+            maxExpectedErrorSearchLimit=maxExpectedErrorSearchLimit,
+            lite=lite,
+            qualityReport=qualityReport,
+            compositionReport=compositionReport,
+            truncQValues=truncQ,
+            estimateUniqueSequences=estimateUniqueSequences,
+            estimateMergeRate=estimateMergeRate,
+            ampliconLength=ampliconLength or 0,
+            estimateAmpliconLength=estimateAmpliconLength,
+            topResultCount=topResultCount,
+            paretoFront=paretoFront,
+            bootstrapReplicateCount=bootstrapReplicates,
+            bootstrapSamples=bootstrapSamples,
+            influenceReport=influenceReport,
+            sampleRetentionReport=sampleRetentionReport,
+            equalSampleWeights=equalSampleWeights,
+            retentionPrecision=retentionPrecision,
+            reports=reports,
         )
-    )
-    return resultTable, forwardCurve, reverseCurve
+    if isinstance(percentile, int):
+        return results[0]
+    return results
 
 
 def main():
@@ -376,29 +842,74 @@ def main():
     setLogging()
     parameters = getApplicationParameters()
     fileNamingStandard = parameters.fileNamingStandard.value
-    resultTable, forwardCurve, reverseCurve = (
-        trimParameterPrediction.performAnalysisLite(
+    percentiles = parsePercentiles(parameters.percentile.value)
+    reports = {}
+    if parameters.singleEnd.value:
+        results = trimParameterPrediction.performSingleEndAnalysis(
+            parameters.inputDirectory.value,
+            parameters.minimumReadLength.value,
+            subsample=parameters.subsample.value,
+            percentiles=percentiles,
+            primerLength=parameters.forwardPrimerLength.value,
+            namingStandardAlias=fileNamingStandard,
+            maxExpectedErrorSearchLimit=parameters.maxExpectedErrorSearchLimit.value,
+            topResultCount=parameters.topResultCount.value,
+            lite=parameters.lite.value,
+            qualityReport=parameters.qualityReport.value,
+            compositionReport=parameters.compositionReport.value,
+            equalSampleWeights=parameters.equalSampleWeights.value,
+            retentionPrecision=parameters.retentionPrecision.value,
+            reports=reports,
+        )
+        results = [(resultTable, curve, None) for resultTable, curve in results]
+    else:
+        results = trimParameterPrediction.performAnalysisForPercentiles(
             parameters.inputDirectory.value,
             parameters.minimumCombinedReadLength.value,
             subsample=parameters.subsample.value,
-            percentile=parameters.percentile.value,
+            percentiles=percentiles,
             forwardPrimerLength=parameters.forwardPrimerLength.value,
             reversePrimerLength=parameters.reversePrimerLength.value,
             namingStandardAlias=fileNamingStandard,
+            useCrossingTables=not parameters.expectedErrorMatrices.value,
+            fullGridSearch=parameters.fullGridSearch.value,
+            maxExpectedErrorSearchLimit=parameters.maxExpectedErrorSearchLimit.value,
+            lite=parameters.lite.value,
+            qualityReport=parameters.qualityReport.value,
+            compositionReport=parameters.compositionReport.value,
+            truncQValues=parseTruncQValues(parameters.truncQ.value),
+            estimateUniqueSequences=parameters.estimateUniqueSequences.value,
+            estimateMergeRate=parameters.estimateMergeRate.value,
+            ampliconLength=parameters.ampliconLength.value,
+            estimateAmpliconLength=parameters.estimateAmpliconLength.value,
+            topResultCount=parameters.topResultCount.value,
+            paretoFront=parameters.paretoFront.value,
+            bootstrapReplicateCount=parameters.bootstrapReplicates.value,
+            bootstrapSamples=parameters.bootstrapSamples.value,
+            influenceReport=parameters.influenceReport.value,
+            sampleRetentionReport=parameters.sampleRetentionReport.value,
+            equalSampleWeights=parameters.equalSampleWeights.value,
+            retentionPrecision=parameters.retentionPrecision.value,
+            reports=reports,
         )
-    )
-    for result in resultTable:
-        print(result)
-    resultTableFileName = os.path.join(
-        parameters.outputDirectory.value, parameters.outputFileName.value
-    )
-    saveResultOutput(
-        parameters.outputDirectory.value,
-        parameters.outputFileName.value,
-        resultTable,
-        forwardCurve,
-        reverseCurve,
-    )
+    for percentile, (resultTable, forwardCurve, reverseCurve) in zip(
+        percentiles, results
+    ):
+        fileNameTag = None
+        if len(percentiles) > 1:
+            fileNameTag = "percentile%s" % percentile
+            print("Percentile %s:" % percentile)
+        for result in resultTable:
+            print(result)
+        saveResultOutput(
+            parameters.outputDirectory.value,
+            parameters.outputFileName.value,
+            resultTable,
+            forwardCurve,
+            reverseCurve,
+            fileNameTag,
+        )
+    saveReports(parameters.outputDirectory.value, reports)
     print("Run time: %s" % (datetime.datetime.now() - startTime))
 
 
@@ -1,6 +1,7 @@
 import logging
 import math
 import typing
+import numpy
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,7 @@ class EncodingScheme(object):
         self.range = self.calculateRange(startCharacter, endCharacter)
         self.fromPErrorFormula = pErrorToScore
         self.toPErrorFormula = scoreToPError
+        self.pErrorTable = self.makePErrorTable()
 
     def makeCharacterSet(self, start: str, end: str):
         rangeStart = ord(start)
@@ -33,6 +35,15 @@ class EncodingScheme(object):
         rangeEnd = ord(end)
         return rangeEnd - rangeStart
 
+    def makePErrorTable(self):
+        """
+        Precalculates the error probability for every possible byte value so that whole blocks of quality characters can be converted with a single lookup.
+        Bytes outside of the encoding's character set still get a value from the formula (a zero byte, used to pad short reads in blocks, comes out as a very large error).
+        :return: numpy array of 256 error probabilities indexed by the quality character's byte value
+        """
+        scores = numpy.arange(256, dtype="float64") - self.base
+        return numpy.asarray(self.toPErrorFormula(scores), dtype="float64")
+
     def toPError(self, score: [int, str]):
         if isinstance(score, str):
             if len(score) == 1:
@@ -95,10 +106,17 @@ def convertCharacterToScore(character, base: int = 33):
 
 
 def convertToNumericArray(qualityString, base: int = 33):
-    phredScores = []
-    for character in qualityString:
-        phredScores.append(convertCharacterToScore(character, base))
-    return tuple(phredScores)
+    return tuple(
+        (qualityStringToByteArray(qualityString).astype("int16") - base).tolist()
+    )
+
+
+def convertQualityBlockToScores(qualityBlock: numpy.ndarray, base: int = 33):
+    """
+    Converts a whole block of quality characters (such as FastqReadBlock.qualities) to numeric scores at once.
+    :return: int16 array of scores the same shape as the block
+    """
+    return qualityBlock.astype("int16") - base
 
 
 def pErrorToPhred(pError: float, roundValue: bool = True):
@@ -122,7 +140,7 @@ def pErrorToSolexa(
 
 
 def solexaToPError(
-    solexa: [int, float]
+    solexa: [int, float],
 ):  # seriously, who uses this encoding anymore, and who realizes that it's a slightly different formula?
     return 1 / (
         (10 ** (solexa / 10)) + 1
@@ -156,16 +174,79 @@ class _Encodings(object):
 encodingSchemes = _Encodings()
 
 
+def qualityStringToByteArray(qualityString: str):
+    return numpy.frombuffer(str(qualityString).encode("latin-1"), dtype="uint8")
+
+
+def cumulativeExpectedErrorBlock(
+    qualityBlock: numpy.ndarray, encoding: EncodingScheme = encodingSchemes.illumina
+):
+    """
+    Calculates cumulative expected error for a whole block of reads at once.
+    :param qualityBlock: uint8 array of quality characters with reads as rows and positions as columns (a single 1-D read works too)
+    :param encoding: quality score encoding scheme for the block
+    :return: float64 array of the same shape as the block with the cumulative expected error at each position
+    """
+    return numpy.cumsum(encoding.pErrorTable[qualityBlock], axis=-1)
+
+
 def cumulativeExpectedErrorArray(
     qualityString: str, encoding: EncodingScheme = encodingSchemes.illumina
 ):
-    cumulativeExpectedErrorArray = []
-    cumulativeExpectedError = 0.0  # ask me no questions, I'll tell you no lies/errors
-    qualityString = str(qualityString)
-    for character in qualityString:
-        cumulativeExpectedError += encoding.toPError(character)
-        cumulativeExpectedErrorArray.append(cumulativeExpectedError)
-    return cumulativeExpectedErrorArray
+    return cumulativeExpectedErrorBlock(
+        qualityStringToByteArray(qualityString), encoding
+    ).tolist()
+
+
+expectedErrorFixedPointScale = 256  # 1/256 of an expected error per step
+expectedErrorFixedPointMax = 65535  # uint16 ceiling, about 256 expected errors
+
+
+def expectedErrorToFixedPoint(expectedErrors: [numpy.ndarray, float]):
+    """
+    Converts expected error values to uint16 fixed point with 1/256 resolution, saturating at the top of the range.
+    Values are rounded up and limits down, so a stored value is <= maxExpectedErrorToFixedPoint(maxEE) only when the expected error is <= maxEE, which is the test dada2 applies.
+    The comparison is exact for any maxEE that is a multiple of 1/256, whole numbers included; other limits may drop reads within 1/256 under them.
+    :param expectedErrors: expected error value or array of values
+    :return: uint16 array of fixed point expected errors
+    """
+    scaledValues = numpy.ceil(
+        numpy.asarray(expectedErrors, dtype="float64") * expectedErrorFixedPointScale
+    )
+    return numpy.minimum(scaledValues, expectedErrorFixedPointMax).astype("uint16")
+
+
+def maxExpectedErrorToFixedPoint(maxExpectedError: float):
+    fixedPointValue = math.floor(maxExpectedError * expectedErrorFixedPointScale)
+    return min(
+        fixedPointValue, expectedErrorFixedPointMax - 1
+    )  # saturated values are unknown, so they should never pass
+
+
+def expectedErrorCrossingBlock(expectedErrorBlock: numpy.ndarray, maxLevel: int):
+    """
+    Finds, for each whole-number max expected error level from 1 to maxLevel, how many leading positions of each read stay at or under that level.
+    Cumulative expected error never decreases along a read, so this is also the zero-indexed position where the read first goes over the level.
+    Levels are judged on the fixed point values so the result agrees exactly with fixed point expected error matrices.
+    :param expectedErrorBlock: cumulative expected error block with reads as rows and positions as columns
+    :param maxLevel: highest whole-number max expected error level to record
+    :return: uint16 array with levels as rows (row 0 is level 1) and reads as columns
+    """
+    fixedPointBlock = expectedErrorToFixedPoint(expectedErrorBlock).astype("int64")
+    levelsNeeded = numpy.minimum(
+        (fixedPointBlock + expectedErrorFixedPointScale - 1)
+        // expectedErrorFixedPointScale,
+        maxLevel + 1,
+    )  # smallest whole-number max expected error each position passes
+    readCount = levelsNeeded.shape[0]
+    rowOffsets = numpy.arange(readCount, dtype="int64")[:, numpy.newaxis] * (
+        maxLevel + 2
+    )
+    levelCounts = numpy.bincount(
+        (levelsNeeded + rowOffsets).ravel(), minlength=readCount * (maxLevel + 2)
+    ).reshape(readCount, maxLevel + 2)
+    crossings = numpy.cumsum(levelCounts, axis=1)[:, 1 : maxLevel + 1]
+    return numpy.ascontiguousarray(crossings.transpose()).astype("uint16")
 
 
 def cumulativeExpectedErrorArrayDada2Exact(
@@ -181,19 +262,61 @@ def cumulativeExpectedErrorArrayDada2Exact(
     return cumulativeExpectedErrorArray
 
 
+conversionTableCache = {}
+
+
+def makeConversionTable(inputScheme: EncodingScheme, outputScheme: EncodingScheme):
+    """
+    Precalculates the output character for every possible input byte, so that whole quality strings or blocks can be re-encoded with bytes.translate or a numpy lookup.
+    Bytes with no valid conversion (such as a phred score of 0 going to Solexa) map to the lowest character of the output scheme, and results past either end of the byte range are clamped.
+    :return: 256 byte translation table
+    """
+    sameFormula = inputScheme.fromPErrorFormula == outputScheme.fromPErrorFormula
+    baseDifference = inputScheme.base - outputScheme.base
+    outputValues = []
+    for byteValue in range(256):
+        if sameFormula:
+            outputValue = byteValue - baseDifference
+        else:
+            try:
+                pError = inputScheme.toPErrorFormula(byteValue - inputScheme.base)
+                outputValue = ord(outputScheme.encodedFromPError(pError))
+            except (ValueError, ZeroDivisionError, OverflowError):
+                outputValue = ord(outputScheme.characterSet[0])
+        outputValues.append(min(max(outputValue, 0), 255))
+    return bytes.maketrans(bytes(range(256)), bytes(outputValues))
+
+
+def getConversionTable(inputScheme: EncodingScheme, outputScheme: EncodingScheme):
+    tableKey = (inputScheme.name, outputScheme.name)
+    if tableKey not in conversionTableCache:
+        conversionTableCache[tableKey] = makeConversionTable(inputScheme, outputScheme)
+    return conversionTableCache[tableKey]
+
+
 def convertQualityString(
     qualityString: str, inputScheme: EncodingScheme, outputScheme: EncodingScheme
 ):
-    qualityString = str(qualityString)
-    if inputScheme.fromPErrorFormula == outputScheme.fromPErrorFormula:
-        baseDifference = inputScheme.base - outputScheme.base
-        outputString = ""
-        for character in qualityString:
-            outputString += chr(ord(character) - baseDifference)
-        return outputString
-    else:
-        outputString = ""
-        for character in qualityString:
-            pError = inputScheme.toPError(character)
-            outputString += outputScheme.encodedFromPError(pError)
-        return outputString
+    conversionTable = getConversionTable(inputScheme, outputScheme)
+    return (
+        str(qualityString)
+        .encode("latin-1")
+        .translate(conversionTable)
+        .decode("latin-1")
+    )
+
+
+def convertQualityBlock(
+    qualityBlock: numpy.ndarray,
+    inputScheme: EncodingScheme,
+    outputScheme: EncodingScheme,
+):
+    """
+    Re-encodes a whole uint8 block of quality characters with one lookup. Zero bytes padding short reads are left as zero.
+    :return: uint8 array the same shape as the block
+    """
+    conversionArray = numpy.frombuffer(
+        getConversionTable(inputScheme, outputScheme), dtype="uint8"
+    ).copy()
+    conversionArray[0] = 0
+    return conversionArray[qualityBlock]
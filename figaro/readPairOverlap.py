@@ -0,0 +1,426 @@
+import logging
+
+logger = logging.getLogger(__name__)
+try:
+    from . import fastqHandler
+except ImportError:
+    import fastqHandler
+import numpy
+
+defaultSamplePairCount = 200000
+mergeMinimumOverlap = 12  # dada2 mergePairs default
+mergeMaxMismatch = 0  # dada2 mergePairs default
+mergeSurfaceChunkElementLimit = 2**22
+ampliconLengthSamplePairCount = 20000
+ampliconLengthMinimumOverlap = 20
+ampliconLengthMaxMismatchFraction = 0.1
+ampliconLengthSuggestionPercentile = 99
+complementCodeTable = numpy.array([3, 2, 1, 0, 4, 5], dtype="uint8")
+
+
+class ReadPairSample(object):
+    """
+    Base codes (in fastqHandler.compositionBases order, with reads padded past their length by len(compositionBases)) for a sample of read pairs after primer trimming.
+    Row i of the forward and reverse matrices always come from the same pair.
+    """
+
+    __slots__ = ["forwardCodes", "reverseCodes", "forwardLengths", "reverseLengths"]
+
+    def __init__(
+        self,
+        forwardCodes: numpy.ndarray,
+        reverseCodes: numpy.ndarray,
+        forwardLengths: numpy.ndarray,
+        reverseLengths: numpy.ndarray,
+    ):
+        self.forwardCodes = forwardCodes
+        self.reverseCodes = reverseCodes
+        self.forwardLengths = forwardLengths.astype("int64")
+        self.reverseLengths = reverseLengths.astype("int64")
+
+    @property
+    def pairCount(self):
+        return self.forwardCodes.shape[0]
+
+    def subset(self, pairs: [slice, numpy.ndarray]):
+        return ReadPairSample(
+            self.forwardCodes[pairs],
+            self.reverseCodes[pairs],
+            self.forwardLengths[pairs],
+            self.reverseLengths[pairs],
+        )
+
+    def __len__(self):
+        return self.pairCount
+
+
+def combineReadPairSamples(orderedSamples: list):
+    paddingCode = len(fastqHandler.compositionBases)
+
+    def padCodes(codes: numpy.ndarray, width: int):
+        return numpy.pad(
+            codes, ((0, 0), (0, width - codes.shape[1])), constant_values=paddingCode
+        )
+
+    forwardWidth = max([sample.forwardCodes.shape[1] for sample in orderedSamples])
+    reverseWidth = max([sample.reverseCodes.shape[1] for sample in orderedSamples])
+    return ReadPairSample(
+        numpy.concatenate(
+            [padCodes(sample.forwardCodes, forwardWidth) for sample in orderedSamples]
+        ),
+        numpy.concatenate(
+            [padCodes(sample.reverseCodes, reverseWidth) for sample in orderedSamples]
+        ),
+        numpy.concatenate([sample.forwardLengths for sample in orderedSamples]),
+        numpy.concatenate([sample.reverseLengths for sample in orderedSamples]),
+    )
+
+
+def readPairSampleFromFiles(
+    forwardPath: str,
+    reversePath: str,
+    pairCount: int,
+    subsample: int = 0,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    """
+    Reads pairCount read pairs spread across a pair of fastq files. The subsampling interval is widened to fit the file's estimated read count, and it keeps the same reads from both files.
+    """
+    subsample = fastqHandler.findSpreadSubsample(forwardPath, pairCount, subsample)
+    forwardFastq = fastqHandler.FastqFile(
+        forwardPath, subsample=subsample, leftTrim=forwardPrimerLength
+    )
+    reverseFastq = fastqHandler.FastqFile(
+        reversePath, subsample=subsample, leftTrim=reversePrimerLength
+    )
+    forwardBlock = forwardFastq.getNextReadBlock(max(pairCount, 1))
+    reverseBlock = reverseFastq.getNextReadBlock(max(pairCount, 1))
+    forwardFastq.close()
+    reverseFastq.close()
+    if not forwardBlock or not reverseBlock:
+        emptyCodes = numpy.zeros((0, 1), dtype="uint8")
+        emptyLengths = numpy.zeros(0, dtype="int64")
+        return ReadPairSample(emptyCodes, emptyCodes, emptyLengths, emptyLengths)
+    pairs = min(len(forwardBlock), len(reverseBlock))
+    if len(forwardBlock) != len(reverseBlock):
+        logger.error(
+            "Found a different number of reads in %s and %s. Only the first %s pairs will be used."
+            % (forwardPath, reversePath, pairs)
+        )
+    return ReadPairSample(
+        fastqHandler.baseCodeTable[forwardBlock.sequences[:pairs]],
+        fastqHandler.baseCodeTable[reverseBlock.sequences[:pairs]],
+        forwardBlock.readLengths[:pairs],
+        reverseBlock.readLengths[:pairs],
+    )
+
+
+class ReadPairSampleParallelAgent(object):
+
+    def __init__(
+        self,
+        pairCount: int,
+        subsample: int = 0,
+        forwardPrimerLength: int = 0,
+        reversePrimerLength: int = 0,
+    ):
+        self.pairCount = pairCount
+        self.subsample = subsample
+        self.forwardPrimerLength = forwardPrimerLength
+        self.reversePrimerLength = reversePrimerLength
+
+    def makeReadPairSample(self, fastqPair: tuple):
+        forwardFastq, reverseFastq = fastqPair
+        readPairSample = readPairSampleFromFiles(
+            forwardFastq.filePath,
+            reverseFastq.filePath,
+            self.pairCount,
+            self.subsample,
+            self.forwardPrimerLength,
+            self.reversePrimerLength,
+        )
+        return forwardFastq, readPairSample
+
+
+def makeCombinedReadPairSample(
+    fastqList: list,
+    sampleOrder: list,
+    totalPairCount: int = defaultSamplePairCount,
+    subsample: int = 0,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    """
+    Reads an equal share of totalPairCount read pairs, spread across each sample's files, in parallel and combines them in sample order.
+    """
+    try:
+        from . import easyMultiprocessing
+    except ImportError:
+        import easyMultiprocessing
+    reverseFastqList = [fastq for fastq in fastqList if fastq.direction == 2]
+    fastqPairs = []
+    for forwardFastq in sampleOrder:
+        for reverseFastq in reverseFastqList:
+            if forwardFastq.sameSample(reverseFastq):
+                fastqPairs.append((forwardFastq, reverseFastq))
+                break
+    pairsPerSample = -(-totalPairCount // max(len(fastqPairs), 1))
+    parallelAgent = ReadPairSampleParallelAgent(
+        pairsPerSample, subsample, forwardPrimerLength, reversePrimerLength
+    )
+    readPairSamples = easyMultiprocessing.parallelProcessRunner(
+        parallelAgent.makeReadPairSample, fastqPairs
+    )
+    orderedSamples = []
+    for forwardFastq in sampleOrder:
+        for fastq, readPairSample in readPairSamples:
+            if fastq.sameSample(forwardFastq):
+                orderedSamples.append(readPairSample)
+                break
+    return combineReadPairSamples(orderedSamples)
+
+
+def makeOverlapMismatchMatrix(
+    readPairSample: ReadPairSample, ampliconLengths: numpy.ndarray
+):
+    """
+    Lines up each forward read with the reverse complement of its mate as if both came from an amplicon of the given length, and marks the positions where they disagree.
+    Only positions covered by both reads with called bases (A, C, G or T) on both can be mismatches.
+    :param ampliconLengths: amplicon length (not including primers) for each pair
+    :return: boolean matrix with pairs as rows and amplicon positions (up to the longest amplicon) as columns
+    """
+    ampliconLengths = numpy.asarray(ampliconLengths, dtype="int64")
+    width = int(ampliconLengths.max()) if len(ampliconLengths) else 0
+    forwardWidth = readPairSample.forwardCodes.shape[1]
+    reverseWidth = readPairSample.reverseCodes.shape[1]
+    ampliconPositions = numpy.arange(width)
+    forwardColumns = numpy.minimum(ampliconPositions, forwardWidth - 1)
+    forwardCodes = readPairSample.forwardCodes[:, forwardColumns]
+    forwardCovered = (
+        ampliconPositions[numpy.newaxis, :]
+        < numpy.minimum(readPairSample.forwardLengths, ampliconLengths)[
+            :, numpy.newaxis
+        ]
+    )
+    # position k from the start of the reverse read sits at amplicon position (ampliconLength - 1 - k)
+    reverseColumns = (
+        ampliconLengths[:, numpy.newaxis] - 1 - ampliconPositions[numpy.newaxis, :]
+    )
+    reverseCovered = (reverseColumns >= 0) & (
+        reverseColumns < readPairSample.reverseLengths[:, numpy.newaxis]
+    )
+    reverseCodes = numpy.take_along_axis(
+        readPairSample.reverseCodes,
+        numpy.clip(reverseColumns, 0, reverseWidth - 1),
+        axis=1,
+    )
+    calledBases = (forwardCodes < 4) & (reverseCodes < 4)
+    complementedReverseCodes = 3 - reverseCodes.astype("int16")
+    return (
+        forwardCovered
+        & reverseCovered
+        & calledBases
+        & (forwardCodes != complementedReverseCodes)
+    )
+
+
+def countMergeablePairsOnSurface(
+    readPairSample: ReadPairSample,
+    ampliconLengths: numpy.ndarray,
+    minimumOverlap: int = mergeMinimumOverlap,
+    maxMismatch: int = mergeMaxMismatch,
+):
+    """
+    Counts the sampled pairs that would merge at every forward and reverse trim position at once, the way dada2's mergePairs would (overlap of at least minimumOverlap with at most maxMismatch mismatches).
+    For one pair and forward trim, longer reverse trims only add overlap and mismatches, so the reverse trims that merge form one range. Each pair adds one range per forward trim to a difference array, and a cumulative sum over reverse trims gives the counts.
+    :param ampliconLengths: amplicon length (not including primers) for each pair
+    :return: int64 array of mergeable pair counts with zero-indexed forward trim positions as rows and zero-indexed reverse trim positions as columns
+    """
+    ampliconLengths = numpy.asarray(ampliconLengths, dtype="int64")
+    forwardWidth = readPairSample.forwardCodes.shape[1]
+    reverseWidth = readPairSample.reverseCodes.shape[1]
+    surfaceDifferences = numpy.zeros(forwardWidth * (reverseWidth + 2), dtype="int64")
+    forwardLengths = numpy.arange(1, forwardWidth + 1)
+    chunkSize = max(
+        mergeSurfaceChunkElementLimit
+        // max(forwardWidth, int(ampliconLengths.max(initial=0)) + 1),
+        1,
+    )
+    for chunkStart in range(0, readPairSample.pairCount, chunkSize):
+        chunk = slice(chunkStart, chunkStart + chunkSize)
+        chunkSample = readPairSample.subset(chunk)
+        chunkAmpliconLengths = ampliconLengths[chunk]
+        mismatches = makeOverlapMismatchMatrix(chunkSample, chunkAmpliconLengths)
+        pairCount, width = mismatches.shape
+        # cumulativeMismatches[i, x] is the number of mismatches before amplicon position x
+        cumulativeMismatches = numpy.zeros((pairCount, width + 1), dtype="int64")
+        numpy.cumsum(mismatches, axis=1, out=cumulativeMismatches[:, 1:])
+        # amplicon position of each pair's (n + 1)th mismatch, with width for missing ones
+        mismatchPositions = numpy.argsort(~mismatches, axis=1, kind="stable")
+        mismatchPositions = numpy.where(
+            numpy.take_along_axis(mismatches, mismatchPositions, axis=1),
+            mismatchPositions,
+            width,
+        )
+        mismatchPositions = numpy.concatenate(
+            [mismatchPositions, numpy.full((pairCount, 1), width)], axis=1
+        )
+        forwardEnds = numpy.minimum(
+            forwardLengths[numpy.newaxis, :], chunkAmpliconLengths[:, numpy.newaxis]
+        )
+        # mismatches allowed run out at the (excess)th mismatch, so the overlap has to start after it
+        excessMismatches = (
+            numpy.take_along_axis(cumulativeMismatches, forwardEnds, axis=1)
+            - maxMismatch
+        )
+        overlapStarts = numpy.where(
+            excessMismatches > 0,
+            numpy.take_along_axis(
+                mismatchPositions, numpy.maximum(excessMismatches - 1, 0), axis=1
+            )
+            + 1,
+            0,
+        )
+        # the overlap runs from the start of the reverse read (ampliconLength - reverse length) to the end of the forward read within the amplicon
+        lowestReverseLengths = numpy.maximum(
+            chunkAmpliconLengths[:, numpy.newaxis] + minimumOverlap - forwardEnds, 1
+        )
+        highestReverseLengths = numpy.broadcast_to(
+            numpy.minimum(chunkSample.reverseLengths, reverseWidth)[:, numpy.newaxis],
+            forwardEnds.shape,
+        ).copy()
+        # a reverse read running past the start of the amplicon only overhangs, unless the overlap has to start after an excess mismatch
+        numpy.minimum(
+            highestReverseLengths,
+            numpy.where(
+                overlapStarts > 0,
+                chunkAmpliconLengths[:, numpy.newaxis] - overlapStarts,
+                reverseWidth,
+            ),
+            out=highestReverseLengths,
+        )
+        highestReverseLengths[
+            forwardLengths[numpy.newaxis, :]
+            > chunkSample.forwardLengths[:, numpy.newaxis]
+        ] = 0
+        mergeable = (lowestReverseLengths <= highestReverseLengths) & (
+            forwardEnds >= minimumOverlap
+        )
+        forwardRows = numpy.broadcast_to(
+            numpy.arange(forwardWidth)[numpy.newaxis, :], mergeable.shape
+        )[mergeable]
+        # reverse lengths 1 to reverseWidth are zero-indexed trim positions 0 to reverseWidth - 1
+        surfaceDifferences += numpy.bincount(
+            forwardRows * (reverseWidth + 2) + lowestReverseLengths[mergeable] - 1,
+            minlength=len(surfaceDifferences),
+        )
+        surfaceDifferences -= numpy.bincount(
+            forwardRows * (reverseWidth + 2) + highestReverseLengths[mergeable],
+            minlength=len(surfaceDifferences),
+        )
+    return numpy.cumsum(
+        surfaceDifferences.reshape(forwardWidth, reverseWidth + 2), axis=1
+    )[:, :reverseWidth]
+
+
+def calculateMergeRates(
+    mergeableCounts: numpy.ndarray,
+    pairCount: int,
+    forwardTrimPositions: numpy.ndarray,
+    reverseTrimPositions: numpy.ndarray,
+):
+    """
+    :param mergeableCounts: surface from countMergeablePairsOnSurface
+    :param forwardTrimPositions: zero-indexed forward trim positions (after primers)
+    :param reverseTrimPositions: zero-indexed reverse trim positions (after primers)
+    :return: fraction of sampled pairs that would merge at each trim position pair
+    """
+    forwardTrimPositions = numpy.clip(
+        numpy.asarray(forwardTrimPositions, dtype="int64"),
+        0,
+        mergeableCounts.shape[0] - 1,
+    )
+    reverseTrimPositions = numpy.clip(
+        numpy.asarray(reverseTrimPositions, dtype="int64"),
+        0,
+        mergeableCounts.shape[1] - 1,
+    )
+    return mergeableCounts[forwardTrimPositions, reverseTrimPositions] / max(
+        pairCount, 1
+    )
+
+
+def findBestOverlapAmpliconLengths(
+    readPairSample: ReadPairSample,
+    minimumOverlap: int = ampliconLengthMinimumOverlap,
+    maxMismatchFraction: float = ampliconLengthMaxMismatchFraction,
+):
+    """
+    Finds the amplicon length each read pair came from by sliding the reverse complement of the reverse read along the forward read and keeping the offset with the lowest mismatch fraction (ties go to the longer overlap).
+    Every pair is compared at once for each offset, so the loop is over offsets only.
+    :param minimumOverlap: shortest overlap to consider
+    :param maxMismatchFraction: pairs whose best overlap has more mismatches than this get no length
+    :return: int64 amplicon length (not including primers) for each pair, 0 where no good overlap was found
+    """
+    forwardCodes = readPairSample.forwardCodes
+    reverseComplementCodes = complementCodeTable[readPairSample.reverseCodes]
+    forwardWidth = forwardCodes.shape[1]
+    reverseWidth = reverseComplementCodes.shape[1]
+    bestMismatchFractions = numpy.full(readPairSample.pairCount, numpy.inf)
+    bestOverlaps = numpy.zeros(readPairSample.pairCount, dtype="int64")
+    bestAmpliconLengths = numpy.zeros(readPairSample.pairCount, dtype="int64")
+    for ampliconLength in range(
+        minimumOverlap, forwardWidth + reverseWidth - minimumOverlap + 1
+    ):
+        # amplicon positions low to high are covered by both reads
+        low = max(0, ampliconLength - reverseWidth)
+        high = min(forwardWidth, ampliconLength)
+        if high - low < minimumOverlap:
+            continue
+        forwardWindow = forwardCodes[:, low:high]
+        reverseWindow = reverseComplementCodes[
+            :, ampliconLength - high : ampliconLength - low
+        ][:, ::-1]
+        calledBases = (forwardWindow < 4) & (reverseWindow < 4)
+        overlaps = calledBases.sum(axis=1)
+        mismatches = ((forwardWindow != reverseWindow) & calledBases).sum(axis=1)
+        mismatchFractions = numpy.where(
+            overlaps >= minimumOverlap,
+            mismatches / numpy.maximum(overlaps, 1),
+            numpy.inf,
+        )
+        better = (mismatchFractions < bestMismatchFractions) | (
+            (mismatchFractions == bestMismatchFractions) & (overlaps > bestOverlaps)
+        )
+        bestMismatchFractions[better] = mismatchFractions[better]
+        bestOverlaps[better] = overlaps[better]
+        bestAmpliconLengths[better] = ampliconLength
+    bestAmpliconLengths[bestMismatchFractions > maxMismatchFraction] = 0
+    return bestAmpliconLengths
+
+
+def suggestAmpliconLength(
+    ampliconLengths: numpy.ndarray,
+    percentile: [int, float] = ampliconLengthSuggestionPercentile,
+):
+    """
+    Suggests an amplicon length setting from the lengths found for each pair. The setting should be the longest expected length, so a high percentile is used to stay clear of the odd misaligned pair.
+    :return: suggested amplicon length, or 0 if no pair overlapped
+    """
+    foundLengths = ampliconLengths[ampliconLengths > 0]
+    if not len(foundLengths):
+        return 0
+    # the "higher" percentile, taken by hand since numpy.percentile only gained its method argument in numpy 1.22
+    foundLengths = numpy.sort(foundLengths)
+    rank = int(numpy.ceil((len(foundLengths) - 1) * percentile / 100))
+    return int(foundLengths[rank])
+
+
+def makeAmpliconLengthReport(ampliconLengths: numpy.ndarray):
+    lengthCounts = numpy.bincount(ampliconLengths, minlength=1)
+    lines = ["ampliconLength\tpairs"]
+    lines.append("none\t%s" % lengthCounts[0])
+    for ampliconLength in numpy.nonzero(lengthCounts[1:])[0] + 1:
+        lines.append("%s\t%s" % (ampliconLength, lengthCounts[ampliconLength]))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,155 @@
+import logging
+
+logger = logging.getLogger(__name__)
+import numpy
+
+defaultCandidateCount = 10
+confidenceLevel = 95
+randomSeed = 0
+
+
+def makeKeptReadPatterns(
+    keptMatrix: numpy.ndarray, readWeights: [numpy.ndarray, None] = None
+):
+    """
+    Groups reads by which candidates keep them. Resampling reads only changes how many reads fall in each group, so a bootstrap can draw group sizes instead of read indices.
+    :param keptMatrix: boolean matrix with candidates as rows and reads as columns, true where the candidate keeps the read
+    :param readWeights: weight of each read, or None if every read counts once. Reads with different weights are kept in separate groups.
+    :return: boolean matrix with candidates as rows and one column per group, the number of reads in each group, and the weight of each group's reads
+    """
+    candidateCount = keptMatrix.shape[0]
+    if candidateCount > 62:
+        raise ValueError(
+            "Unable to bootstrap more than 62 candidates at once. %s were given."
+            % candidateCount
+        )
+    patternCodes = numpy.zeros(keptMatrix.shape[1], dtype="int64")
+    for candidateIndex in range(candidateCount):
+        patternCodes |= keptMatrix[candidateIndex].astype("int64") << candidateIndex
+    if readWeights is None:
+        uniqueCodes, readCounts = numpy.unique(patternCodes, return_counts=True)
+        groupWeights = numpy.ones(len(uniqueCodes))
+    else:
+        weightValues, weightIndices = numpy.unique(readWeights, return_inverse=True)
+        groups, readCounts = numpy.unique(
+            numpy.stack((patternCodes, weightIndices.reshape(-1))),
+            axis=1,
+            return_counts=True,
+        )
+        uniqueCodes = groups[0]
+        groupWeights = weightValues[groups[1]]
+    patterns = (
+        uniqueCodes[numpy.newaxis, :]
+        >> numpy.arange(candidateCount, dtype="int64")[:, numpy.newaxis]
+    ) & 1
+    return patterns.astype(bool), readCounts, groupWeights
+
+
+def bootstrapReadRetention(
+    keptMatrix: numpy.ndarray,
+    replicateCount: int,
+    seed: int = randomSeed,
+    readWeights: [numpy.ndarray, None] = None,
+):
+    """
+    Resamples reads with replacement and recomputes every candidate's read retention for each replicate.
+    :param keptMatrix: boolean matrix with candidates as rows and reads as columns, true where the candidate keeps the read
+    :param readWeights: weight of each read, or None if every read counts once
+    :return: float matrix of read retention with replicates as rows and candidates as columns
+    """
+    patterns, patternReadCounts, patternWeights = makeKeptReadPatterns(
+        keptMatrix, readWeights
+    )
+    readCount = int(patternReadCounts.sum())
+    randomState = numpy.random.RandomState(seed)
+    patternDraws = randomState.multinomial(
+        readCount, patternReadCounts / readCount, size=replicateCount
+    )
+    weightedDraws = patternDraws * patternWeights[numpy.newaxis, :]
+    drawnWeights = weightedDraws.sum(axis=1)
+    drawnWeights[drawnWeights == 0] = 1
+    return numpy.dot(weightedDraws, patterns.T) / drawnWeights[:, numpy.newaxis]
+
+
+def countKeptReadsBySample(keptMatrix: numpy.ndarray, sampleOffsets: numpy.ndarray):
+    """
+    :param sampleOffsets: first column of each sample's reads in the kept matrix, in sample order
+    :return: int64 matrix of kept read counts with candidates as rows and samples as columns, and an int64 array of reads in each sample
+    """
+    readCount = keptMatrix.shape[1]
+    sampleReadCounts = numpy.diff(numpy.append(sampleOffsets, readCount)).astype(
+        "int64"
+    )
+    sampleKeptCounts = numpy.zeros(
+        (keptMatrix.shape[0], len(sampleOffsets)), dtype="int64"
+    )
+    occupiedSamples = numpy.flatnonzero(sampleReadCounts > 0)
+    if len(occupiedSamples):
+        sampleKeptCounts[:, occupiedSamples] = numpy.add.reduceat(
+            keptMatrix.astype("int64"), sampleOffsets[occupiedSamples], axis=1
+        )
+    return sampleKeptCounts, sampleReadCounts
+
+
+def bootstrapSampleRetention(
+    keptMatrix: numpy.ndarray,
+    sampleOffsets: numpy.ndarray,
+    replicateCount: int,
+    seed: int = randomSeed,
+    sampleWeights: [numpy.ndarray, None] = None,
+):
+    """
+    Resamples whole samples with replacement and recomputes every candidate's pooled read retention for each replicate. This captures sample to sample variation that resampling reads misses.
+    :param keptMatrix: boolean matrix with candidates as rows and reads as columns, true where the candidate keeps the read
+    :param sampleOffsets: first column of each sample's reads in the kept matrix, in sample order
+    :param sampleWeights: weight of each read in each sample, or None if every read counts once
+    :return: float matrix of read retention with replicates as rows and candidates as columns
+    """
+    sampleKeptCounts, sampleReadCounts = countKeptReadsBySample(
+        keptMatrix, sampleOffsets
+    )
+    if sampleWeights is not None:
+        sampleKeptCounts = sampleKeptCounts * sampleWeights[numpy.newaxis, :]
+        sampleReadCounts = sampleReadCounts * sampleWeights
+    sampleCount = len(sampleReadCounts)
+    randomState = numpy.random.RandomState(seed)
+    sampleDraws = randomState.randint(
+        0, sampleCount, size=(replicateCount, sampleCount)
+    )
+    sampleMultiplicities = numpy.bincount(
+        (
+            sampleDraws
+            + numpy.arange(replicateCount, dtype="int64")[:, numpy.newaxis]
+            * sampleCount
+        ).ravel(),
+        minlength=replicateCount * sampleCount,
+    ).reshape(replicateCount, sampleCount)
+    keptReadCounts = numpy.dot(sampleMultiplicities, sampleKeptCounts.T)
+    readCounts = numpy.dot(sampleMultiplicities, sampleReadCounts)
+    return keptReadCounts / numpy.maximum(readCounts, 1)[:, numpy.newaxis]
+
+
+def summarizeRetentionReplicates(
+    replicateRetentions: numpy.ndarray,
+    scorePenalties: numpy.ndarray,
+    level: float = confidenceLevel,
+):
+    """
+    :param replicateRetentions: float matrix of read retention with replicates as rows and candidates as columns
+    :param scorePenalties: amount taken off each candidate's score for its max expected errors, so that each replicate can be ranked the same way as the full data
+    :param level: confidence level in percent for the percentile interval
+    :return: lower and upper read retention bounds for each candidate, and the fraction of replicates where each candidate scored best, with ties split evenly
+    """
+    tail = (100 - level) / 2
+    lowerBounds, upperBounds = numpy.percentile(
+        replicateRetentions, [tail, 100 - tail], axis=0
+    )
+    replicateScores = (replicateRetentions * 100) - scorePenalties[numpy.newaxis, :]
+    # candidates that keep the same reads tie exactly, so a replicate's win is split between all of its best scoring candidates
+    rankedFirst = replicateScores == replicateScores.max(axis=1, keepdims=True)
+    rankedFirstShares = rankedFirst / rankedFirst.sum(axis=1, keepdims=True)
+    return (
+        lowerBounds,
+        upperBounds,
+        rankedFirstShares.sum(axis=0) / max(replicateRetentions.shape[0], 1),
+    )
@@ -0,0 +1,143 @@
+import logging
+
+logger = logging.getLogger(__name__)
+import numpy
+
+influenceScoreTolerance = 1.0
+surfaceChunkElementLimit = 2**22
+
+
+def countKeptReadsBySampleOnSurfaces(
+    forwardCrossings: numpy.ndarray,
+    reverseCrossings: numpy.ndarray,
+    sampleReadCounts: numpy.ndarray,
+    forwardTrimPositions: numpy.ndarray,
+    reverseTrimPositions: numpy.ndarray,
+    chunkElementLimit: int = surfaceChunkElementLimit,
+):
+    """
+    Per-sample version of trimParameterPrediction.calculateRetentionSurface. Each read is binned by its sample as well as how many leading positions it keeps in each direction, so one bincount gives every sample's histogram and the reverse cumulative sums give every sample's retention surface.
+    Samples are handled a few at a time to keep the surfaces within chunkElementLimit values.
+    :param forwardCrossings: number of leading positions each forward read keeps (one crossing table row), with samples in consecutive blocks
+    :param reverseCrossings: same for the reverse reads, pair-aligned with the forward crossings
+    :param sampleReadCounts: number of reads in each sample's block, in order
+    :param forwardTrimPositions: zero-indexed forward trim position for each candidate
+    :param reverseTrimPositions: zero-indexed reverse trim position for each candidate
+    :return: int64 matrix of kept read counts with samples as rows and candidates as columns
+    """
+    forwardLength = int(forwardTrimPositions.max()) + 1
+    reverseLength = int(reverseTrimPositions.max()) + 1
+    surfaceSize = (forwardLength + 1) * (reverseLength + 1)
+    sampleCount = len(sampleReadCounts)
+    sampleOffsets = numpy.cumsum(
+        numpy.concatenate([[0], sampleReadCounts]), dtype="int64"
+    )
+    chunkSampleCount = max(1, chunkElementLimit // surfaceSize)
+    keptReadCounts = numpy.zeros(
+        (sampleCount, len(forwardTrimPositions)), dtype="int64"
+    )
+    for chunkStart in range(0, sampleCount, chunkSampleCount):
+        chunkEnd = min(chunkStart + chunkSampleCount, sampleCount)
+        reads = slice(sampleOffsets[chunkStart], sampleOffsets[chunkEnd])
+        sampleBins = numpy.repeat(
+            numpy.arange(chunkEnd - chunkStart, dtype="int64"),
+            sampleReadCounts[chunkStart:chunkEnd],
+        )
+        forwardBins = numpy.minimum(forwardCrossings[reads], forwardLength).astype(
+            "int64"
+        )
+        reverseBins = numpy.minimum(reverseCrossings[reads], reverseLength).astype(
+            "int64"
+        )
+        histograms = numpy.bincount(
+            sampleBins * surfaceSize + forwardBins * (reverseLength + 1) + reverseBins,
+            minlength=(chunkEnd - chunkStart) * surfaceSize,
+        ).reshape(chunkEnd - chunkStart, forwardLength + 1, reverseLength + 1)
+        dominatingCounts = (
+            histograms[:, ::-1, ::-1].cumsum(axis=1).cumsum(axis=2)[:, ::-1, ::-1]
+        )
+        # a read is kept at position p only if it keeps more than p positions
+        keptReadCounts[chunkStart:chunkEnd] = dominatingCounts[
+            :, forwardTrimPositions + 1, reverseTrimPositions + 1
+        ]
+    return keptReadCounts
+
+
+def calculateLeaveOneOutScores(
+    sampleKeptCounts: numpy.ndarray,
+    sampleReadCounts: numpy.ndarray,
+    totalKeptCounts: numpy.ndarray,
+    scorePenalties: numpy.ndarray,
+):
+    """
+    Scores candidates with each sample left out in turn, by taking that sample's counts away from the totals instead of recounting the other samples.
+    :param sampleKeptCounts: kept read counts with samples as rows and candidates as columns
+    :param sampleReadCounts: number of reads in each sample
+    :param totalKeptCounts: kept read count for each candidate over all samples
+    :param scorePenalties: amount taken off each candidate's score for its max expected errors
+    :return: float matrix of scores with the left out sample as rows and candidates as columns
+    """
+    remainingReadCounts = sampleReadCounts.sum() - sampleReadCounts
+    remainingRetention = (
+        totalKeptCounts[numpy.newaxis, :] - sampleKeptCounts
+    ) / numpy.maximum(remainingReadCounts, 1)[:, numpy.newaxis]
+    return (remainingRetention * 100) - scorePenalties[numpy.newaxis, :]
+
+
+def makeSampleInfluenceReport(
+    sampleNames: list,
+    sampleReadCounts: numpy.ndarray,
+    recommendations: list,
+    scoreLosses: numpy.ndarray,
+    retentionChanges: numpy.ndarray,
+    flagged: numpy.ndarray,
+):
+    """
+    :param recommendations: best scoring TrimParameterSet with each sample left out
+    :param scoreLosses: how far the full data recommendation scores below each leave-one-out recommendation without the sample
+    :param retentionChanges: change in the full data recommendation's read retention without each sample
+    :param flagged: whether each sample moves the recommendation by at least influenceScoreTolerance
+    :return: tab separated table with one row per sample, most influential first
+    """
+    lines = [
+        "\t".join(
+            [
+                "sample",
+                "reads",
+                "leaveOneOutTrimPosition",
+                "leaveOneOutMaxExpectedError",
+                "leaveOneOutTruncQ",
+                "scoreLoss",
+                "readRetentionChangePercent",
+                "flagged",
+            ]
+        )
+    ]
+    for sampleIndex in numpy.lexsort(
+        (-numpy.abs(retentionChanges), -scoreLosses)
+    ).tolist():
+        recommendation = recommendations[sampleIndex]
+        truncQ = recommendation.truncQ
+        lines.append(
+            "\t".join(
+                [
+                    str(sampleNames[sampleIndex]),
+                    str(int(sampleReadCounts[sampleIndex])),
+                    "%s,%s"
+                    % (
+                        recommendation.forwardTrimPosition,
+                        recommendation.reverseTrimPosition,
+                    ),
+                    "%s,%s"
+                    % (
+                        recommendation.forwardMaxExpectedError,
+                        recommendation.reverseMaxExpectedError,
+                    ),
+                    "none" if truncQ is None else str(truncQ),
+                    "%.4f" % scoreLosses[sampleIndex],
+                    "%.2f" % (100 * retentionChanges[sampleIndex]),
+                    "yes" if flagged[sampleIndex] else "no",
+                ]
+            )
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,54 @@
+import logging
+
+logger = logging.getLogger(__name__)
+import math
+import numpy
+
+worstCaseRetentionVariance = 0.25  # p * (1 - p) is largest at a retention of 50%
+
+
+def calculateSampleReadLimit(retentionPrecision: float):
+    """
+    Finds how many reads a sample needs for its read retention to have a standard error of at most retentionPrecision, assuming the worst case retention of 50%.
+    :param retentionPrecision: target standard error of each sample's read retention, in percentage points (0 for no limit)
+    :return: number of reads to use from each sample, or 0 for all of them
+    """
+    if not retentionPrecision or retentionPrecision <= 0:
+        return 0
+    return int(
+        math.ceil(worstCaseRetentionVariance / ((retentionPrecision / 100) ** 2))
+    )
+
+
+def makeEqualSampleReadWeights(sampleOffsets: numpy.ndarray, readCount: int):
+    """
+    Weights each read so that every sample with reads carries the same total weight, making weighted read retention the average of the samples' own read retentions.
+    The weights add up to readCount, so weighted kept read counts stay on the same scale as plain ones.
+    :param sampleOffsets: first read of each sample, in sample order
+    :param readCount: total number of reads
+    :return: float64 array with the weight of each read
+    """
+    sampleOffsets = numpy.minimum(sampleOffsets, readCount)
+    sampleReadCounts = numpy.diff(numpy.append(sampleOffsets, readCount))
+    occupiedSamples = sampleReadCounts > 0
+    sampleWeights = numpy.zeros(len(sampleReadCounts))
+    sampleWeights[occupiedSamples] = readCount / (
+        numpy.count_nonzero(occupiedSamples) * sampleReadCounts[occupiedSamples]
+    )
+    return numpy.repeat(sampleWeights, sampleReadCounts)
+
+
+def getSampleWeights(readWeights: [numpy.ndarray, None], sampleOffsets: numpy.ndarray):
+    """
+    :param readWeights: weight of each read, or None if every read counts once
+    :param sampleOffsets: first read of each sample, in sample order
+    :return: float64 array with the weight given to each read of each sample (0 for samples without reads)
+    """
+    if readWeights is None:
+        return numpy.ones(len(sampleOffsets))
+    sampleOffsets = numpy.minimum(sampleOffsets, len(readWeights))
+    sampleReadCounts = numpy.diff(numpy.append(sampleOffsets, len(readWeights)))
+    sampleWeights = numpy.zeros(len(sampleOffsets))
+    occupiedSamples = sampleReadCounts > 0
+    sampleWeights[occupiedSamples] = readWeights[sampleOffsets[occupiedSamples]]
+    return sampleWeights
@@ -1,13 +1,23 @@
 import logging
 
 logger = logging.getLogger(__name__)
+trimTestChunkElementLimit = 2**24
+primerCheckProbeReadCount = 1000
+primerCheckTolerance = 2
+primerCheckMinimumPrimerLength = 12
+sampleRetentionCandidateCount = 5
 try:
     from . import fileNamingStandards
     from . import fastqHandler
     from . import fastqAnalysis
     from . import expectedErrorCurve
+    from . import qualityScoreHandler
+    from . import readPairOverlap
+    from . import retentionBootstrap
+    from . import sampleInfluence
+    from . import sampleWeighting
 except ImportError:
-    import fileNamingStandards, fastqHandler, fastqAnalysis, expectedErrorCurve
+    import fileNamingStandards, fastqHandler, fastqAnalysis, expectedErrorCurve, qualityScoreHandler, readPairOverlap, retentionBootstrap, sampleInfluence, sampleWeighting
 import typing
 import numpy
 
@@ -21,6 +31,11 @@ class TrimParameterSet(object):
         "reverseMaxExpectedError",
         "readRetention",
         "score",
+        "truncQ",
+        "uniqueSequenceEstimates",
+        "mergeRate",
+        "retentionInterval",
+        "rankedFirstRate",
     ]
 
     def __init__(
@@ -30,21 +45,25 @@ class TrimParameterSet(object):
         forwardMaxExpectedError: int,
         reverseMaxExpectedError: int,
         readRetention: float,
+        truncQ: int = None,
     ):
         self.forwardTrimPosition = forwardTrimPosition
         self.reverseTrimPosition = reverseTrimPosition
         self.forwardMaxExpectedError = forwardMaxExpectedError
         self.reverseMaxExpectedError = reverseMaxExpectedError
         self.readRetention = readRetention
+        self.truncQ = truncQ
+        self.uniqueSequenceEstimates = None
+        self.mergeRate = None
+        self.retentionInterval = None
+        self.rankedFirstRate = None
         self.score = self.calculateScore()
 
     def calculateScore(self):
-        return (self.readRetention * 100) - (
-            1
-            * (
-                ((self.forwardMaxExpectedError - 1) ** 2)
-                + ((self.reverseMaxExpectedError - 1) ** 2)
-            )
+        return calculateTrimParameterScore(
+            self.readRetention,
+            self.forwardMaxExpectedError,
+            self.reverseMaxExpectedError,
         )
 
     def toJson(self):
@@ -63,12 +82,305 @@ class TrimParameterSet(object):
             "readRetentionPercent": round(100 * self.readRetention, 2),
             "score": self.score,
         }
+        if self.truncQ is not None:
+            valueDict["truncQ"] = self.truncQ
+        if self.uniqueSequenceEstimates is not None:
+            valueDict["estimatedUniqueSequences"] = self.uniqueSequenceEstimates
+        if self.mergeRate is not None:
+            valueDict["estimatedMergePercent"] = round(100 * self.mergeRate, 2)
+        if self.retentionInterval is not None:
+            valueDict["readRetentionPercentInterval"] = [
+                round(100 * bound, 2) for bound in self.retentionInterval
+            ]
+        if self.rankedFirstRate is not None:
+            valueDict["bootstrapRankedFirstPercent"] = round(
+                100 * self.rankedFirstRate, 1
+            )
         return valueDict
 
     def __str__(self):
         return self.toJson()
 
 
+def calculateTrimParameterScore(
+    readRetention, forwardMaxExpectedError, reverseMaxExpectedError
+):
+    """
+    Scores a set of trim parameters, rewarding read retention and penalizing high max expected errors. Works on single values or numpy arrays.
+    """
+    return (readRetention * 100) - (
+        1
+        * (((forwardMaxExpectedError - 1) ** 2) + ((reverseMaxExpectedError - 1) ** 2))
+    )
+
+
+def rankScores(scores: numpy.ndarray, count: int = 0):
+    """
+    Finds the best scoring candidates, using a partial sort when only some of them are needed. Ties keep the order the candidates were tested in.
+    :param scores: score of each candidate
+    :param count: number of candidates to return (0 for all of them)
+    :return: int64 array of candidate indices, best score first
+    """
+    if count and count < len(scores):
+        topIndices = numpy.argpartition(-scores, count - 1)[:count]
+        lowestScore = scores[topIndices].min()
+        higherIndices = numpy.flatnonzero(scores > lowestScore)
+        tiedIndices = numpy.flatnonzero(scores == lowestScore)
+        selection = numpy.concatenate(
+            [higherIndices, tiedIndices[: count - len(higherIndices)]]
+        )
+    else:
+        selection = numpy.arange(len(scores))
+    return selection[numpy.lexsort((selection, -scores[selection]))]
+
+
+class TrimParameterResults(object):
+    """
+    Holds every tested trim parameter candidate as parallel numpy arrays, so that large searches can be ranked and filtered without making an object per candidate.
+    Only the rows that get reported are turned into TrimParameterSets.
+    """
+
+    __slots__ = [
+        "forwardTrimPositions",
+        "reverseTrimPositions",
+        "forwardMaxExpectedErrors",
+        "reverseMaxExpectedErrors",
+        "keptReadCounts",
+        "readCount",
+        "truncQValues",
+        "scores",
+    ]
+
+    def __init__(
+        self,
+        forwardTrimPositions: numpy.ndarray,
+        reverseTrimPositions: numpy.ndarray,
+        forwardMaxExpectedErrors: numpy.ndarray,
+        reverseMaxExpectedErrors: numpy.ndarray,
+        keptReadCounts: numpy.ndarray,
+        readCount: int,
+        truncQ: [int, numpy.ndarray] = None,
+    ):
+        """
+        :param forwardTrimPositions: one-indexed forward trim position (including the primer) for each candidate
+        :param reverseTrimPositions: same for the reverse reads
+        :param keptReadCounts: number of reads each candidate keeps, or the summed weight of those reads if the reads were weighted
+        :param truncQ: truncQ value the candidates were tested under, either one for all of them or an array with -1 for none
+        """
+        self.forwardTrimPositions = numpy.asarray(forwardTrimPositions, dtype="int64")
+        self.reverseTrimPositions = numpy.asarray(reverseTrimPositions, dtype="int64")
+        self.forwardMaxExpectedErrors = numpy.asarray(
+            forwardMaxExpectedErrors, dtype="int64"
+        )
+        self.reverseMaxExpectedErrors = numpy.asarray(
+            reverseMaxExpectedErrors, dtype="int64"
+        )
+        self.keptReadCounts = numpy.asarray(keptReadCounts)
+        if self.keptReadCounts.dtype.kind != "f":
+            self.keptReadCounts = self.keptReadCounts.astype("int64")
+        self.readCount = readCount
+        if truncQ is None:
+            truncQ = -1
+        self.truncQValues = numpy.broadcast_to(
+            numpy.asarray(truncQ, dtype="int64"), self.keptReadCounts.shape
+        )
+        self.scores = calculateTrimParameterScore(
+            self.keptReadCounts / max(self.readCount, 1),
+            self.forwardMaxExpectedErrors,
+            self.reverseMaxExpectedErrors,
+        )
+
+    def __len__(self):
+        return len(self.keptReadCounts)
+
+    def getRankedIndices(self, count: int = 0):
+        return rankScores(self.scores, count)
+
+    def getParetoFrontIndices(self):
+        """
+        Finds the candidates that no other candidate matches or beats on read retention, total max expected error and combined trim length at once.
+        Total max expected error takes few distinct values, so the best retention at or below each total and at or above each combined length is tabulated once and every candidate is checked against that table.
+        :return: int64 array of candidate indices on the front, best score first
+        """
+        if not len(self):
+            return numpy.zeros(0, dtype="int64")
+        levels, levelIndices = numpy.unique(
+            self.forwardMaxExpectedErrors + self.reverseMaxExpectedErrors,
+            return_inverse=True,
+        )
+        combinedLengths = self.forwardTrimPositions + self.reverseTrimPositions
+        lengthIndices = combinedLengths - combinedLengths.min()
+        # the first row (below the lowest level) and last column (past the longest length) stay empty
+        bestRetention = numpy.full(
+            (len(levels) + 1, lengthIndices.max() + 2),
+            -1,
+            dtype=self.keptReadCounts.dtype,
+        )
+        numpy.maximum.at(
+            bestRetention, (levelIndices + 1, lengthIndices), self.keptReadCounts
+        )
+        bestRetention = numpy.maximum.accumulate(bestRetention, axis=0)
+        bestRetention = numpy.maximum.accumulate(bestRetention[:, ::-1], axis=1)[
+            :, ::-1
+        ]
+        dominated = (
+            (bestRetention[levelIndices + 1, lengthIndices] > self.keptReadCounts)
+            | (bestRetention[levelIndices, lengthIndices] >= self.keptReadCounts)
+            | (
+                bestRetention[levelIndices + 1, lengthIndices + 1]
+                >= self.keptReadCounts
+            )
+        )
+        frontIndices = numpy.flatnonzero(~dominated)
+        return frontIndices[numpy.lexsort((frontIndices, -self.scores[frontIndices]))]
+
+    def makeTrimParameterSets(self, indices: typing.Iterable[int]):
+        trimParameterSets = []
+        for index in indices:
+            trimParameterSet = TrimParameterSet(
+                int(self.forwardTrimPositions[index]),
+                int(self.reverseTrimPositions[index]),
+                int(self.forwardMaxExpectedErrors[index]),
+                int(self.reverseMaxExpectedErrors[index]),
+                float(self.keptReadCounts[index]) / max(self.readCount, 1),
+            )
+            if self.truncQValues[index] >= 0:
+                trimParameterSet.truncQ = int(self.truncQValues[index])
+            trimParameterSets.append(trimParameterSet)
+        return trimParameterSets
+
+    def makeRankedTrimParameterSets(self, count: int = 0):
+        """
+        :param count: number of best scoring candidates to return (0 for all of them)
+        :return: list of TrimParameterSets, best score first
+        """
+        return self.makeTrimParameterSets(self.getRankedIndices(count).tolist())
+
+    def makeParetoFrontTrimParameterSets(self):
+        return self.makeTrimParameterSets(self.getParetoFrontIndices().tolist())
+
+
+def combineTrimParameterResults(resultsList: list):
+    """
+    Joins results from several searches over the same reads (such as one per truncQ value) so they can be ranked together.
+    """
+    readCounts = set([results.readCount for results in resultsList])
+    if len(readCounts) > 1:
+        raise ValueError(
+            "Unable to combine trim parameter results tested on different numbers of reads. %s"
+            % readCounts
+        )
+    return TrimParameterResults(
+        numpy.concatenate([results.forwardTrimPositions for results in resultsList]),
+        numpy.concatenate([results.reverseTrimPositions for results in resultsList]),
+        numpy.concatenate(
+            [results.forwardMaxExpectedErrors for results in resultsList]
+        ),
+        numpy.concatenate(
+            [results.reverseMaxExpectedErrors for results in resultsList]
+        ),
+        numpy.concatenate([results.keptReadCounts for results in resultsList]),
+        readCounts.pop(),
+        numpy.concatenate([results.truncQValues for results in resultsList]),
+    )
+
+
+class SingleEndTrimParameterSet(object):
+
+    __slots__ = ["trimPosition", "maxExpectedError", "readRetention", "score"]
+
+    def __init__(self, trimPosition: int, maxExpectedError: int, readRetention: float):
+        self.trimPosition = trimPosition
+        self.maxExpectedError = maxExpectedError
+        self.readRetention = readRetention
+        self.score = self.calculateScore()
+
+    def calculateScore(self):
+        return calculateSingleEndTrimParameterScore(
+            self.readRetention, self.maxExpectedError
+        )
+
+    def toJson(self):
+        import json
+
+        valueDict = self.toDict()
+        return json.dumps(valueDict)
+
+    def toDict(self):
+        return {
+            "trimPosition": self.trimPosition,
+            "maxExpectedError": self.maxExpectedError,
+            "readRetentionPercent": round(100 * self.readRetention, 2),
+            "score": self.score,
+        }
+
+    def __str__(self):
+        return self.toJson()
+
+
+def calculateSingleEndTrimParameterScore(readRetention, maxExpectedError):
+    """
+    Single-end version of calculateTrimParameterScore. Works on single values or numpy arrays.
+    """
+    return (readRetention * 100) - (1 * ((maxExpectedError - 1) ** 2))
+
+
+class SingleEndTrimParameterResults(object):
+    """
+    Single-end version of TrimParameterResults, holding every tested candidate as parallel numpy arrays and only making SingleEndTrimParameterSets for the reported ones.
+    """
+
+    __slots__ = [
+        "trimPositions",
+        "maxExpectedErrors",
+        "keptReadCounts",
+        "readCount",
+        "scores",
+    ]
+
+    def __init__(
+        self,
+        trimPositions: numpy.ndarray,
+        maxExpectedErrors: numpy.ndarray,
+        keptReadCounts: numpy.ndarray,
+        readCount: int,
+    ):
+        """
+        :param trimPositions: one-indexed trim position (including the primer) for each candidate
+        :param keptReadCounts: number of reads each candidate keeps, or the summed weight of those reads if the reads were weighted
+        """
+        self.trimPositions = numpy.asarray(trimPositions, dtype="int64")
+        self.maxExpectedErrors = numpy.asarray(maxExpectedErrors, dtype="int64")
+        self.keptReadCounts = numpy.asarray(keptReadCounts)
+        self.readCount = readCount
+        self.scores = calculateSingleEndTrimParameterScore(
+            self.keptReadCounts / max(self.readCount, 1), self.maxExpectedErrors
+        )
+
+    def __len__(self):
+        return len(self.keptReadCounts)
+
+    def getRankedIndices(self, count: int = 0):
+        return rankScores(self.scores, count)
+
+    def makeTrimParameterSets(self, indices: typing.Iterable[int]):
+        return [
+            SingleEndTrimParameterSet(
+                int(self.trimPositions[index]),
+                int(self.maxExpectedErrors[index]),
+                float(self.keptReadCounts[index]) / max(self.readCount, 1),
+            )
+            for index in indices
+        ]
+
+    def makeRankedTrimParameterSets(self, count: int = 0):
+        """
+        :param count: number of best scoring candidates to return (0 for all of them)
+        :return: list of SingleEndTrimParameterSets, best score first
+        """
+        return self.makeTrimParameterSets(self.getRankedIndices(count).tolist())
+
+
 def calculateMaxExpectedErrorFromReadLength(readLength: int):
     dividedLength = readLength // 100
     maxExpectedError = 0
@@ -153,6 +465,36 @@ def makeAllPossibleTrimLocations(
     return tuple(trimPositions)
 
 
+def makeFeasibleTrimPositionRanges(
+    forwardLength: int, reverseLength: int, minimumCombinedLength: int
+):
+    """
+    Gives every forward and every reverse trim position that can take part in a pair reaching the minimum combined length, for searching the full grid instead of only the diagonal.
+    :return: two int64 arrays of zero-indexed trim positions, forward then reverse
+    """
+    minimumForwardLength, minimumReverseLength = calculateLowestTrimBaseForPairedReads(
+        forwardLength, reverseLength, minimumCombinedLength
+    )
+    forwardPositions = numpy.arange(
+        max(minimumForwardLength, 1) - 1, forwardLength, dtype="int64"
+    )
+    reversePositions = numpy.arange(
+        max(minimumReverseLength, 1) - 1, reverseLength, dtype="int64"
+    )
+    return forwardPositions, reversePositions
+
+
+def makeSingleEndTrimPositions(readLength: int, minimumReadLength: int):
+    """
+    Gives every trim position for single-end reads that keeps at least the minimum read length.
+    :return: int64 array of zero-indexed trim positions
+    """
+    if readLength < minimumReadLength:
+        logger.error("Read length is less than the required minimum read length.")
+        minimumReadLength = readLength
+    return numpy.arange(max(minimumReadLength, 1) - 1, readLength, dtype="int64")
+
+
 class Q2ArrayParallelBuilderAgent(object):
 
     def __init__(self, subsample: int = 0, primerLength: int = 0):
@@ -171,17 +513,14 @@ class Q2ArrayParallelBuilderAgent(object):
             subsample=self.subsample,
             leftTrim=self.primerLength,
         )
-        q2Locations = []
-        for read in fastq:
-            containedQ2 = False
-            for position, qScore in enumerate(read.quality.phredScores):
-                if qScore <= 2:
-                    containedQ2 = True
-                    q2Locations.append(position)
-                    break
-            if not containedQ2:
-                q2Locations.append(len(read.sequence))
-        firstQ2Array = numpy.array(q2Locations, "uint16")
+        q2Blocks = [numpy.array([], "uint16")]
+        for block in fastq.readBlocks():
+            q2Blocks.append(
+                fastqHandler.findFirstNBaseAndLowQualityPositions(
+                    block, fastq.qualityScoreScheme
+                )[1]
+            )
+        firstQ2Array = numpy.concatenate(q2Blocks)
         # print("%s Reads: %s. First Q2 Array: %s. First Q2 List: %s" %(fastqFileInfo.fileName, readCount, len(firstQ2Array), len(q2Locations)))
         return fastqFileInfo, firstQ2Array
 
@@ -190,7 +529,11 @@ def makeCombinedQ2ArrayForOneDirection(
     fastqList: list, sampleOrder: list, subsample: int = 0, primerLength: int = 0
 ):
     import numpy
-    from . import easyMultiprocessing
+
+    try:
+        from . import easyMultiprocessing
+    except ImportError:
+        import easyMultiprocessing
 
     parallelBuildAgent = Q2ArrayParallelBuilderAgent(subsample, primerLength)
     firstQ2Arrays = easyMultiprocessing.parallelProcessRunner(
@@ -255,17 +598,14 @@ class NBaseArrayParallelBuilderAgent(object):
         fastq = fastqHandler.FastqFile(
             fastqFileInfo.filePath, subsample=self.subsample, leftTrim=self.primerLength
         )
-        nBaseLocations = []
-        for read in fastq:
-            containedN = False
-            for position, base in enumerate(read.sequence):
-                if base == "N":
-                    containedN = True
-                    nBaseLocations.append(position)
-                    break
-            if not containedN:
-                nBaseLocations.append(len(read.sequence))
-        firstNBaseArray = numpy.array(nBaseLocations, "uint16")
+        nBaseBlocks = [numpy.array([], "uint16")]
+        for block in fastq.readBlocks():
+            nBaseBlocks.append(
+                fastqHandler.findFirstNBaseAndLowQualityPositions(
+                    block, fastq.qualityScoreScheme
+                )[0]
+            )
+        firstNBaseArray = numpy.concatenate(nBaseBlocks)
         # print("%s Reads: %s. First N Array: %s. First N List: %s" %(fastqFileInfo.fileName, readCount, len(firstNBaseArray), len(nBaseLocations)))
         return fastqFileInfo, firstNBaseArray
 
@@ -274,7 +614,11 @@ def makeCombinedFirstNBaseArrayForOneDirection(
     fastqList: list, sampleOrder: list, subsample: int = 0, primerLength: int = 0
 ):
     import numpy
-    from . import easyMultiprocessing
+
+    try:
+        from . import easyMultiprocessing
+    except ImportError:
+        import easyMultiprocessing
 
     parallelBuildAgent = NBaseArrayParallelBuilderAgent(subsample, primerLength)
     firstNBaseArrays = easyMultiprocessing.parallelProcessRunner(
@@ -337,7 +681,7 @@ class ExpectedErrorMatrixBuilderParallelAgent(object):
         # print("Running %s" %fastq)
         expectedErrorMatrix = fastqAnalysis.buildExpectedErrorMatrix(
             fastq.filePath,
-            superLean=True,
+            fixedPoint=True,
             startPosition=self.startPosition,
             subsample=self.subsample,
             leftTrim=self.primerLength,
@@ -364,28 +708,35 @@ def makeCombinedExpectedErrorMatrixForOneDirection(
     expectedErrorMatrices = easyMultiprocessing.parallelProcessRunner(
         parallelBuildAgent.makeExpectedErrorMatrix, fastqList
     )
-    combinedMatrixStarted = False
-    combinedMatrix = None
-    for matrix in expectedErrorMatrices:
-        if matrix[0].sameSample(sampleOrder[0]):
-            combinedMatrix = matrix[1]
-            combinedMatrixStarted = True
-            # print("Added %s" %matrix[0].fileName)
-            # print(combinedMatrix.shape)
-            break
-    if not combinedMatrixStarted:
+    orderedMatrices = [
+        matrix[1] for matrix in orderResultsBySample(expectedErrorMatrices, sampleOrder)
+    ]
+    return combineExpectedErrorMatrices(orderedMatrices)
+
+
+def orderResultsBySample(results: list, sampleOrder: list):
+    orderedResults = []
+    for fastq in sampleOrder:
+        for result in results:
+            if fastq.sameSample(result[0]):
+                orderedResults.append(result)
+                # print("Added %s" % result[0].fileName)
+                break
+    if not orderedResults or not orderedResults[0][0].sameSample(sampleOrder[0]):
         raise RuntimeError(
             "Did not find the initial combined matrix. This requires debugging, as it should not be possible."
         )
-    for fastq in sampleOrder[1:]:
-        for matrix in expectedErrorMatrices:
-            if fastq.sameSample(matrix[0]):
-                combinedMatrix = numpy.concatenate((combinedMatrix, matrix[1]))
-                # print("Added %s" % matrix[0].fileName)
-                # print(combinedMatrix.shape)
-                break
-    # for matrix in expectedErrorMatrices:
-    # print("%s, %s" %(matrix[0].fileName, matrix[1].size))
+    return orderedResults
+
+
+def combineExpectedErrorMatrices(orderedMatrices: list):
+    totalReads = sum([len(matrix) for matrix in orderedMatrices])
+    combinedMatrix = numpy.empty(
+        (totalReads, orderedMatrices[0].shape[1]),
+        dtype=orderedMatrices[0].dtype,
+        order="F",
+    )  # column-major so that each position is contiguous once transposed
+    numpy.concatenate(orderedMatrices, out=combinedMatrix)
     return combinedMatrix.transpose()  # columns for reads, rows for positions
 
 
@@ -420,210 +771,1577 @@ def makeCombinedErrorMatricesForBothEnds(
     return forwardExpectedErrorMatrix, reverseExpectedErrorMatrix
 
 
-def padMaxExpectedError(rawValue: float):
-    roundedUpValue = -(int(-rawValue))
-    return roundedUpValue + 1
-
+class ReadFilterArrayParallelBuilderAgent(object):
 
-def runTrimParameterTest(
-    forwardExpectedErrorMatrix: numpy.ndarray,
-    reverseExpectedErrorMatrix: numpy.ndarray,
-    forwardFirstNBaseArray: numpy.ndarray,
-    reverseFirstNBaseArray: numpy.ndarray,
-    forwardQ2Array: numpy.ndarray,
-    reverseQ2Array: numpy.ndarray,
-    trimPositions: tuple,
-    minimumTrimPositions: tuple = (0, 0),
-    forwardCurve: expectedErrorCurve.ExponentialFit = None,
-    reverseCurve: expectedErrorCurve.ExponentialFit = None,
-    forwardPrimerLength: int = 0,
-    reversePrimerLength: int = 0,
-):
-    import operator
+    def __init__(
+        self, startPosition: int = 0, subsample: int = 0, primerLength: int = 0
+    ):
+        self.startPosition = startPosition
+        self.subsample = subsample
+        self.primerLength = primerLength
 
-    forwardMinimumTrimPosition, reverseMinimumTrimPosition = minimumTrimPositions
-    results = []
-    for forwardTrimPosition, reverseTrimPosition in trimPositions:
-        if not forwardCurve:
-            forwardMaxExpectedError = calculateForwardExpectedErrorFromReadLength(
-                forwardTrimPosition
-            )
-        else:
-            forwardMaxExpectedError = padMaxExpectedError(
-                forwardCurve.calculateValue(forwardTrimPosition)
-            )
-        if not reverseCurve:
-            reverseMaxExpectedError = calculateReverseExpectedErrorFromReadLength(
-                reverseTrimPosition
-            )
-        else:
-            reverseMaxExpectedError = padMaxExpectedError(
-                reverseCurve.calculateValue(reverseTrimPosition)
-            )
-        forwardExpectedErrors = forwardExpectedErrorMatrix[
-            forwardTrimPosition - forwardMinimumTrimPosition
-        ]
-        reverseExpectedErrors = reverseExpectedErrorMatrix[
-            reverseTrimPosition - reverseMinimumTrimPosition
-        ]
-        totalReads = 0
-        keptReads = 0
-        rejectedReads = 0
-        for (
-            forwardExpectedErrorValue,
-            reverseExpectedErrorValue,
-            forwardFirstNBasePosition,
-            reverseFirstNBasePosition,
-            forwardQ2Position,
-            reverseQ2Position,
-        ) in zip(
-            forwardExpectedErrors,
-            reverseExpectedErrors,
-            forwardFirstNBaseArray,
-            reverseFirstNBaseArray,
-            forwardQ2Array,
-            reverseQ2Array,
-        ):
-            totalReads += 1
-            if (
-                forwardExpectedErrorValue >= forwardMaxExpectedError
-                or reverseExpectedErrorValue >= reverseMaxExpectedError
-            ):  # Using this because I lose fractional values to save on memory. In theory, this would probably disagree with dada2's decision if the real value is exactly an integer with no fractional portion.  This is unlikely to happen often enough to be an issue.
-                rejectedReads += 1
-                continue
-            elif (
-                forwardTrimPosition >= forwardFirstNBasePosition
-                or reverseTrimPosition >= reverseFirstNBasePosition
-            ):
-                rejectedReads += 1
-                continue
-            elif (
-                forwardTrimPosition >= forwardQ2Position
-                or reverseTrimPosition >= reverseQ2Position
-            ):
-                rejectedReads += 1
-                continue
-            else:
-                keptReads += 1
-        results.append(
-            TrimParameterSet(
-                forwardTrimPosition + 1 + forwardPrimerLength,
-                reverseTrimPosition + 1 + reversePrimerLength,
-                forwardMaxExpectedError,
-                reverseMaxExpectedError,
-                keptReads / totalReads,
+    def makeReadFilterArrays(self, fastq: fileNamingStandards.NamingStandard):
+        expectedErrorMatrix, firstNBaseArray, firstQ2Array = (
+            fastqAnalysis.buildExpectedErrorMatrixAndFirstFailureArrays(
+                fastq.filePath,
+                fixedPoint=True,
+                startPosition=self.startPosition,
+                subsample=self.subsample,
+                leftTrim=self.primerLength,
             )
-        )  # doing +1 to adjust for zero indexed matrices
-        results.sort(key=operator.attrgetter("score"), reverse=True)
-    return results
+        )
+        return fastq, expectedErrorMatrix, firstNBaseArray, firstQ2Array
 
 
-def runTrimParameterTestLite(
-    forwardExpectedErrorMatrix: numpy.ndarray,
-    reverseExpectedErrorMatrix: numpy.ndarray,
-    trimPositions: tuple,
+def makeCombinedReadFilterArraysForOneDirection(
+    fastqList: list,
+    sampleOrder: list,
+    subsample: int,
+    startPosition: int = 0,
+    primerLength: int = 0,
+):
+    try:
+        from . import easyMultiprocessing
+    except ImportError:
+        import easyMultiprocessing
+    parallelBuildAgent = ReadFilterArrayParallelBuilderAgent(
+        startPosition, subsample, primerLength
+    )
+    readFilterArrays = orderResultsBySample(
+        easyMultiprocessing.parallelProcessRunner(
+            parallelBuildAgent.makeReadFilterArrays, fastqList
+        ),
+        sampleOrder,
+    )
+    expectedErrorMatrix = combineExpectedErrorMatrices(
+        [arrays[1] for arrays in readFilterArrays]
+    )
+    firstNBaseArray = numpy.concatenate([arrays[2] for arrays in readFilterArrays])
+    firstQ2Array = numpy.concatenate([arrays[3] for arrays in readFilterArrays])
+    return expectedErrorMatrix, firstNBaseArray, firstQ2Array
+
+
+def makeCombinedReadFilterArraysForBothEnds(
+    fastqList: list,
+    sampleOrder: list,
+    subsample: int,
     minimumTrimPositions: tuple = (0, 0),
-    forwardCurve: expectedErrorCurve.ExponentialFit = None,
-    reverseCurve: expectedErrorCurve.ExponentialFit = None,
     forwardPrimerLength: int = 0,
     reversePrimerLength: int = 0,
 ):
-    import operator
-
+    """
+    Builds the expected error matrices, first N base arrays and first Q<=2 arrays for both directions, reading each file only once.
+    :return: two tuples (forward, then reverse) of expected error matrix, first N base array and first Q<=2 array
+    """
     forwardMinimumTrimPosition, reverseMinimumTrimPosition = minimumTrimPositions
-    results = []
-    for forwardTrimPosition, reverseTrimPosition in trimPositions:
-        if not forwardCurve:
-            forwardMaxExpectedError = calculateForwardExpectedErrorFromReadLength(
-                forwardTrimPosition
-            )
-        else:
-            forwardMaxExpectedError = padMaxExpectedError(
-                forwardCurve.calculateValue(forwardTrimPosition)
-            )
-        if not reverseCurve:
-            reverseMaxExpectedError = calculateReverseExpectedErrorFromReadLength(
-                reverseTrimPosition
-            )
-        else:
-            reverseMaxExpectedError = padMaxExpectedError(
-                reverseCurve.calculateValue(reverseTrimPosition)
-            )
-        forwardExpectedErrors = forwardExpectedErrorMatrix[
-            forwardTrimPosition - forwardMinimumTrimPosition
-        ]
-        reverseExpectedErrors = reverseExpectedErrorMatrix[
-            reverseTrimPosition - reverseMinimumTrimPosition
-        ]
-        totalReads = 0
-        keptReads = 0
-        rejectedReads = 0
-        for forwardExpectedErrorValue, reverseExpectedErrorValue in zip(
-            forwardExpectedErrors, reverseExpectedErrors
-        ):
-            totalReads += 1
-            if (
-                forwardExpectedErrorValue >= forwardMaxExpectedError
-                or reverseExpectedErrorValue >= reverseMaxExpectedError
-            ):  # Using this because I lose fractional values to save on memory. In theory, this would probably disagree with dada2's decision if the real value is exactly an integer with no fractional portion.  This is unlikely to happen often enough to be an issue.
-                rejectedReads += 1
-                continue
-            else:
-                keptReads += 1
-        results.append(
-            TrimParameterSet(
-                forwardTrimPosition + 1 + forwardPrimerLength,
-                reverseTrimPosition + 1 + reversePrimerLength,
-                forwardMaxExpectedError,
-                reverseMaxExpectedError,
-                keptReads / totalReads,
-            )
-        )  # doing +1 to adjust for zero indexed matrices
-        results.sort(key=operator.attrgetter("score"), reverse=True)
-    return results
-
-
-def getSampleOrder(fastqList: list):
     forwardFastqList = [fastq for fastq in fastqList if fastq.direction == 1]
-    sampleOrder = forwardFastqList  # using this because I have to pick one
-    return sampleOrder
+    reverseFastqList = [fastq for fastq in fastqList if fastq.direction == 2]
+    forwardArrays = makeCombinedReadFilterArraysForOneDirection(
+        forwardFastqList,
+        sampleOrder,
+        subsample,
+        forwardMinimumTrimPosition,
+        forwardPrimerLength,
+    )
+    reverseArrays = makeCombinedReadFilterArraysForOneDirection(
+        reverseFastqList,
+        sampleOrder,
+        subsample,
+        reverseMinimumTrimPosition,
+        reversePrimerLength,
+    )
+    return forwardArrays, reverseArrays
 
 
-def parallelReadLengthChecker(fastq: fileNamingStandards.NamingStandard):
-    return fastq, fastqHandler.estimateReadLength(fastq.filePath, getVariance=True)
+class CrossingTableParallelBuilderAgent(object):
+
+    def __init__(
+        self,
+        maxLevel: int,
+        subsample: int = 0,
+        primerLength: int = 0,
+        limitToFirstFailures: bool = False,
+        accumulatorTypes: tuple = (),
+        truncQValues: tuple = (),
+        readLimit: int = 0,
+        sampleSubsamples: list = (),
+    ):
+        """
+        :param sampleSubsamples: (fastq, subsample interval) for samples that use their own interval instead of subsample
+        """
+        self.maxLevel = maxLevel
+        self.subsample = subsample
+        self.primerLength = primerLength
+        self.limitToFirstFailures = limitToFirstFailures
+        self.accumulatorTypes = accumulatorTypes
+        self.truncQValues = truncQValues
+        self.readLimit = readLimit
+        self.sampleSubsamples = sampleSubsamples
+
+    def makeCrossingTable(self, fastq: fileNamingStandards.NamingStandard):
+        subsample = self.subsample
+        for sampleFastq, sampleSubsample in self.sampleSubsamples:
+            if sampleFastq.sameSample(fastq):
+                subsample = sampleSubsample
+                break
+        accumulators = [accumulatorType() for accumulatorType in self.accumulatorTypes]
+        crossingTable = fastqAnalysis.buildExpectedErrorCrossingTable(
+            fastq.filePath,
+            self.maxLevel,
+            subsample=subsample,
+            leftTrim=self.primerLength,
+            limitToFirstFailures=self.limitToFirstFailures,
+            blockAccumulators=accumulators,
+            truncQValues=list(self.truncQValues),
+            readLimit=self.readLimit,
+        )
+        return fastq, crossingTable, accumulators
+
+
+def findSpreadSampleSubsamples(sampleOrder: list, subsample: int, readLimit: int):
+    """
+    Finds the subsampling interval for each sample that spreads readLimit reads across its files instead of taking them from the start.
+    Each interval comes from the sample's file in sampleOrder, so both read directions of a sample keep the same reads.
+    :return: list of (fastq, subsample interval) in sample order
+    """
+    return [
+        (fastq, fastqHandler.findSpreadSubsample(fastq.filePath, readLimit, subsample))
+        for fastq in sampleOrder
+    ]
 
 
-def checkReadLengths(fastqList: list):
+def makeCombinedCrossingTableForOneDirection(
+    fastqList: list,
+    sampleOrder: list,
+    subsample: int,
+    maxLevel: int,
+    primerLength: int = 0,
+    limitToFirstFailures: bool = False,
+    accumulatorTypes: tuple = (),
+    truncQValues: tuple = (),
+    readLimit: int = 0,
+):
+    """
+    Builds the crossing tables for one read direction in parallel and combines them in sample order.
+    :param accumulatorTypes: block accumulator classes (such as fastqAnalysis.QualityScoreHistogram) to fill for each file in the same pass
+    :param truncQValues: candidate dada2 truncQ values to gather first low quality positions for in the same pass
+    :param readLimit: read at most this many reads from each file, spread across it (0 to read them all)
+    :return: combined crossing table, and a list holding one list of accumulators (in accumulatorTypes order) for each sample in sample order
+    """
     try:
         from . import easyMultiprocessing
     except ImportError:
         import easyMultiprocessing
-    read1Data = []
-    read2Data = []
-    fastqReadLengthData = easyMultiprocessing.parallelProcessRunner(
-        parallelReadLengthChecker, fastqList
+    sampleSubsamples = []
+    if readLimit:
+        sampleSubsamples = findSpreadSampleSubsamples(sampleOrder, subsample, readLimit)
+    parallelBuildAgent = CrossingTableParallelBuilderAgent(
+        maxLevel,
+        subsample,
+        primerLength,
+        limitToFirstFailures,
+        accumulatorTypes,
+        truncQValues,
+        readLimit,
+        sampleSubsamples,
     )
-    for fastq, data in fastqReadLengthData:
-        if fastq.direction == 1:
-            read1Data.append(data)
-        elif fastq.direction == 2:
-            read2Data.append(data)
-    read1DataSet = set(read1Data)
-    read2DataSet = set(read2Data)
-    filesPassCheck = True
-    if not len(read1Data) == len(read2Data):
-        logger.error(
-            "There appears to be a different number of forward and reverse fastq files in the sequence folder. %s forward and %s reverse"
-            % (len(read1Data), len(read2Data))
-        )
-        filesPassCheck = False
-    if not len(read1DataSet) == 1:
-        logger.error(
-            "Forward read files appear to be of different lengths or of varied lengths. %s"
-            % read1DataSet
-        )
-        filesPassCheck = False
-    if not len(read2DataSet) == 1:
+    crossingTables = orderResultsBySample(
+        easyMultiprocessing.parallelProcessRunner(
+            parallelBuildAgent.makeCrossingTable, fastqList
+        ),
+        sampleOrder,
+    )
+    combinedCrossingTable = fastqAnalysis.combineCrossingTables(
+        [crossingTable[1] for crossingTable in crossingTables]
+    )
+    return combinedCrossingTable, [crossingTable[2] for crossingTable in crossingTables]
+
+
+def makeCombinedCrossingTablesWithAccumulatorsForBothEnds(
+    fastqList: list,
+    sampleOrder: list,
+    subsample: int,
+    maxLevels: tuple,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+    limitToFirstFailures: bool = False,
+    accumulatorTypes: tuple = (),
+    truncQValues: tuple = (),
+    readLimit: int = 0,
+):
+    """
+    :param readLimit: read at most this many reads from each file, spread across it (0 to read them all)
+    :return: forward crossing table, reverse crossing table, forward per-sample accumulators, reverse per-sample accumulators
+    """
+    forwardMaxLevel, reverseMaxLevel = maxLevels
+    forwardFastqList = [fastq for fastq in fastqList if fastq.direction == 1]
+    reverseFastqList = [fastq for fastq in fastqList if fastq.direction == 2]
+    forwardCrossingTable, forwardAccumulators = (
+        makeCombinedCrossingTableForOneDirection(
+            forwardFastqList,
+            sampleOrder,
+            subsample,
+            forwardMaxLevel,
+            forwardPrimerLength,
+            limitToFirstFailures,
+            accumulatorTypes,
+            truncQValues,
+            readLimit,
+        )
+    )
+    reverseCrossingTable, reverseAccumulators = (
+        makeCombinedCrossingTableForOneDirection(
+            reverseFastqList,
+            sampleOrder,
+            subsample,
+            reverseMaxLevel,
+            reversePrimerLength,
+            limitToFirstFailures,
+            accumulatorTypes,
+            truncQValues,
+            readLimit,
+        )
+    )
+    return (
+        forwardCrossingTable,
+        reverseCrossingTable,
+        forwardAccumulators,
+        reverseAccumulators,
+    )
+
+
+def makeCombinedCrossingTablesForBothEnds(
+    fastqList: list,
+    sampleOrder: list,
+    subsample: int,
+    maxLevels: tuple,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+    limitToFirstFailures: bool = False,
+):
+    forwardCrossingTable, reverseCrossingTable = (
+        makeCombinedCrossingTablesWithAccumulatorsForBothEnds(
+            fastqList,
+            sampleOrder,
+            subsample,
+            maxLevels,
+            forwardPrimerLength,
+            reversePrimerLength,
+            limitToFirstFailures,
+        )[:2]
+    )
+    return forwardCrossingTable, reverseCrossingTable
+
+
+def combineSampleAccumulators(sampleAccumulators: list, accumulatorIndex: int):
+    return fastqAnalysis.combineBlockAccumulators(
+        [accumulators[accumulatorIndex] for accumulators in sampleAccumulators]
+    )
+
+
+def getSampleName(fastq: fileNamingStandards.NamingStandard):
+    if fastq.sampleNumber is None or fastq.sampleNumber == fastq.group:
+        return str(fastq.group)
+    return "%s_%s" % (fastq.group, fastq.sampleNumber)
+
+
+def addUniqueSequenceEstimates(
+    resultTable: list,
+    forwardSketch: fastqAnalysis.UniqueSequenceSketch,
+    reverseSketch: fastqAnalysis.UniqueSequenceSketch,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    """
+    Attaches the estimated number of unique forward and reverse sequences left after trimming to each trim parameter set, which is what drives dada2's denoising time.
+    """
+    forwardEstimates = forwardSketch.estimateUniqueCountsAtLengths(
+        [
+            trimParameterSet.forwardTrimPosition - forwardPrimerLength
+            for trimParameterSet in resultTable
+        ]
+    ).tolist()
+    reverseEstimates = reverseSketch.estimateUniqueCountsAtLengths(
+        [
+            trimParameterSet.reverseTrimPosition - reversePrimerLength
+            for trimParameterSet in resultTable
+        ]
+    ).tolist()
+    for trimParameterSet, forwardEstimate, reverseEstimate in zip(
+        resultTable, forwardEstimates, reverseEstimates
+    ):
+        trimParameterSet.uniqueSequenceEstimates = (forwardEstimate, reverseEstimate)
+
+
+def addMergeRates(
+    resultTable: list,
+    mergeableCounts: numpy.ndarray,
+    pairCount: int,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    """
+    Attaches the fraction of sampled read pairs that would merge after trimming to each trim parameter set.
+    :param mergeableCounts: surface from readPairOverlap.countMergeablePairsOnSurface
+    """
+    mergeRates = readPairOverlap.calculateMergeRates(
+        mergeableCounts,
+        pairCount,
+        [
+            trimParameterSet.forwardTrimPosition - forwardPrimerLength - 1
+            for trimParameterSet in resultTable
+        ],
+        [
+            trimParameterSet.reverseTrimPosition - reversePrimerLength - 1
+            for trimParameterSet in resultTable
+        ],
+    ).tolist()
+    for trimParameterSet, mergeRate in zip(resultTable, mergeRates):
+        trimParameterSet.mergeRate = mergeRate
+
+
+def reportAmpliconLengthEstimate(
+    estimatedAmpliconLengths: numpy.ndarray, ampliconLength: int = 0
+):
+    """
+    Prints the amplicon lengths found from read pair overlaps with a suggested setting, and warns if a given amplicon length disagrees with the suggestion.
+    :return: suggested amplicon length, or 0 if no pair overlapped
+    """
+    suggestedAmpliconLength = readPairOverlap.suggestAmpliconLength(
+        estimatedAmpliconLengths
+    )
+    if not suggestedAmpliconLength:
+        logger.warning(
+            "None of the sampled read pairs overlapped well enough to estimate an amplicon length. The amplicon may be too long for the reads to overlap."
+        )
+        return 0
+    foundLengths = estimatedAmpliconLengths[estimatedAmpliconLengths > 0]
+    foundPercent = 100 * len(foundLengths) / len(estimatedAmpliconLengths)
+    print(
+        "Amplicon length from %s read pair overlaps (%s%% of pairs sampled): median %s, range %s to %s. Suggested amplicon length: %s"
+        % (
+            len(foundLengths),
+            round(foundPercent, 1),
+            int(numpy.median(foundLengths)),
+            int(foundLengths.min()),
+            int(foundLengths.max()),
+            suggestedAmpliconLength,
+        )
+    )
+    if foundPercent < 50:
+        logger.warning(
+            "Only %s%% of sampled read pairs overlapped. Some amplicons may be too long for the reads to overlap."
+            % round(foundPercent, 1)
+        )
+    if ampliconLength and ampliconLength < suggestedAmpliconLength:
+        logger.warning(
+            "The given amplicon length of %s is shorter than the suggested %s found from read pair overlaps. It should be the longest expected amplicon length."
+            % (ampliconLength, suggestedAmpliconLength)
+        )
+    elif ampliconLength and ampliconLength > suggestedAmpliconLength:
+        logger.warning(
+            "The given amplicon length of %s is longer than the suggested %s found from read pair overlaps. Trim parameters will keep more bases than the sampled read pairs need to merge."
+            % (ampliconLength, suggestedAmpliconLength)
+        )
+    return suggestedAmpliconLength
+
+
+def makeCandidateKeptReadMatrix(
+    trimParameterSets: list,
+    searchTables: dict,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    """
+    Marks which reads each trim parameter set keeps, for resampling.
+    :param searchTables: (forward crossing table, reverse crossing table) for each truncQ value the sets were tested under (None if they were not)
+    :return: boolean matrix with trim parameter sets as rows and reads as columns
+    """
+    forwardCrossingTable, reverseCrossingTable = searchTables[
+        trimParameterSets[0].truncQ
+    ]
+    readCount = min(forwardCrossingTable.readCount, reverseCrossingTable.readCount)
+    keptMatrix = numpy.zeros((len(trimParameterSets), readCount), dtype=bool)
+    for rowIndex, trimParameterSet in enumerate(trimParameterSets):
+        forwardCrossingTable, reverseCrossingTable = searchTables[
+            trimParameterSet.truncQ
+        ]
+        numpy.logical_and(
+            forwardCrossingTable.passingMask(
+                trimParameterSet.forwardTrimPosition - 1 - forwardPrimerLength,
+                trimParameterSet.forwardMaxExpectedError,
+            )[:readCount],
+            reverseCrossingTable.passingMask(
+                trimParameterSet.reverseTrimPosition - 1 - reversePrimerLength,
+                trimParameterSet.reverseMaxExpectedError,
+            )[:readCount],
+            out=keptMatrix[rowIndex],
+        )
+    return keptMatrix
+
+
+def addBootstrapRetentionIntervals(
+    resultTable: list,
+    searchTables: dict,
+    replicateCount: int,
+    resampleSamples: bool = False,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+    candidateCount: int = retentionBootstrap.defaultCandidateCount,
+):
+    """
+    Bootstraps the read retention of the best scoring trim parameter sets, adding a confidence interval and how often each set scored best across replicates.
+    :param resultTable: trim parameter sets, best score first. Only the first candidateCount get intervals.
+    :param searchTables: (forward crossing table, reverse crossing table) for each truncQ value the sets were tested under (None if they were not)
+    :param resampleSamples: resample whole samples instead of reads
+    """
+    candidates = resultTable[:candidateCount]
+    if not candidates or not replicateCount:
+        return
+    keptMatrix = makeCandidateKeptReadMatrix(
+        candidates, searchTables, forwardPrimerLength, reversePrimerLength
+    )
+    readWeights = getCrossingTableReadWeights(
+        searchTables[candidates[0].truncQ][0], keptMatrix.shape[1]
+    )
+    if resampleSamples:
+        sampleOffsets = searchTables[candidates[0].truncQ][0].sampleOffsets
+        sampleOffsets = sampleOffsets[sampleOffsets < keptMatrix.shape[1]]
+        sampleWeights = None
+        if readWeights is not None:
+            sampleWeights = sampleWeighting.getSampleWeights(readWeights, sampleOffsets)
+        replicateRetentions = retentionBootstrap.bootstrapSampleRetention(
+            keptMatrix,
+            sampleOffsets,
+            replicateCount,
+            sampleWeights=sampleWeights,
+        )
+    else:
+        replicateRetentions = retentionBootstrap.bootstrapReadRetention(
+            keptMatrix, replicateCount, readWeights=readWeights
+        )
+    scorePenalties = -calculateTrimParameterScore(
+        0,
+        numpy.array([candidate.forwardMaxExpectedError for candidate in candidates]),
+        numpy.array([candidate.reverseMaxExpectedError for candidate in candidates]),
+    )
+    lowerBounds, upperBounds, rankedFirstRates = (
+        retentionBootstrap.summarizeRetentionReplicates(
+            replicateRetentions, scorePenalties
+        )
+    )
+    for candidate, lowerBound, upperBound, rankedFirstRate in zip(
+        candidates,
+        lowerBounds.tolist(),
+        upperBounds.tolist(),
+        rankedFirstRates.tolist(),
+    ):
+        candidate.retentionInterval = (lowerBound, upperBound)
+        candidate.rankedFirstRate = rankedFirstRate
+
+
+def makeSampleInfluenceReport(
+    candidateResults: TrimParameterResults,
+    searchTables: dict,
+    sampleNames: list,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    """
+    Finds the recommended trim parameters with each sample left out, using per-sample kept read counts for every candidate taken away from the totals, so that no sample has to be rerun.
+    Samples whose removal leaves the full data recommendation at least sampleInfluence.influenceScoreTolerance points of score behind the best remaining candidate are flagged.
+    Candidates keep the max expected errors they were given with all samples.
+    :param searchTables: (forward crossing table, reverse crossing table) for each truncQ value the candidates were tested under (None if they were not)
+    :param sampleNames: name of each sample in crossing table order
+    :return: tab separated sample influence table, or None if there are fewer than two samples
+    """
+    if len(sampleNames) < 2:
+        logger.warning("At least two samples are needed to check sample influence.")
+        return None
+    readCount = candidateResults.readCount
+    sampleOffsets = numpy.minimum(
+        next(iter(searchTables.values()))[0].sampleOffsets, readCount
+    )
+    sampleReadCounts = numpy.diff(numpy.append(sampleOffsets, readCount))
+    # with weighted reads, each sample's counts are scaled by its reads' weight so that totals match the weighted kept read counts
+    sampleWeights = sampleWeighting.getSampleWeights(
+        getCrossingTableReadWeights(next(iter(searchTables.values()))[0], readCount),
+        sampleOffsets,
+    )
+    weightedSampleReadCounts = sampleReadCounts * sampleWeights
+    scorePenalties = -calculateTrimParameterScore(
+        0,
+        candidateResults.forwardMaxExpectedErrors,
+        candidateResults.reverseMaxExpectedErrors,
+    )
+    recommendationIndex = int(candidateResults.getRankedIndices(1)[0])
+    bestScores = numpy.full(len(sampleNames), -numpy.inf)
+    bestIndices = numpy.zeros(len(sampleNames), dtype="int64")
+    groups, groupIndices = numpy.unique(
+        numpy.stack(
+            (
+                candidateResults.truncQValues,
+                candidateResults.forwardMaxExpectedErrors,
+                candidateResults.reverseMaxExpectedErrors,
+            ),
+            axis=1,
+        ),
+        axis=0,
+        return_inverse=True,
+    )
+    groupIndices = groupIndices.reshape(-1)
+    for groupIndex, (
+        truncQ,
+        forwardMaxExpectedError,
+        reverseMaxExpectedError,
+    ) in enumerate(groups.tolist()):
+        candidateIndices = numpy.flatnonzero(groupIndices == groupIndex)
+        forwardCrossingTable, reverseCrossingTable = searchTables[
+            None if truncQ < 0 else truncQ
+        ]
+        sampleKeptCounts = sampleInfluence.countKeptReadsBySampleOnSurfaces(
+            forwardCrossingTable.crossings[
+                forwardCrossingTable.getLevelRow(forwardMaxExpectedError), :readCount
+            ],
+            reverseCrossingTable.crossings[
+                reverseCrossingTable.getLevelRow(reverseMaxExpectedError), :readCount
+            ],
+            sampleReadCounts,
+            candidateResults.forwardTrimPositions[candidateIndices]
+            - 1
+            - forwardPrimerLength,
+            candidateResults.reverseTrimPositions[candidateIndices]
+            - 1
+            - reversePrimerLength,
+        )
+        sampleKeptCounts = sampleKeptCounts * sampleWeights[:, numpy.newaxis]
+        leaveOneOutScores = sampleInfluence.calculateLeaveOneOutScores(
+            sampleKeptCounts,
+            weightedSampleReadCounts,
+            candidateResults.keptReadCounts[candidateIndices],
+            scorePenalties[candidateIndices],
+        )
+        groupBestPositions = numpy.argmax(leaveOneOutScores, axis=1)
+        groupBestScores = leaveOneOutScores[
+            numpy.arange(len(sampleNames)), groupBestPositions
+        ]
+        groupBestIndices = candidateIndices[groupBestPositions]
+        improved = (groupBestScores > bestScores) | (
+            (groupBestScores == bestScores) & (groupBestIndices < bestIndices)
+        )
+        bestScores[improved] = groupBestScores[improved]
+        bestIndices[improved] = groupBestIndices[improved]
+        if recommendationIndex in candidateIndices:
+            recommendationPosition = int(
+                numpy.flatnonzero(candidateIndices == recommendationIndex)[0]
+            )
+            recommendationScores = leaveOneOutScores[:, recommendationPosition]
+            recommendationKeptCounts = sampleKeptCounts[:, recommendationPosition]
+    recommendationKeptCount = candidateResults.keptReadCounts[recommendationIndex]
+    retentionChanges = (recommendationKeptCount - recommendationKeptCounts) / (
+        numpy.maximum(weightedSampleReadCounts.sum() - weightedSampleReadCounts, 1)
+    ) - (recommendationKeptCount / readCount)
+    scoreLosses = bestScores - recommendationScores
+    flagged = scoreLosses >= sampleInfluence.influenceScoreTolerance
+    if flagged.any():
+        logger.warning(
+            "Leaving out any one of these samples would change the recommended trim parameters: %s. Please check them for failed libraries or different sequencing chemistry."
+            % ", ".join(
+                [
+                    str(sampleNames[sampleIndex])
+                    for sampleIndex in numpy.flatnonzero(flagged).tolist()
+                ]
+            )
+        )
+    return sampleInfluence.makeSampleInfluenceReport(
+        sampleNames,
+        sampleReadCounts,
+        candidateResults.makeTrimParameterSets(bestIndices.tolist()),
+        scoreLosses,
+        retentionChanges,
+        flagged,
+    )
+
+
+def makeSampleRetentionReport(
+    resultTable: list,
+    searchTables: dict,
+    sampleNames: list,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+    candidateCount: int = sampleRetentionCandidateCount,
+):
+    """
+    Tabulates each sample's read retention at the best scoring trim parameter sets, to spot samples that would fall below a useful read depth.
+    Kept reads are summed over each sample's block of the crossing tables with numpy.add.reduceat.
+    :param resultTable: trim parameter sets, best score first. Only the first candidateCount are tabulated.
+    :param searchTables: (forward crossing table, reverse crossing table) for each truncQ value the sets were tested under (None if they were not)
+    :param sampleNames: name of each sample in crossing table order
+    :return: tab separated table with one row per sample and one retention percent column per trim parameter set
+    """
+    candidates = resultTable[:candidateCount]
+    if not candidates:
+        return None
+    keptMatrix = makeCandidateKeptReadMatrix(
+        candidates, searchTables, forwardPrimerLength, reversePrimerLength
+    )
+    sampleOffsets = searchTables[candidates[0].truncQ][0].sampleOffsets
+    sampleKeptCounts, sampleReadCounts = retentionBootstrap.countKeptReadsBySample(
+        keptMatrix, numpy.minimum(sampleOffsets, keptMatrix.shape[1])
+    )
+    header = ["sample", "reads"]
+    for candidate in candidates:
+        label = "%s/%s maxEE %s/%s" % (
+            candidate.forwardTrimPosition,
+            candidate.reverseTrimPosition,
+            candidate.forwardMaxExpectedError,
+            candidate.reverseMaxExpectedError,
+        )
+        if candidate.truncQ is not None:
+            label += " truncQ %s" % candidate.truncQ
+        header.append(label)
+    lines = ["\t".join(header)]
+    sampleRetentions = (
+        sampleKeptCounts.T / numpy.maximum(sampleReadCounts, 1)[:, numpy.newaxis]
+    )
+    for sampleName, readCount, retentions in zip(
+        sampleNames, sampleReadCounts.tolist(), sampleRetentions.tolist()
+    ):
+        lines.append(
+            "\t".join(
+                [str(sampleName), str(readCount)]
+                + ["%.2f" % (100 * retention) for retention in retentions]
+            )
+        )
+    return "\n".join(lines) + "\n"
+
+
+def makeSampleUniqueSequenceReport(
+    sampleOrder: list,
+    forwardSketches: list,
+    reverseSketches: list,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    """
+    Makes a tab-separated table of estimated unique sequences for each sample, direction and sketched trim position.
+    :param forwardSketches: forward UniqueSequenceSketch for each sample in sample order
+    :param reverseSketches: reverse UniqueSequenceSketch for each sample in sample order
+    """
+    lines = ["sample\tdirection\ttrimPosition\treads\testimatedUniqueSequences"]
+    for fastq, forwardSketch, reverseSketch in zip(
+        sampleOrder, forwardSketches, reverseSketches
+    ):
+        for direction, sketch, primerLength in (
+            ("forward", forwardSketch, forwardPrimerLength),
+            ("reverse", reverseSketch, reversePrimerLength),
+        ):
+            for prefixLength, readCount, uniqueCount in zip(
+                sketch.prefixLengths.tolist(),
+                sketch.readCounts.tolist(),
+                sketch.estimateUniqueCounts().tolist(),
+            ):
+                lines.append(
+                    "%s\t%s\t%s\t%s\t%s"
+                    % (
+                        getSampleName(fastq),
+                        direction,
+                        prefixLength + primerLength,
+                        readCount,
+                        int(round(uniqueCount)),
+                    )
+                )
+    return "\n".join(lines) + "\n"
+
+
+def calculateCrossingTableMaxLevel(maxExpectedErrors: list):
+    return max([int(maxExpectedError) for maxExpectedError in maxExpectedErrors] + [1])
+
+
+def calculateCrossingTableMaxLevelsForCurves(
+    forwardReadLength: int,
+    reverseReadLength: int,
+    minimumCombinedReadLength: int,
+    curvePairs: list,
+    maxExpectedErrorSearchLimit: int = 0,
+):
+    """
+    Finds the highest max expected error a crossing table needs to hold in each direction so that one pair of tables can be tested against every given pair of curves.
+    :param curvePairs: list of (forward curve, reverse curve) tuples
+    :return: forward and reverse max levels
+    """
+    if maxExpectedErrorSearchLimit:
+        return maxExpectedErrorSearchLimit, maxExpectedErrorSearchLimit
+    forwardPositions, reversePositions = makeFeasibleTrimPositionRanges(
+        forwardReadLength, reverseReadLength, minimumCombinedReadLength
+    )
+    forwardMaxExpectedErrors = []
+    reverseMaxExpectedErrors = []
+    for forwardCurve, reverseCurve in curvePairs:
+        forwardMaxExpectedErrors += [
+            calculateMaxExpectedErrorForPosition(
+                position, forwardCurve, calculateForwardExpectedErrorFromReadLength
+            )
+            for position in forwardPositions.tolist()
+        ]
+        reverseMaxExpectedErrors += [
+            calculateMaxExpectedErrorForPosition(
+                position, reverseCurve, calculateReverseExpectedErrorFromReadLength
+            )
+            for position in reversePositions.tolist()
+        ]
+    return (
+        calculateCrossingTableMaxLevel(forwardMaxExpectedErrors),
+        calculateCrossingTableMaxLevel(reverseMaxExpectedErrors),
+    )
+
+
+def padMaxExpectedError(rawValue: float):
+    roundedUpValue = -(int(-rawValue))
+    return roundedUpValue + 1
+
+
+def calculateMaxExpectedErrorForPosition(
+    trimPosition: int,
+    curve: expectedErrorCurve.ExponentialFit = None,
+    fallbackFunction: typing.Callable = calculateForwardExpectedErrorFromReadLength,
+):
+    if not curve:
+        return fallbackFunction(trimPosition)
+    return padMaxExpectedError(curve.calculateValue(trimPosition))
+
+
+def calculateMaxExpectedErrors(
+    trimPositions: tuple,
+    forwardCurve: expectedErrorCurve.ExponentialFit = None,
+    reverseCurve: expectedErrorCurve.ExponentialFit = None,
+):
+    forwardMaxExpectedErrors = []
+    reverseMaxExpectedErrors = []
+    for forwardTrimPosition, reverseTrimPosition in trimPositions:
+        forwardMaxExpectedErrors.append(
+            calculateMaxExpectedErrorForPosition(
+                forwardTrimPosition,
+                forwardCurve,
+                calculateForwardExpectedErrorFromReadLength,
+            )
+        )
+        reverseMaxExpectedErrors.append(
+            calculateMaxExpectedErrorForPosition(
+                reverseTrimPosition,
+                reverseCurve,
+                calculateReverseExpectedErrorFromReadLength,
+            )
+        )
+    return forwardMaxExpectedErrors, reverseMaxExpectedErrors
+
+
+def getMinimumTrimPositions(trimPositions: tuple):
+    forwardMinimumTrimPosition = min([position[0] for position in trimPositions])
+    reverseMinimumTrimPosition = min([position[1] for position in trimPositions])
+    return forwardMinimumTrimPosition, reverseMinimumTrimPosition
+
+
+def makeFixedPointLimitArray(maxExpectedErrors: list):
+    return numpy.array(
+        [
+            qualityScoreHandler.maxExpectedErrorToFixedPoint(maxExpectedError)
+            for maxExpectedError in maxExpectedErrors
+        ],
+        dtype="int64",
+    )
+
+
+def countReadsPassingExpectedErrorLimits(
+    forwardExpectedErrorMatrix: numpy.ndarray,
+    reverseExpectedErrorMatrix: numpy.ndarray,
+    forwardRows: numpy.ndarray,
+    reverseRows: numpy.ndarray,
+    forwardLimits: numpy.ndarray,
+    reverseLimits: numpy.ndarray,
+    forwardFirstFailurePositions: numpy.ndarray = None,
+    reverseFirstFailurePositions: numpy.ndarray = None,
+    forwardTrimPositions: numpy.ndarray = None,
+    reverseTrimPositions: numpy.ndarray = None,
+    chunkElementLimit: int = trimTestChunkElementLimit,
+):
+    """
+    Counts the reads passing both expected error limits for every candidate at once, working through the candidates in chunks to keep memory bounded.
+    If first failure positions are given (such as the first N base or first Q<=2 base of each read), reads are also rejected when the candidate trim position is at or past them.
+    :param forwardExpectedErrorMatrix: fixed point expected error matrix with positions as rows and reads as columns
+    :param reverseExpectedErrorMatrix: same for the reverse reads, pair-aligned with the forward matrix
+    :param forwardRows: forward matrix row to test for each candidate
+    :param reverseRows: reverse matrix row to test for each candidate
+    :param forwardLimits: fixed point forward max expected error for each candidate
+    :param reverseLimits: fixed point reverse max expected error for each candidate
+    :param forwardFirstFailurePositions: optional zero-indexed position of the first failing base in each forward read
+    :param reverseFirstFailurePositions: optional zero-indexed position of the first failing base in each reverse read
+    :param forwardTrimPositions: zero-indexed forward trim position for each candidate, required with first failure positions
+    :param reverseTrimPositions: zero-indexed reverse trim position for each candidate, required with first failure positions
+    :param chunkElementLimit: approximate number of matrix values to compare per chunk
+    :return: int64 array of passing read counts for each candidate
+    """
+    readCount = forwardExpectedErrorMatrix.shape[1]
+    chunkSize = max(1, chunkElementLimit // max(readCount, 1))
+    keptReadCounts = numpy.zeros(len(forwardRows), dtype="int64")
+    for chunkStart in range(0, len(forwardRows), chunkSize):
+        chunk = slice(chunkStart, chunkStart + chunkSize)
+        passing = (
+            forwardExpectedErrorMatrix[forwardRows[chunk]]
+            <= forwardLimits[chunk, numpy.newaxis]
+        )
+        numpy.logical_and(
+            passing,
+            reverseExpectedErrorMatrix[reverseRows[chunk]]
+            <= reverseLimits[chunk, numpy.newaxis],
+            out=passing,
+        )
+        if forwardFirstFailurePositions is not None:
+            numpy.logical_and(
+                passing,
+                forwardFirstFailurePositions[numpy.newaxis, :]
+                > forwardTrimPositions[chunk, numpy.newaxis],
+                out=passing,
+            )
+        if reverseFirstFailurePositions is not None:
+            numpy.logical_and(
+                passing,
+                reverseFirstFailurePositions[numpy.newaxis, :]
+                > reverseTrimPositions[chunk, numpy.newaxis],
+                out=passing,
+            )
+        keptReadCounts[chunk] = numpy.count_nonzero(passing, axis=1)
+    return keptReadCounts
+
+
+def countReadsWithinCrossings(
+    forwardCrossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    reverseCrossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    forwardTrimPositions: numpy.ndarray,
+    reverseTrimPositions: numpy.ndarray,
+    forwardMaxExpectedErrors: list,
+    reverseMaxExpectedErrors: list,
+    chunkElementLimit: int = trimTestChunkElementLimit,
+):
+    """
+    Crossing table version of countReadsPassingExpectedErrorLimits. A read is kept when both of its crossings for the candidate's max expected errors are past the candidate's trim positions.
+    :return: int64 array of passing read counts for each candidate (float64 summed read weights if the forward table has read weights)
+    """
+    readCount = min(forwardCrossingTable.readCount, reverseCrossingTable.readCount)
+    readWeights = getCrossingTableReadWeights(forwardCrossingTable, readCount)
+    forwardCrossings = forwardCrossingTable.crossings[:, :readCount]
+    reverseCrossings = reverseCrossingTable.crossings[:, :readCount]
+    forwardRows = numpy.array(
+        [
+            forwardCrossingTable.getLevelRow(maxExpectedError)
+            for maxExpectedError in forwardMaxExpectedErrors
+        ],
+        dtype="int64",
+    )
+    reverseRows = numpy.array(
+        [
+            reverseCrossingTable.getLevelRow(maxExpectedError)
+            for maxExpectedError in reverseMaxExpectedErrors
+        ],
+        dtype="int64",
+    )
+    chunkSize = max(1, chunkElementLimit // max(readCount, 1))
+    keptReadCounts = numpy.zeros(
+        len(forwardRows), dtype="int64" if readWeights is None else "float64"
+    )
+    for chunkStart in range(0, len(forwardRows), chunkSize):
+        chunk = slice(chunkStart, chunkStart + chunkSize)
+        passing = (
+            forwardCrossings[forwardRows[chunk]]
+            > forwardTrimPositions[chunk, numpy.newaxis]
+        )
+        numpy.logical_and(
+            passing,
+            reverseCrossings[reverseRows[chunk]]
+            > reverseTrimPositions[chunk, numpy.newaxis],
+            out=passing,
+        )
+        if readWeights is None:
+            keptReadCounts[chunk] = numpy.count_nonzero(passing, axis=1)
+        else:
+            keptReadCounts[chunk] = numpy.dot(passing, readWeights)
+    return keptReadCounts
+
+
+def getCrossingTableReadWeights(
+    crossingTable: fastqAnalysis.ExpectedErrorCrossingTable, readCount: int
+):
+    if crossingTable.readWeights is None:
+        return None
+    return crossingTable.readWeights[:readCount]
+
+
+def calculateRetentionSurface(
+    forwardCrossings: numpy.ndarray,
+    reverseCrossings: numpy.ndarray,
+    forwardLength: int,
+    reverseLength: int,
+    readWeights: numpy.ndarray = None,
+):
+    """
+    Counts the reads kept at every forward and reverse trim position pair at once for a single pair of max expected error levels.
+    Each read is binned by how many leading positions it keeps in each direction, and the reverse two dimensional cumulative sum of that histogram counts the reads reaching past both positions of every pair.
+    This takes O(reads + forwardLength * reverseLength) work instead of a pass over the reads for each pair.
+    :param forwardCrossings: number of leading positions each forward read keeps (one crossing table row)
+    :param reverseCrossings: same for the reverse reads, pair-aligned with the forward crossings
+    :param forwardLength: number of forward trim positions to cover
+    :param reverseLength: number of reverse trim positions to cover
+    :param readWeights: optional weight of each read, to sum instead of counting reads
+    :return: int64 matrix where [f, r] is the number of reads kept when trimming at zero-indexed positions f and r (float64 summed weights if readWeights are given)
+    """
+    forwardBins = numpy.minimum(forwardCrossings, forwardLength).astype("int64")
+    reverseBins = numpy.minimum(reverseCrossings, reverseLength).astype("int64")
+    histogram = numpy.bincount(
+        forwardBins * (reverseLength + 1) + reverseBins,
+        weights=readWeights,
+        minlength=(forwardLength + 1) * (reverseLength + 1),
+    ).reshape(forwardLength + 1, reverseLength + 1)
+    dominatingCounts = histogram[::-1, ::-1].cumsum(axis=0).cumsum(axis=1)[::-1, ::-1]
+    # a read is kept at position p only if it keeps more than p positions
+    return dominatingCounts[1:, 1:]
+
+
+def calculateRetentionCurve(
+    crossings: numpy.ndarray, length: int, readWeights: numpy.ndarray = None
+):
+    """
+    Single-end version of calculateRetentionSurface, counting the reads kept at every trim position at once for a single max expected error level.
+    :param crossings: number of leading positions each read keeps (one crossing table row)
+    :param length: number of trim positions to cover
+    :param readWeights: optional weight of each read, to sum instead of counting reads
+    :return: int64 array where [p] is the number of reads kept when trimming at zero-indexed position p (float64 summed weights if readWeights are given)
+    """
+    histogram = numpy.bincount(
+        numpy.minimum(crossings, length).astype("int64"),
+        weights=readWeights,
+        minlength=length + 1,
+    )
+    return histogram[::-1].cumsum()[::-1][1:]
+
+
+def countReadsOnRetentionSurfaces(
+    forwardCrossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    reverseCrossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    forwardTrimPositions: numpy.ndarray,
+    reverseTrimPositions: numpy.ndarray,
+    forwardMaxExpectedErrors: list,
+    reverseMaxExpectedErrors: list,
+):
+    """
+    Counts the reads kept for every combination of the given forward and reverse trim positions, each with its own max expected error, building one retention surface per distinct pair of levels.
+    :return: int64 matrix of kept read counts with forward trim positions as rows and reverse trim positions as columns (float64 summed read weights if the forward table has read weights)
+    """
+    readCount = min(forwardCrossingTable.readCount, reverseCrossingTable.readCount)
+    readWeights = getCrossingTableReadWeights(forwardCrossingTable, readCount)
+    forwardRows = numpy.array(
+        [
+            forwardCrossingTable.getLevelRow(maxExpectedError)
+            for maxExpectedError in forwardMaxExpectedErrors
+        ],
+        dtype="int64",
+    )
+    reverseRows = numpy.array(
+        [
+            reverseCrossingTable.getLevelRow(maxExpectedError)
+            for maxExpectedError in reverseMaxExpectedErrors
+        ],
+        dtype="int64",
+    )
+    forwardLength = int(forwardTrimPositions.max()) + 1
+    reverseLength = int(reverseTrimPositions.max()) + 1
+    keptReadCounts = numpy.zeros(
+        (len(forwardTrimPositions), len(reverseTrimPositions)),
+        dtype="int64" if readWeights is None else "float64",
+    )
+    for forwardRow in numpy.unique(forwardRows):
+        forwardSelection = numpy.flatnonzero(forwardRows == forwardRow)
+        for reverseRow in numpy.unique(reverseRows):
+            reverseSelection = numpy.flatnonzero(reverseRows == reverseRow)
+            retentionSurface = calculateRetentionSurface(
+                forwardCrossingTable.crossings[forwardRow, :readCount],
+                reverseCrossingTable.crossings[reverseRow, :readCount],
+                forwardLength,
+                reverseLength,
+                readWeights,
+            )
+            keptReadCounts[numpy.ix_(forwardSelection, reverseSelection)] = (
+                retentionSurface[
+                    numpy.ix_(
+                        forwardTrimPositions[forwardSelection],
+                        reverseTrimPositions[reverseSelection],
+                    )
+                ]
+            )
+    return keptReadCounts
+
+
+def findBestMaxExpectedErrorPairs(
+    forwardCrossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    reverseCrossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    forwardTrimPositions: numpy.ndarray,
+    reverseTrimPositions: numpy.ndarray,
+    forwardMaxExpectedErrors: typing.Iterable[int],
+    reverseMaxExpectedErrors: typing.Iterable[int],
+):
+    """
+    Searches every combination of the given forward and reverse max expected errors for the best scoring one at each candidate trim position pair.
+    Each combination costs one retention surface, which is then read at every candidate at once, so adding a level adds no per-candidate work.
+    Ties go to the lowest max expected errors.
+    :param forwardTrimPositions: zero-indexed forward trim position for each candidate
+    :param reverseTrimPositions: zero-indexed reverse trim position for each candidate
+    :param forwardMaxExpectedErrors: forward max expected error values to try
+    :param reverseMaxExpectedErrors: reverse max expected error values to try
+    :return: best forward max expected error, best reverse max expected error and kept read count for each candidate as int64 arrays (kept read counts are float64 summed read weights if the forward table has read weights)
+    """
+    readCount = min(forwardCrossingTable.readCount, reverseCrossingTable.readCount)
+    readWeights = getCrossingTableReadWeights(forwardCrossingTable, readCount)
+    forwardLength = int(forwardTrimPositions.max()) + 1
+    reverseLength = int(reverseTrimPositions.max()) + 1
+    bestScores = numpy.full(len(forwardTrimPositions), -numpy.inf)
+    bestForwardMaxExpectedErrors = numpy.zeros(len(forwardTrimPositions), dtype="int64")
+    bestReverseMaxExpectedErrors = numpy.zeros(len(forwardTrimPositions), dtype="int64")
+    bestKeptReadCounts = numpy.zeros(
+        len(forwardTrimPositions), dtype="int64" if readWeights is None else "float64"
+    )
+    for forwardMaxExpectedError in sorted(forwardMaxExpectedErrors):
+        forwardCrossings = forwardCrossingTable.crossings[
+            forwardCrossingTable.getLevelRow(forwardMaxExpectedError), :readCount
+        ]
+        for reverseMaxExpectedError in sorted(reverseMaxExpectedErrors):
+            keptReadCounts = calculateRetentionSurface(
+                forwardCrossings,
+                reverseCrossingTable.crossings[
+                    reverseCrossingTable.getLevelRow(reverseMaxExpectedError),
+                    :readCount,
+                ],
+                forwardLength,
+                reverseLength,
+                readWeights,
+            )[forwardTrimPositions, reverseTrimPositions]
+            scores = calculateTrimParameterScore(
+                keptReadCounts / max(readCount, 1),
+                forwardMaxExpectedError,
+                reverseMaxExpectedError,
+            )
+            improved = scores > bestScores
+            bestScores[improved] = scores[improved]
+            bestForwardMaxExpectedErrors[improved] = forwardMaxExpectedError
+            bestReverseMaxExpectedErrors[improved] = reverseMaxExpectedError
+            bestKeptReadCounts[improved] = keptReadCounts[improved]
+    return (
+        bestForwardMaxExpectedErrors,
+        bestReverseMaxExpectedErrors,
+        bestKeptReadCounts,
+    )
+
+
+def makeTrimParameterResults(
+    trimPositions: [tuple, numpy.ndarray],
+    forwardMaxExpectedErrors: [list, numpy.ndarray],
+    reverseMaxExpectedErrors: [list, numpy.ndarray],
+    keptReadCounts: numpy.ndarray,
+    readCount: int,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    """
+    :param trimPositions: zero-indexed (forward, reverse) trim position pairs, as a tuple of pairs or a two column array
+    :return: TrimParameterResults with one-indexed trim positions that include the primers
+    """
+    trimPositionArray = numpy.asarray(trimPositions, dtype="int64").reshape(-1, 2)
+    return TrimParameterResults(
+        trimPositionArray[:, 0] + 1 + forwardPrimerLength,
+        trimPositionArray[:, 1] + 1 + reversePrimerLength,
+        forwardMaxExpectedErrors,
+        reverseMaxExpectedErrors,
+        keptReadCounts,
+        readCount,
+    )  # doing +1 to adjust for zero indexed matrices
+
+
+def makeRankedTrimParameterSets(
+    trimPositions: tuple,
+    forwardMaxExpectedErrors: list,
+    reverseMaxExpectedErrors: list,
+    keptReadCounts: numpy.ndarray,
+    readCount: int,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    return makeTrimParameterResults(
+        trimPositions,
+        forwardMaxExpectedErrors,
+        reverseMaxExpectedErrors,
+        keptReadCounts,
+        readCount,
+        forwardPrimerLength,
+        reversePrimerLength,
+    ).makeRankedTrimParameterSets()
+
+
+def runTrimParameterTest(
+    forwardExpectedErrorMatrix: numpy.ndarray,
+    reverseExpectedErrorMatrix: numpy.ndarray,
+    forwardFirstNBaseArray: numpy.ndarray,
+    reverseFirstNBaseArray: numpy.ndarray,
+    forwardQ2Array: numpy.ndarray,
+    reverseQ2Array: numpy.ndarray,
+    trimPositions: tuple,
+    minimumTrimPositions: tuple = (0, 0),
+    forwardCurve: expectedErrorCurve.ExponentialFit = None,
+    reverseCurve: expectedErrorCurve.ExponentialFit = None,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    forwardMinimumTrimPosition, reverseMinimumTrimPosition = minimumTrimPositions
+    forwardMaxExpectedErrors, reverseMaxExpectedErrors = calculateMaxExpectedErrors(
+        trimPositions, forwardCurve, reverseCurve
+    )
+    readCount = min(
+        forwardExpectedErrorMatrix.shape[1], reverseExpectedErrorMatrix.shape[1]
+    )
+    forwardFirstFailurePositions = numpy.minimum(
+        forwardFirstNBaseArray[:readCount], forwardQ2Array[:readCount]
+    )  # reads are lost at whichever comes first, so only the earlier one matters
+    reverseFirstFailurePositions = numpy.minimum(
+        reverseFirstNBaseArray[:readCount], reverseQ2Array[:readCount]
+    )
+    trimPositionArray = numpy.array(trimPositions, dtype="int64").reshape(-1, 2)
+    keptReadCounts = countReadsPassingExpectedErrorLimits(
+        forwardExpectedErrorMatrix[:, :readCount],
+        reverseExpectedErrorMatrix[:, :readCount],
+        trimPositionArray[:, 0] - forwardMinimumTrimPosition,
+        trimPositionArray[:, 1] - reverseMinimumTrimPosition,
+        makeFixedPointLimitArray(forwardMaxExpectedErrors),
+        makeFixedPointLimitArray(reverseMaxExpectedErrors),
+        forwardFirstFailurePositions,
+        reverseFirstFailurePositions,
+        trimPositionArray[:, 0],
+        trimPositionArray[:, 1],
+    )
+    return makeTrimParameterResults(
+        trimPositions,
+        forwardMaxExpectedErrors,
+        reverseMaxExpectedErrors,
+        keptReadCounts,
+        readCount,
+        forwardPrimerLength,
+        reversePrimerLength,
+    )
+
+
+def runTrimParameterTestLite(
+    forwardExpectedErrorMatrix: numpy.ndarray,
+    reverseExpectedErrorMatrix: numpy.ndarray,
+    trimPositions: tuple,
+    minimumTrimPositions: tuple = (0, 0),
+    forwardCurve: expectedErrorCurve.ExponentialFit = None,
+    reverseCurve: expectedErrorCurve.ExponentialFit = None,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+):
+    forwardMinimumTrimPosition, reverseMinimumTrimPosition = minimumTrimPositions
+    forwardMaxExpectedErrors, reverseMaxExpectedErrors = calculateMaxExpectedErrors(
+        trimPositions, forwardCurve, reverseCurve
+    )
+    readCount = min(
+        forwardExpectedErrorMatrix.shape[1], reverseExpectedErrorMatrix.shape[1]
+    )
+    trimPositionArray = numpy.array(trimPositions, dtype="int64").reshape(-1, 2)
+    keptReadCounts = countReadsPassingExpectedErrorLimits(
+        forwardExpectedErrorMatrix[:, :readCount],
+        reverseExpectedErrorMatrix[:, :readCount],
+        trimPositionArray[:, 0] - forwardMinimumTrimPosition,
+        trimPositionArray[:, 1] - reverseMinimumTrimPosition,
+        makeFixedPointLimitArray(forwardMaxExpectedErrors),
+        makeFixedPointLimitArray(reverseMaxExpectedErrors),
+    )
+    return makeTrimParameterResults(
+        trimPositions,
+        forwardMaxExpectedErrors,
+        reverseMaxExpectedErrors,
+        keptReadCounts,
+        readCount,
+        forwardPrimerLength,
+        reversePrimerLength,
+    )
+
+
+def runTrimParameterTestOnCrossingTables(
+    forwardCrossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    reverseCrossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    trimPositions: tuple,
+    forwardCurve: expectedErrorCurve.ExponentialFit = None,
+    reverseCurve: expectedErrorCurve.ExponentialFit = None,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+    maxExpectedErrorSearchLimit: int = 0,
+):
+    readCount = min(forwardCrossingTable.readCount, reverseCrossingTable.readCount)
+    trimPositionArray = numpy.array(trimPositions, dtype="int64").reshape(-1, 2)
+    if maxExpectedErrorSearchLimit:
+        searchLevels = range(1, maxExpectedErrorSearchLimit + 1)
+        forwardMaxExpectedErrors, reverseMaxExpectedErrors, keptReadCounts = (
+            findBestMaxExpectedErrorPairs(
+                forwardCrossingTable,
+                reverseCrossingTable,
+                trimPositionArray[:, 0],
+                trimPositionArray[:, 1],
+                searchLevels,
+                searchLevels,
+            )
+        )
+        return makeTrimParameterResults(
+            trimPositions,
+            forwardMaxExpectedErrors,
+            reverseMaxExpectedErrors,
+            keptReadCounts,
+            readCount,
+            forwardPrimerLength,
+            reversePrimerLength,
+        )
+    forwardMaxExpectedErrors, reverseMaxExpectedErrors = calculateMaxExpectedErrors(
+        trimPositions, forwardCurve, reverseCurve
+    )
+    keptReadCounts = countReadsWithinCrossings(
+        forwardCrossingTable,
+        reverseCrossingTable,
+        trimPositionArray[:, 0],
+        trimPositionArray[:, 1],
+        forwardMaxExpectedErrors,
+        reverseMaxExpectedErrors,
+    )
+    return makeTrimParameterResults(
+        trimPositions,
+        forwardMaxExpectedErrors,
+        reverseMaxExpectedErrors,
+        keptReadCounts,
+        readCount,
+        forwardPrimerLength,
+        reversePrimerLength,
+    )
+
+
+def runSingleEndTrimParameterTest(
+    crossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    trimPositions: numpy.ndarray,
+    curve: expectedErrorCurve.ExponentialFit = None,
+    primerLength: int = 0,
+    maxExpectedErrorSearchLimit: int = 0,
+    fallbackFunction: typing.Callable = calculateForwardExpectedErrorFromReadLength,
+):
+    """
+    Ranks every single-end trim position, building one retention curve per max expected error level in use and reading all positions from it at once.
+    :param trimPositions: zero-indexed trim positions to test
+    :param curve: expected error curve giving the max expected error at each trim position
+    :param maxExpectedErrorSearchLimit: if set, try every max expected error up to this value at each trim position and keep the best scoring one instead of using the curve (ties go to the lowest)
+    :return: SingleEndTrimParameterResults holding every candidate
+    """
+    readCount = crossingTable.readCount
+    readWeights = crossingTable.readWeights
+    keptReadCountType = "int64" if readWeights is None else "float64"
+    length = int(trimPositions.max()) + 1
+    if maxExpectedErrorSearchLimit:
+        bestScores = numpy.full(len(trimPositions), -numpy.inf)
+        maxExpectedErrors = numpy.zeros(len(trimPositions), dtype="int64")
+        keptReadCounts = numpy.zeros(len(trimPositions), dtype=keptReadCountType)
+        for maxExpectedError in range(1, maxExpectedErrorSearchLimit + 1):
+            levelKeptReadCounts = calculateRetentionCurve(
+                crossingTable.crossings[crossingTable.getLevelRow(maxExpectedError)],
+                length,
+                readWeights,
+            )[trimPositions]
+            scores = calculateSingleEndTrimParameterScore(
+                levelKeptReadCounts / max(readCount, 1), maxExpectedError
+            )
+            improved = scores > bestScores
+            bestScores[improved] = scores[improved]
+            maxExpectedErrors[improved] = maxExpectedError
+            keptReadCounts[improved] = levelKeptReadCounts[improved]
+    else:
+        maxExpectedErrors = numpy.array(
+            [
+                calculateMaxExpectedErrorForPosition(position, curve, fallbackFunction)
+                for position in trimPositions.tolist()
+            ],
+            dtype="int64",
+        )
+        keptReadCounts = numpy.zeros(len(trimPositions), dtype=keptReadCountType)
+        for maxExpectedError in numpy.unique(maxExpectedErrors).tolist():
+            selection = numpy.flatnonzero(maxExpectedErrors == maxExpectedError)
+            keptReadCounts[selection] = calculateRetentionCurve(
+                crossingTable.crossings[crossingTable.getLevelRow(maxExpectedError)],
+                length,
+                readWeights,
+            )[trimPositions[selection]]
+    return SingleEndTrimParameterResults(
+        trimPositions + 1 + primerLength,
+        maxExpectedErrors,
+        keptReadCounts,
+        readCount,
+    )  # doing +1 to adjust for zero indexed positions
+
+
+def runCrossingTableTrimParameterTest(
+    fastqList: list,
+    sampleOrder: list,
+    subsample: int,
+    trimPositions: tuple,
+    forwardCurve: expectedErrorCurve.ExponentialFit = None,
+    reverseCurve: expectedErrorCurve.ExponentialFit = None,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+    limitToFirstFailures: bool = False,
+    maxExpectedErrorSearchLimit: int = 0,
+):
+    if maxExpectedErrorSearchLimit:
+        maxLevels = (maxExpectedErrorSearchLimit, maxExpectedErrorSearchLimit)
+    else:
+        forwardMaxExpectedErrors, reverseMaxExpectedErrors = calculateMaxExpectedErrors(
+            trimPositions, forwardCurve, reverseCurve
+        )
+        maxLevels = (
+            calculateCrossingTableMaxLevel(forwardMaxExpectedErrors),
+            calculateCrossingTableMaxLevel(reverseMaxExpectedErrors),
+        )
+    forwardCrossingTable, reverseCrossingTable = makeCombinedCrossingTablesForBothEnds(
+        fastqList,
+        sampleOrder,
+        subsample,
+        maxLevels,
+        forwardPrimerLength,
+        reversePrimerLength,
+        limitToFirstFailures,
+    )
+    return runTrimParameterTestOnCrossingTables(
+        forwardCrossingTable,
+        reverseCrossingTable,
+        trimPositions,
+        forwardCurve,
+        reverseCurve,
+        forwardPrimerLength,
+        reversePrimerLength,
+        maxExpectedErrorSearchLimit,
+    )
+
+
+def runTrimParameterGridSearchOnCrossingTables(
+    forwardCrossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    reverseCrossingTable: fastqAnalysis.ExpectedErrorCrossingTable,
+    forwardReadLength: int,
+    reverseReadLength: int,
+    minimumCombinedReadLength: int,
+    forwardCurve: expectedErrorCurve.ExponentialFit = None,
+    reverseCurve: expectedErrorCurve.ExponentialFit = None,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+    maxExpectedErrorSearchLimit: int = 0,
+):
+    forwardPositions, reversePositions = makeFeasibleTrimPositionRanges(
+        forwardReadLength, reverseReadLength, minimumCombinedReadLength
+    )
+    readCount = min(forwardCrossingTable.readCount, reverseCrossingTable.readCount)
+    combinedLengths = forwardPositions[:, numpy.newaxis] + reversePositions + 2
+    forwardIndices, reverseIndices = numpy.nonzero(
+        combinedLengths
+        >= min(minimumCombinedReadLength, forwardReadLength + reverseReadLength)
+    )
+    trimPositions = numpy.column_stack(
+        (forwardPositions[forwardIndices], reversePositions[reverseIndices])
+    )
+    if maxExpectedErrorSearchLimit:
+        searchLevels = range(1, maxExpectedErrorSearchLimit + 1)
+        forwardMaxExpectedErrors, reverseMaxExpectedErrors, keptReadCounts = (
+            findBestMaxExpectedErrorPairs(
+                forwardCrossingTable,
+                reverseCrossingTable,
+                forwardPositions[forwardIndices],
+                reversePositions[reverseIndices],
+                searchLevels,
+                searchLevels,
+            )
+        )
+        return makeTrimParameterResults(
+            trimPositions,
+            forwardMaxExpectedErrors,
+            reverseMaxExpectedErrors,
+            keptReadCounts,
+            readCount,
+            forwardPrimerLength,
+            reversePrimerLength,
+        )
+    forwardMaxExpectedErrors = [
+        calculateMaxExpectedErrorForPosition(
+            position, forwardCurve, calculateForwardExpectedErrorFromReadLength
+        )
+        for position in forwardPositions.tolist()
+    ]
+    reverseMaxExpectedErrors = [
+        calculateMaxExpectedErrorForPosition(
+            position, reverseCurve, calculateReverseExpectedErrorFromReadLength
+        )
+        for position in reversePositions.tolist()
+    ]
+    keptReadCounts = countReadsOnRetentionSurfaces(
+        forwardCrossingTable,
+        reverseCrossingTable,
+        forwardPositions,
+        reversePositions,
+        forwardMaxExpectedErrors,
+        reverseMaxExpectedErrors,
+    )
+    return makeTrimParameterResults(
+        trimPositions,
+        numpy.array(forwardMaxExpectedErrors, dtype="int64")[forwardIndices],
+        numpy.array(reverseMaxExpectedErrors, dtype="int64")[reverseIndices],
+        keptReadCounts[forwardIndices, reverseIndices],
+        readCount,
+        forwardPrimerLength,
+        reversePrimerLength,
+    )
+
+
+def runCrossingTableTrimParameterGridSearch(
+    fastqList: list,
+    sampleOrder: list,
+    subsample: int,
+    forwardReadLength: int,
+    reverseReadLength: int,
+    minimumCombinedReadLength: int,
+    forwardCurve: expectedErrorCurve.ExponentialFit = None,
+    reverseCurve: expectedErrorCurve.ExponentialFit = None,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+    limitToFirstFailures: bool = False,
+    maxExpectedErrorSearchLimit: int = 0,
+):
+    maxLevels = calculateCrossingTableMaxLevelsForCurves(
+        forwardReadLength,
+        reverseReadLength,
+        minimumCombinedReadLength,
+        [(forwardCurve, reverseCurve)],
+        maxExpectedErrorSearchLimit,
+    )
+    forwardCrossingTable, reverseCrossingTable = makeCombinedCrossingTablesForBothEnds(
+        fastqList,
+        sampleOrder,
+        subsample,
+        maxLevels,
+        forwardPrimerLength,
+        reversePrimerLength,
+        limitToFirstFailures,
+    )
+    return runTrimParameterGridSearchOnCrossingTables(
+        forwardCrossingTable,
+        reverseCrossingTable,
+        forwardReadLength,
+        reverseReadLength,
+        minimumCombinedReadLength,
+        forwardCurve,
+        reverseCurve,
+        forwardPrimerLength,
+        reversePrimerLength,
+        maxExpectedErrorSearchLimit,
+    )
+
+
+def getSampleOrder(fastqList: list):
+    forwardFastqList = [fastq for fastq in fastqList if fastq.direction == 1]
+    sampleOrder = forwardFastqList  # using this because I have to pick one
+    return sampleOrder
+
+
+def parallelReadLengthChecker(fastq: fileNamingStandards.NamingStandard):
+    probeBlock = fastqHandler.readProbeBlock(fastq.filePath, primerCheckProbeReadCount)
+    return (
+        fastq,
+        fastqHandler.estimateReadLengthFromBlock(probeBlock, getVariance=True),
+        fastqAnalysis.estimateConservedPrefixLength(probeBlock),
+    )
+
+
+def checkPrimerLength(conservedPrefixLengths: list, primerLength: int, direction: str):
+    """
+    Compares a given primer length to how far the start of the reads stays conserved across each sample, to catch primer lengths that would shift every trim position.
+    A conserved start longer than the primer also warns, since the primer length may be too short, though this is expected if the amplicon starts in a conserved region.
+    :return: True if the primer length looks consistent with the reads
+    """
+    import statistics
+
+    conservedPrefixLength = round(statistics.median(conservedPrefixLengths))
+    if conservedPrefixLength + primerCheckTolerance < primerLength:
+        logger.warning(
+            "%s reads appear to become variable after %s bases, inside the given %s base primer. Please check that the primer length is correct and that primers have not already been removed."
+            % (direction.capitalize(), conservedPrefixLength, primerLength)
+        )
+        return False
+    if not primerLength and conservedPrefixLength >= primerCheckMinimumPrimerLength:
+        logger.warning(
+            "%s reads appear to start with %s conserved bases, but no primer length was given. Please check whether primers are still on the reads."
+            % (direction.capitalize(), conservedPrefixLength)
+        )
+        return False
+    if conservedPrefixLength > primerLength + primerCheckTolerance:
+        logger.warning(
+            "%s reads stay conserved for %s bases, past the given %s base primer. Please check that the primer length is not too short. This is expected if the amplicon starts in a conserved region."
+            % (direction.capitalize(), conservedPrefixLength, primerLength)
+        )
+        return False
+    return True
+
+
+def checkReadLengths(
+    fastqList: list,
+    forwardPrimerLength: int = None,
+    reversePrimerLength: int = None,
+):
+    """
+    Checks that all forward and all reverse reads share one length. If primer lengths are given, they are also checked against the conserved start of the reads from the same probe.
+    :return: forward read length, reverse read length
+    """
+    try:
+        from . import easyMultiprocessing
+    except ImportError:
+        import easyMultiprocessing
+    read1Data = []
+    read2Data = []
+    read1ConservedPrefixLengths = []
+    read2ConservedPrefixLengths = []
+    fastqReadLengthData = easyMultiprocessing.parallelProcessRunner(
+        parallelReadLengthChecker, fastqList
+    )
+    for fastq, data, conservedPrefixLength in fastqReadLengthData:
+        if fastq.direction == 1:
+            read1Data.append(data)
+            read1ConservedPrefixLengths.append(conservedPrefixLength)
+        elif fastq.direction == 2:
+            read2Data.append(data)
+            read2ConservedPrefixLengths.append(conservedPrefixLength)
+    if forwardPrimerLength is not None and read1ConservedPrefixLengths:
+        checkPrimerLength(read1ConservedPrefixLengths, forwardPrimerLength, "forward")
+    if reversePrimerLength is not None and read2ConservedPrefixLengths:
+        checkPrimerLength(read2ConservedPrefixLengths, reversePrimerLength, "reverse")
+    read1DataSet = set(read1Data)
+    read2DataSet = set(read2Data)
+    filesPassCheck = True
+    if not len(read1Data) == len(read2Data):
+        logger.error(
+            "There appears to be a different number of forward and reverse fastq files in the sequence folder. %s forward and %s reverse"
+            % (len(read1Data), len(read2Data))
+        )
+        filesPassCheck = False
+    if not len(read1DataSet) == 1:
+        logger.error(
+            "Forward read files appear to be of different lengths or of varied lengths. %s"
+            % read1DataSet
+        )
+        filesPassCheck = False
+    if not len(read2DataSet) == 1:
         logger.error(
             "Reverse read files appear to be of different lengths or of varied lengths. %s"
             % read2DataSet
@@ -648,6 +2366,48 @@ def checkReadLengths(fastqList: list):
     return read1Length, read2Length
 
 
+def checkSingleEndReadLengths(
+    fastqList: list, primerLength: int = None, directionName: str = "forward"
+):
+    """
+    Single-end version of checkReadLengths, checking that all the given reads share one length.
+    :return: read length
+    """
+    try:
+        from . import easyMultiprocessing
+    except ImportError:
+        import easyMultiprocessing
+    fastqReadLengthData = easyMultiprocessing.parallelProcessRunner(
+        parallelReadLengthChecker, fastqList
+    )
+    readDataSet = set([data for fastq, data, conserved in fastqReadLengthData])
+    if primerLength is not None:
+        checkPrimerLength(
+            [conserved for fastq, data, conserved in fastqReadLengthData],
+            primerLength,
+            directionName,
+        )
+    filesPassCheck = True
+    if not len(readDataSet) == 1:
+        logger.error(
+            "%s read files appear to be of different lengths or of varied lengths. %s"
+            % (directionName.capitalize(), readDataSet)
+        )
+        filesPassCheck = False
+    readLength, readVariance = list(readDataSet)[0]
+    if readVariance:
+        logger.error(
+            "%s reads appear to not be of consistent length. %s"
+            % (directionName.capitalize(), readDataSet)
+        )
+        filesPassCheck = False
+    if not filesPassCheck:
+        raise fastqHandler.FastqValidationError(
+            "Unable to validate fastq files enough to perform this operation. Please check log for specific error(s)."
+        )
+    return readLength
+
+
 def performAnalysis(
     inputDirectory: str,
     minimumCombinedReadLength: int,
@@ -657,69 +2417,26 @@ def performAnalysis(
     makeExpectedErrorPlots: bool = True,
     forwardPrimerLength: int = 0,
     reversePrimerLength: int = 0,
+    namingStandardAlias: str = "illumina",
+    useCrossingTables: bool = True,
+    fullGridSearch: bool = False,
+    maxExpectedErrorSearchLimit: int = 0,
 ):
-    from . import expectedErrorCurve
-
-    if not inputDirectory:
-        if not fastqList:
-            raise ValueError("No input directory and no fastq list were given.")
-    if not fastqList:
-        fastqList = getFastqList(inputDirectory)
-        if not fastqList:
-            raise ValueError("No fastq files found in input directory")
-    sampleOrder = getSampleOrder(fastqList)
-    forwardReadLength, reverseReadLength = checkReadLengths(fastqList)
-    forwardReadLength = forwardReadLength - forwardPrimerLength
-    reverseReadLength = reverseReadLength - reversePrimerLength
-    forwardCurve, reverseCurve = (
-        expectedErrorCurve.calculateExpectedErrorCurvesForFastqList(
-            fastqList,
-            subsample=subsample,
-            percentile=percentile,
-            makePNG=makeExpectedErrorPlots,
-            forwardPrimerLength=forwardPrimerLength,
-            reversePrimerLength=reversePrimerLength,
-        )
-    )
-    minimumTrimmingPositions = calculateLowestTrimBaseForPairedReads(
-        forwardReadLength, reverseReadLength, minimumCombinedReadLength
-    )
-    trimPositions = makeAllPossibleTrimLocations(
-        forwardReadLength, reverseReadLength, minimumCombinedReadLength
-    )
-    forwardQ2Array, reverseQ2Array = makeCombinedQ2ArraysForBothEnds(
-        fastqList, sampleOrder, subsample, forwardPrimerLength, reversePrimerLength
-    )
-    forwardFirstNBaseArray, reverseFirstNBaseArray = (
-        makeCombinedFirstNBaseArraysForBothEnds(
-            fastqList, sampleOrder, subsample, forwardPrimerLength, reversePrimerLength
-        )
-    )
-    forwardExpectedErrorMatrix, reverseExpectedErrorMatrix = (
-        makeCombinedErrorMatricesForBothEnds(
-            fastqList,
-            sampleOrder,
-            subsample,
-            minimumTrimmingPositions,
-            forwardPrimerLength,
-            reversePrimerLength,
-        )
-    )
-    resultTable = runTrimParameterTest(
-        forwardExpectedErrorMatrix,
-        reverseExpectedErrorMatrix,
-        forwardFirstNBaseArray,
-        reverseFirstNBaseArray,
-        forwardQ2Array,
-        reverseQ2Array,
-        trimPositions,
-        minimumTrimmingPositions,
-        forwardCurve,
-        reverseCurve,
+    return performAnalysisForPercentiles(
+        inputDirectory,
+        minimumCombinedReadLength,
+        subsample,
+        [percentile],
+        fastqList,
+        makeExpectedErrorPlots,
         forwardPrimerLength,
         reversePrimerLength,
-    )
-    return resultTable, forwardCurve, reverseCurve
+        namingStandardAlias,
+        useCrossingTables,
+        fullGridSearch,
+        maxExpectedErrorSearchLimit,
+        lite=False,
+    )[0]
 
 
 def performAnalysisLite(
@@ -732,11 +2449,129 @@ def performAnalysisLite(
     forwardPrimerLength: int = 0,
     reversePrimerLength: int = 0,
     namingStandardAlias: str = "illumina",
+    useCrossingTables: bool = True,
+    fullGridSearch: bool = False,
+    maxExpectedErrorSearchLimit: int = 0,
+):
+    return performAnalysisForPercentiles(
+        inputDirectory,
+        minimumCombinedReadLength,
+        subsample,
+        [percentile],
+        fastqList,
+        makeExpectedErrorPlots,
+        forwardPrimerLength,
+        reversePrimerLength,
+        namingStandardAlias,
+        useCrossingTables,
+        fullGridSearch,
+        maxExpectedErrorSearchLimit,
+        lite=True,
+    )[0]
+
+
+def getSampleReadLimit(equalSampleWeights: bool, retentionPrecision: float):
+    """
+    :return: number of reads to use from each sample (0 for all of them). Reads are only limited when samples are weighted equally, as pooled retention would otherwise shift toward the samples that were not limited.
+    """
+    if not equalSampleWeights:
+        return 0
+    sampleReadLimit = sampleWeighting.calculateSampleReadLimit(retentionPrecision)
+    if sampleReadLimit:
+        logger.info(
+            "Weighting samples equally, using up to %s reads from each sample for a read retention standard error of %s percentage points"
+            % (sampleReadLimit, retentionPrecision)
+        )
+    return sampleReadLimit
+
+
+def performAnalysisForPercentiles(
+    inputDirectory: str,
+    minimumCombinedReadLength: int,
+    subsample: int = 0,
+    percentiles: list = (83,),
+    fastqList: list = None,
+    makeExpectedErrorPlots: bool = True,
+    forwardPrimerLength: int = 0,
+    reversePrimerLength: int = 0,
+    namingStandardAlias: str = "illumina",
+    useCrossingTables: bool = True,
+    fullGridSearch: bool = False,
+    maxExpectedErrorSearchLimit: int = 0,
+    lite: bool = False,
+    qualityReport: bool = False,
+    compositionReport: bool = False,
+    truncQValues: list = None,
+    estimateUniqueSequences: bool = False,
+    estimateMergeRate: bool = False,
+    ampliconLength: int = 0,
+    mergeSamplePairCount: int = readPairOverlap.defaultSamplePairCount,
+    estimateAmpliconLength: bool = False,
+    topResultCount: int = 0,
+    paretoFront: bool = False,
+    bootstrapReplicateCount: int = 0,
+    bootstrapSamples: bool = False,
+    influenceReport: bool = False,
+    sampleRetentionReport: bool = False,
+    equalSampleWeights: bool = False,
+    retentionPrecision: float = 0,
+    reports: dict = None,
 ):
+    """
+    Runs the trim parameter analysis for one or more expected error percentiles. The reads are scanned once for the expected error curves and once for the trim parameter test, no matter how many percentiles are requested.
+    :param useCrossingTables: test trim parameters on expected error crossing tables. If False, the slower full expected error matrices are used instead, which gives the same results but supports none of the options that need crossing tables
+    :param lite: only model expected error, skipping the first N base and Q<=2 checks
+    :param qualityReport: gather per-position quality score distributions during the trim parameter scan
+    :param compositionReport: gather per-position base composition and per-read GC content during the trim parameter scan
+    :param truncQValues: candidate dada2 truncQ values. Every trim parameter set is tested under each of them (in place of the fixed Q<=2 check) and results for all of them are ranked together
+    :param estimateUniqueSequences: sketch read prefixes during the trim parameter scan to estimate the unique sequences left after each trim, attached to every trim parameter set and reported per sample
+    :param estimateMergeRate: check how many of a sample of read pairs would merge (with dada2's default overlap and mismatch limits) at each trim, aligning each pair at its own best overlap
+    :param minimumCombinedReadLength: shortest combined trimmed read length to test, normally ampliconLength + minimumOverlap (just minimumOverlap if the amplicon length is left to estimateAmpliconLength)
+    :param ampliconLength: amplicon length not including primers, used by estimateMergeRate for pairs without a good overlap, required for it unless estimateAmpliconLength is set
+    :param mergeSamplePairCount: number of read pairs, split evenly across samples, to use for estimateMergeRate
+    :param estimateAmpliconLength: find the amplicon length of a sample of read pairs from their overlaps and report the distribution and a suggested setting (a smaller sample is used unless estimateMergeRate is also set). If no ampliconLength is given, the suggested length is used and added to minimumCombinedReadLength
+    :param topResultCount: only report this many of the best scoring trim parameter sets (0 for all of them)
+    :param paretoFront: also report the trim parameter sets that no other set matches or beats on read retention, total max expected error and combined trim length at once, as trimParameterParetoFront.json
+    :param bootstrapReplicateCount: if set, bootstrap the read retention of the best scoring trim parameter sets this many times, adding confidence intervals and how often each set scored best
+    :param bootstrapSamples: resample whole samples instead of reads for the bootstrap
+    :param influenceReport: find the recommendation with each sample left out and flag samples that move it, written to sampleInfluence.tsv
+    :param sampleRetentionReport: tabulate each sample's read retention at the best scoring trim parameter sets, written to sampleRetention.tsv
+    :param equalSampleWeights: score read retention as the average of each sample's own retention, so that every sample counts equally no matter how deep it is
+    :param retentionPrecision: with equalSampleWeights, only read as many reads from each sample as needed for its read retention to have this standard error in percentage points (0 to read them all)
+    :param reports: if given, any reports gathered during the scan are added to this dictionary as file name: report text
+    :return: list of (result table, forward curve, reverse curve) tuples in the same order as the percentiles
+    """
+    import json
+
     try:
         from . import expectedErrorCurve
     except:
         import expectedErrorCurve
+    if not useCrossingTables:
+        crossingTableOptions = {
+            "fullGridSearch": fullGridSearch,
+            "maxExpectedErrorSearchLimit": maxExpectedErrorSearchLimit,
+            "qualityReport": qualityReport,
+            "compositionReport": compositionReport,
+            "truncQValues": truncQValues,
+            "estimateUniqueSequences": estimateUniqueSequences,
+            "bootstrapReplicateCount": bootstrapReplicateCount,
+            "influenceReport": influenceReport,
+            "sampleRetentionReport": sampleRetentionReport,
+            "equalSampleWeights": equalSampleWeights,
+        }
+        requestedOptions = [
+            option for option, value in crossingTableOptions.items() if value
+        ]
+        if requestedOptions:
+            raise ValueError(
+                "The expected error matrix test can only rank trim positions from the expected error curves. These options need crossing tables: %s"
+                % ", ".join(requestedOptions)
+            )
+    if estimateMergeRate and not (ampliconLength or estimateAmpliconLength):
+        raise ValueError(
+            "An amplicon length is required to estimate merge rates unless it is also being estimated."
+        )
     namingStandard = fileNamingStandards.loadNamingStandard(namingStandardAlias)
     if not inputDirectory:
         if not fastqList:
@@ -746,45 +2581,444 @@ def performAnalysisLite(
         if not fastqList:
             raise ValueError("No fastq files found in input directory")
     sampleOrder = getSampleOrder(fastqList)
-    forwardReadLength, reverseReadLength = checkReadLengths(fastqList)
+    forwardReadLength, reverseReadLength = checkReadLengths(
+        fastqList, forwardPrimerLength, reversePrimerLength
+    )
     print("Forward read length: %s" % forwardReadLength)
     print("Reverse read length: %s" % reverseReadLength)
     forwardReadLength = forwardReadLength - forwardPrimerLength
     reverseReadLength = reverseReadLength - reversePrimerLength
-    forwardCurve, reverseCurve = (
-        expectedErrorCurve.calculateExpectedErrorCurvesForFastqList(
+    if reports is None:
+        reports = {}
+    if estimateMergeRate or estimateAmpliconLength:
+        samplePairCount = mergeSamplePairCount
+        if not estimateMergeRate:
+            samplePairCount = min(
+                samplePairCount, readPairOverlap.ampliconLengthSamplePairCount
+            )
+        readPairSample = readPairOverlap.makeCombinedReadPairSample(
+            fastqList,
+            sampleOrder,
+            samplePairCount,
+            subsample,
+            forwardPrimerLength,
+            reversePrimerLength,
+        )
+        estimatedAmpliconLengths = readPairOverlap.findBestOverlapAmpliconLengths(
+            readPairSample
+        )
+    if estimateAmpliconLength:
+        reports["ampliconLengths.tsv"] = readPairOverlap.makeAmpliconLengthReport(
+            estimatedAmpliconLengths
+        )
+        suggestedAmpliconLength = reportAmpliconLengthEstimate(
+            estimatedAmpliconLengths, ampliconLength
+        )
+        if not ampliconLength:
+            if not suggestedAmpliconLength:
+                raise ValueError(
+                    "No amplicon length was given and none could be estimated from read pair overlaps."
+                )
+            print(
+                "No amplicon length was given. Using the suggested amplicon length of %s."
+                % suggestedAmpliconLength
+            )
+            ampliconLength = suggestedAmpliconLength
+            minimumCombinedReadLength += suggestedAmpliconLength
+    sampleReadLimit = getSampleReadLimit(equalSampleWeights, retentionPrecision)
+    curvePairs = (
+        expectedErrorCurve.calculateExpectedErrorCurvesForFastqListAtPercentiles(
             fastqList,
             subsample=subsample,
-            percentile=percentile,
+            percentiles=percentiles,
             makePNG=makeExpectedErrorPlots,
             forwardPrimerLength=forwardPrimerLength,
             reversePrimerLength=reversePrimerLength,
+            readLimit=sampleReadLimit,
         )
     )
-    minimumTrimmingPositions = calculateLowestTrimBaseForPairedReads(
-        forwardReadLength, reverseReadLength, minimumCombinedReadLength
-    )
     trimPositions = makeAllPossibleTrimLocations(
         forwardReadLength, reverseReadLength, minimumCombinedReadLength
     )
-    forwardExpectedErrorMatrix, reverseExpectedErrorMatrix = (
-        makeCombinedErrorMatricesForBothEnds(
+    accumulatorTypes = []
+    if qualityReport:
+        accumulatorTypes.append(fastqAnalysis.QualityScoreHistogram)
+    if compositionReport:
+        accumulatorTypes.append(fastqAnalysis.BaseCompositionAccumulator)
+    if estimateUniqueSequences:
+        accumulatorTypes.append(fastqAnalysis.UniqueSequenceSketch)
+    candidateResults = []
+    if useCrossingTables:
+        maxLevels = calculateCrossingTableMaxLevelsForCurves(
+            forwardReadLength,
+            reverseReadLength,
+            minimumCombinedReadLength,
+            curvePairs,
+            maxExpectedErrorSearchLimit,
+        )
+        (
+            forwardCrossingTable,
+            reverseCrossingTable,
+            forwardSampleAccumulators,
+            reverseSampleAccumulators,
+        ) = makeCombinedCrossingTablesWithAccumulatorsForBothEnds(
             fastqList,
             sampleOrder,
             subsample,
-            minimumTrimmingPositions,
+            maxLevels,
             forwardPrimerLength,
             reversePrimerLength,
+            limitToFirstFailures=not lite,
+            accumulatorTypes=tuple(accumulatorTypes),
+            truncQValues=tuple(truncQValues or ()),
+            readLimit=sampleReadLimit,
+        )
+        if equalSampleWeights:
+            forwardCrossingTable.readWeights = (
+                sampleWeighting.makeEqualSampleReadWeights(
+                    forwardCrossingTable.sampleOffsets, forwardCrossingTable.readCount
+                )
+            )
+            reverseCrossingTable.readWeights = forwardCrossingTable.readWeights
+        forwardAccumulators = [
+            combineSampleAccumulators(forwardSampleAccumulators, accumulatorIndex)
+            for accumulatorIndex in range(len(accumulatorTypes))
+        ]
+        reverseAccumulators = [
+            combineSampleAccumulators(reverseSampleAccumulators, accumulatorIndex)
+            for accumulatorIndex in range(len(accumulatorTypes))
+        ]
+        for forwardAccumulator, reverseAccumulator in zip(
+            forwardAccumulators, reverseAccumulators
+        ):
+            reports.update(
+                forwardAccumulator.makeReports("forward", forwardPrimerLength)
+            )
+            reports.update(
+                reverseAccumulator.makeReports("reverse", reversePrimerLength)
+            )
+        if estimateUniqueSequences:
+            sketchIndex = accumulatorTypes.index(fastqAnalysis.UniqueSequenceSketch)
+            reports["sampleUniqueSequences.tsv"] = makeSampleUniqueSequenceReport(
+                sampleOrder,
+                [
+                    accumulators[sketchIndex]
+                    for accumulators in forwardSampleAccumulators
+                ],
+                [
+                    accumulators[sketchIndex]
+                    for accumulators in reverseSampleAccumulators
+                ],
+                forwardPrimerLength,
+                reversePrimerLength,
+            )
+        if truncQValues:
+            searchTables = [
+                (
+                    truncQ,
+                    forwardCrossingTable.limitedToTruncQ(truncQ),
+                    reverseCrossingTable.limitedToTruncQ(truncQ),
+                )
+                for truncQ in truncQValues
+            ]
+        else:
+            searchTables = [(None, forwardCrossingTable, reverseCrossingTable)]
+        for forwardCurve, reverseCurve in curvePairs:
+            truncQCandidateResults = []
+            for truncQ, forwardSearchTable, reverseSearchTable in searchTables:
+                if fullGridSearch:
+                    truncQResults = runTrimParameterGridSearchOnCrossingTables(
+                        forwardSearchTable,
+                        reverseSearchTable,
+                        forwardReadLength,
+                        reverseReadLength,
+                        minimumCombinedReadLength,
+                        forwardCurve,
+                        reverseCurve,
+                        forwardPrimerLength,
+                        reversePrimerLength,
+                        maxExpectedErrorSearchLimit,
+                    )
+                else:
+                    truncQResults = runTrimParameterTestOnCrossingTables(
+                        forwardSearchTable,
+                        reverseSearchTable,
+                        trimPositions,
+                        forwardCurve,
+                        reverseCurve,
+                        forwardPrimerLength,
+                        reversePrimerLength,
+                        maxExpectedErrorSearchLimit,
+                    )
+                if truncQ is not None:
+                    truncQResults.truncQValues = numpy.full(
+                        len(truncQResults), truncQ, dtype="int64"
+                    )
+                truncQCandidateResults.append(truncQResults)
+            candidateResults.append(combineTrimParameterResults(truncQCandidateResults))
+    else:
+        minimumTrimmingPositions = getMinimumTrimPositions(trimPositions)
+        if lite:
+            forwardExpectedErrorMatrix, reverseExpectedErrorMatrix = (
+                makeCombinedErrorMatricesForBothEnds(
+                    fastqList,
+                    sampleOrder,
+                    subsample,
+                    minimumTrimmingPositions,
+                    forwardPrimerLength,
+                    reversePrimerLength,
+                )
+            )
+            for forwardCurve, reverseCurve in curvePairs:
+                curveResults = runTrimParameterTestLite(
+                    forwardExpectedErrorMatrix,
+                    reverseExpectedErrorMatrix,
+                    trimPositions,
+                    minimumTrimmingPositions,
+                    forwardCurve,
+                    reverseCurve,
+                    forwardPrimerLength,
+                    reversePrimerLength,
+                )
+                candidateResults.append(curveResults)
+        else:
+            forwardArrays, reverseArrays = makeCombinedReadFilterArraysForBothEnds(
+                fastqList,
+                sampleOrder,
+                subsample,
+                minimumTrimmingPositions,
+                forwardPrimerLength,
+                reversePrimerLength,
+            )
+            forwardExpectedErrorMatrix, forwardFirstNBaseArray, forwardQ2Array = (
+                forwardArrays
+            )
+            reverseExpectedErrorMatrix, reverseFirstNBaseArray, reverseQ2Array = (
+                reverseArrays
+            )
+            for forwardCurve, reverseCurve in curvePairs:
+                curveResults = runTrimParameterTest(
+                    forwardExpectedErrorMatrix,
+                    reverseExpectedErrorMatrix,
+                    forwardFirstNBaseArray,
+                    reverseFirstNBaseArray,
+                    forwardQ2Array,
+                    reverseQ2Array,
+                    trimPositions,
+                    minimumTrimmingPositions,
+                    forwardCurve,
+                    reverseCurve,
+                    forwardPrimerLength,
+                    reversePrimerLength,
+                )
+                candidateResults.append(curveResults)
+    results = []
+    paretoFronts = []
+    for curveResults, (forwardCurve, reverseCurve) in zip(candidateResults, curvePairs):
+        results.append(
+            (
+                curveResults.makeRankedTrimParameterSets(topResultCount),
+                forwardCurve,
+                reverseCurve,
+            )
+        )
+        if paretoFront:
+            paretoFronts.append(curveResults.makeParetoFrontTrimParameterSets())
+    if bootstrapReplicateCount or influenceReport or sampleRetentionReport:
+        searchTableDict = dict(
+            [
+                (truncQ, (forwardSearchTable, reverseSearchTable))
+                for truncQ, forwardSearchTable, reverseSearchTable in searchTables
+            ]
+        )
+    if bootstrapReplicateCount:
+        for resultTable, forwardCurve, reverseCurve in results:
+            addBootstrapRetentionIntervals(
+                resultTable,
+                searchTableDict,
+                bootstrapReplicateCount,
+                bootstrapSamples,
+                forwardPrimerLength,
+                reversePrimerLength,
+            )
+    if estimateUniqueSequences:
+        for resultTable in [result[0] for result in results] + paretoFronts:
+            addUniqueSequenceEstimates(
+                resultTable,
+                forwardAccumulators[sketchIndex],
+                reverseAccumulators[sketchIndex],
+                forwardPrimerLength,
+                reversePrimerLength,
+            )
+    if estimateMergeRate:
+        # like mergePairs, each pair is aligned at its own best overlap, so amplicons of any length can merge
+        pairAmpliconLengths = numpy.where(
+            estimatedAmpliconLengths > 0, estimatedAmpliconLengths, ampliconLength
+        )
+        mergeableCounts = readPairOverlap.countMergeablePairsOnSurface(
+            readPairSample, pairAmpliconLengths
+        )
+        for resultTable in [result[0] for result in results] + paretoFronts:
+            addMergeRates(
+                resultTable,
+                mergeableCounts,
+                readPairSample.pairCount,
+                forwardPrimerLength,
+                reversePrimerLength,
+            )
+    sampleNames = [getSampleName(fastq) for fastq in sampleOrder]
+    if sampleRetentionReport:
+        for percentile, (resultTable, forwardCurve, reverseCurve) in zip(
+            percentiles, results
+        ):
+            sampleRetentionReportText = makeSampleRetentionReport(
+                resultTable,
+                searchTableDict,
+                sampleNames,
+                forwardPrimerLength,
+                reversePrimerLength,
+            )
+            if sampleRetentionReportText is None:
+                continue
+            reportFileName = "sampleRetention.tsv"
+            if len(percentiles) > 1:
+                reportFileName = "sampleRetention.percentile%s.tsv" % percentile
+            reports[reportFileName] = sampleRetentionReportText
+    if influenceReport:
+        for percentile, curveResults in zip(percentiles, candidateResults):
+            influenceReportText = makeSampleInfluenceReport(
+                curveResults,
+                searchTableDict,
+                sampleNames,
+                forwardPrimerLength,
+                reversePrimerLength,
+            )
+            if influenceReportText is None:
+                continue
+            reportFileName = "sampleInfluence.tsv"
+            if len(percentiles) > 1:
+                reportFileName = "sampleInfluence.percentile%s.tsv" % percentile
+            reports[reportFileName] = influenceReportText
+    for percentile, paretoTable in zip(percentiles, paretoFronts):
+        reportFileName = "trimParameterParetoFront.json"
+        if len(percentiles) > 1:
+            reportFileName = "trimParameterParetoFront.percentile%s.json" % percentile
+        reports[reportFileName] = json.dumps(
+            [trimParameterSet.toDict() for trimParameterSet in paretoTable], indent=4
+        )
+    return results
+
+
+def performSingleEndAnalysis(
+    inputDirectory: str,
+    minimumReadLength: int,
+    subsample: int = 0,
+    percentiles: list = (83,),
+    fastqList: list = None,
+    makeExpectedErrorPlots: bool = True,
+    primerLength: int = 0,
+    namingStandardAlias: str = "illumina",
+    maxExpectedErrorSearchLimit: int = 0,
+    topResultCount: int = 0,
+    lite: bool = False,
+    qualityReport: bool = False,
+    compositionReport: bool = False,
+    direction: int = 1,
+    equalSampleWeights: bool = False,
+    retentionPrecision: float = 0,
+    reports: dict = None,
+):
+    """
+    Runs the trim parameter analysis on the reads of one direction only, for single-end data or Deblur-style workflows that truncate every read to one length.
+    Files are not paired and the other direction is never read. Every trim position keeping at least the minimum read length is ranked.
+    :param minimumReadLength: shortest read length (not including the primer) to consider trimming to
+    :param primerLength: length of the primer on the analyzed reads
+    :param topResultCount: only report this many of the best scoring trim parameter sets (0 for all of them)
+    :param lite: only model expected error, skipping the first N base and Q<=2 checks
+    :param direction: read direction to analyze (1 for forward, 2 for reverse)
+    :param equalSampleWeights: score read retention as the average of each sample's own retention
+    :param retentionPrecision: with equalSampleWeights, only read as many reads from each sample as needed for its read retention to have this standard error in percentage points (0 to read them all)
+    :param reports: if given, any reports gathered during the scan are added to this dictionary as file name: report text
+    :return: list of (result table, curve) tuples in the same order as the percentiles
+    """
+    directionName = {1: "forward", 2: "reverse"}[direction]
+    fallbackFunction = {
+        1: calculateForwardExpectedErrorFromReadLength,
+        2: calculateReverseExpectedErrorFromReadLength,
+    }[direction]
+    namingStandard = fileNamingStandards.loadNamingStandard(namingStandardAlias)
+    if not inputDirectory:
+        if not fastqList:
+            raise ValueError("No input directory and no fastq list were given.")
+    if not fastqList:
+        fastqList = getFastqList(inputDirectory, namingStandard)
+    fastqList = [fastq for fastq in fastqList if fastq.direction == direction]
+    if not fastqList:
+        raise ValueError("No %s read fastq files found" % directionName)
+    readLength = checkSingleEndReadLengths(fastqList, primerLength, directionName)
+    print("%s read length: %s" % (directionName.capitalize(), readLength))
+    readLength = readLength - primerLength
+    sampleReadLimit = getSampleReadLimit(equalSampleWeights, retentionPrecision)
+    curves = (
+        expectedErrorCurve.calculateExpectedErrorCurvesForOneDirectionAtPercentiles(
+            fastqList,
+            subsample=subsample,
+            percentiles=percentiles,
+            makePNG=makeExpectedErrorPlots,
+            primerLength=primerLength,
+            directionName=directionName,
+            readLimit=sampleReadLimit,
         )
     )
-    resultTable = runTrimParameterTestLite(
-        forwardExpectedErrorMatrix,
-        reverseExpectedErrorMatrix,
-        trimPositions,
-        minimumTrimmingPositions,
-        forwardCurve,
-        reverseCurve,
-        forwardPrimerLength,
-        reversePrimerLength,
+    trimPositions = makeSingleEndTrimPositions(readLength, minimumReadLength)
+    if maxExpectedErrorSearchLimit:
+        maxLevel = maxExpectedErrorSearchLimit
+    else:
+        maxLevel = calculateCrossingTableMaxLevel(
+            [
+                calculateMaxExpectedErrorForPosition(position, curve, fallbackFunction)
+                for curve in curves
+                for position in trimPositions.tolist()
+            ]
+        )
+    accumulatorTypes = []
+    if qualityReport:
+        accumulatorTypes.append(fastqAnalysis.QualityScoreHistogram)
+    if compositionReport:
+        accumulatorTypes.append(fastqAnalysis.BaseCompositionAccumulator)
+    crossingTable, sampleAccumulators = makeCombinedCrossingTableForOneDirection(
+        fastqList,
+        fastqList,
+        subsample,
+        maxLevel,
+        primerLength,
+        limitToFirstFailures=not lite,
+        accumulatorTypes=tuple(accumulatorTypes),
+        readLimit=sampleReadLimit,
     )
-    return resultTable, forwardCurve, reverseCurve
+    if equalSampleWeights:
+        crossingTable.readWeights = sampleWeighting.makeEqualSampleReadWeights(
+            crossingTable.sampleOffsets, crossingTable.readCount
+        )
+    if reports is None:
+        reports = {}
+    for accumulatorIndex in range(len(accumulatorTypes)):
+        reports.update(
+            combineSampleAccumulators(sampleAccumulators, accumulatorIndex).makeReports(
+                directionName, primerLength
+            )
+        )
+    results = []
+    for curve in curves:
+        curveResults = runSingleEndTrimParameterTest(
+            crossingTable,
+            trimPositions,
+            curve,
+            primerLength,
+            maxExpectedErrorSearchLimit,
+            fallbackFunction,
+        )
+        results.append(
+            (curveResults.makeRankedTrimParameterSets(topResultCount), curve)
+        )
+    return results
@@ -0,0 +1,46 @@
+import gzip
+
+import numpy
+
+bases = numpy.array(list("ACGTN"))
+
+
+def makeRandomReads(
+    randomState: numpy.random.RandomState,
+    readCount: int,
+    readLength: int,
+    nRate: float = 0.0,
+):
+    """
+    :return: list of (sequence, quality scores) tuples with random bases and quality scores that tend to fall along the read, like Illumina reads
+    """
+    reads = []
+    for read in range(readCount):
+        codes = randomState.randint(0, 4, readLength)
+        codes[randomState.random_sample(readLength) < nRate] = 4
+        decline = numpy.linspace(0, 20, readLength)
+        qualities = numpy.clip(
+            38 - decline + randomState.normal(0, 6, readLength), 2, 40
+        ).astype(int)
+        qualities[codes == 4] = 2
+        reads.append(("".join(bases[codes]), qualities))
+    return reads
+
+
+def writeFastq(path: str, reads: list, gzipped: bool = False):
+    """
+    :param reads: list of (sequence, quality scores) tuples, written with phred+33 encoding
+    """
+    lines = []
+    for number, (sequence, qualities) in enumerate(reads):
+        lines.append("@read%s" % number)
+        lines.append(sequence)
+        lines.append("+")
+        lines.append("".join([chr(quality + 33) for quality in qualities]))
+    text = "\n".join(lines) + "\n"
+    if gzipped:
+        with gzip.open(path, "wt") as fastqFile:
+            fastqFile.write(text)
+    else:
+        with open(path, "w") as fastqFile:
+            fastqFile.write(text)
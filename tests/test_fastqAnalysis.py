@@ -0,0 +1,554 @@
+import numpy
+import pytest
+
+from figaro import expectedErrorCurve
+from figaro import fastqAnalysis
+from figaro import fastqHandler
+from figaro import fileNamingStandards
+from figaro import qualityScoreHandler
+
+import syntheticFastq
+
+
+def writeVariableLengthReads(path: str, seed: int, readCount: int = 400):
+    randomState = numpy.random.RandomState(seed)
+    reads = syntheticFastq.makeRandomReads(randomState, readCount, 120, nRate=0.003)
+    lengths = numpy.where(
+        randomState.random_sample(readCount) < 0.2,
+        randomState.randint(40, 120, readCount),
+        120,
+    )
+    reads = [
+        (sequence[:length], qualities[:length])
+        for (sequence, qualities), length in zip(reads, lengths)
+    ]
+    syntheticFastq.writeFastq(path, reads)
+    return reads
+
+
+def findCrossingByBruteForce(
+    sequence: str, qualities, maxExpectedError: int, failureScore: int = None
+):
+    qualityString = "".join([chr(quality + 33) for quality in qualities])
+    expectedErrors = qualityScoreHandler.cumulativeExpectedErrorArrayDada2Exact(
+        qualityString
+    )
+    crossing = 0
+    for position, expectedError in enumerate(expectedErrors):
+        if expectedError > maxExpectedError:
+            break
+        if failureScore is not None and (
+            sequence[position] == "N" or qualities[position] <= failureScore
+        ):
+            break
+        crossing = position + 1
+    return crossing
+
+
+def testCrossingTableMatchesBruteForce(tmp_path):
+    path = str(tmp_path / "reads.fastq")
+    reads = writeVariableLengthReads(path, 0)
+    leftTrim = 5
+    trimmedReads = [
+        (sequence[leftTrim:], qualities[leftTrim:]) for sequence, qualities in reads
+    ]
+    table = fastqAnalysis.buildExpectedErrorCrossingTable(path, 6, leftTrim=leftTrim)
+    limitedTable = fastqAnalysis.buildExpectedErrorCrossingTable(
+        path, 6, leftTrim=leftTrim, limitToFirstFailures=True
+    )
+    assert table.readCount == len(reads)
+    for level in range(1, 7):
+        row = table.getLevelRow(level)
+        expected = [
+            findCrossingByBruteForce(sequence, qualities, level)
+            for sequence, qualities in trimmedReads
+        ]
+        assert list(table.crossings[row]) == expected
+        expectedLimited = [
+            findCrossingByBruteForce(sequence, qualities, level, failureScore=2)
+            for sequence, qualities in trimmedReads
+        ]
+        assert list(limitedTable.crossings[row]) == expectedLimited
+    assert list(table.passingMask(30, 2)) == [
+        findCrossingByBruteForce(sequence, qualities, 2) > 30
+        for sequence, qualities in trimmedReads
+    ]
+
+
+def testCrossingTableLimitedToTruncQMatchesBruteForce(tmp_path):
+    path = str(tmp_path / "reads.fastq")
+    reads = writeVariableLengthReads(path, 1)
+    table = fastqAnalysis.buildExpectedErrorCrossingTable(
+        path, 4, limitToFirstFailures=True, truncQValues=[2, 11]
+    )
+    for truncQ in [2, 11]:
+        limitedTable = table.limitedToTruncQ(truncQ)
+        for level in range(1, 5):
+            expected = [
+                findCrossingByBruteForce(sequence, qualities, level, truncQ)
+                for sequence, qualities in reads
+            ]
+            assert list(limitedTable.crossings[limitedTable.getLevelRow(level)]) == (
+                expected
+            )
+    with pytest.raises(ValueError):
+        table.limitedToTruncQ(5)
+
+
+def testCombinedCrossingTablesKeepSampleOffsets(tmp_path):
+    tables = []
+    for sample, readCount in enumerate([150, 0, 70]):
+        path = str(tmp_path / ("sample%s.fastq" % sample))
+        writeVariableLengthReads(path, sample + 2, readCount)
+        tables.append(
+            fastqAnalysis.buildExpectedErrorCrossingTable(path, 3, truncQValues=[2])
+        )
+    combinedTable = fastqAnalysis.combineCrossingTables(tables)
+    assert list(combinedTable.sampleOffsets) == [0, 150, 150]
+    assert combinedTable.readCount == 220
+    assert numpy.array_equal(combinedTable.crossings[:, 150:], tables[2].crossings)
+    assert numpy.array_equal(
+        combinedTable.truncQPositions[:, :150], tables[0].truncQPositions
+    )
+    assert list(combinedTable.limitedToTruncQ(2).sampleOffsets) == [0, 150, 150]
+
+
+def findHigherPercentiles(values: numpy.ndarray, percentile: float):
+    try:
+        return numpy.percentile(values, percentile, axis=0, method="higher")
+    except TypeError:  # numpy before 1.22
+        return numpy.percentile(values, percentile, axis=0, interpolation="higher")
+
+
+def makeExpectedErrorBlock(seed: int, readCount: int, readLength: int):
+    randomState = numpy.random.RandomState(seed)
+    qualities = numpy.array(
+        [
+            qualities
+            for sequence, qualities in syntheticFastq.makeRandomReads(
+                randomState, readCount, readLength
+            )
+        ]
+    )
+    return qualityScoreHandler.cumulativeExpectedErrorBlock(
+        (qualities + 33).astype("uint8")
+    )
+
+
+def assertWithinOneBinAbove(
+    binnedValues: numpy.ndarray, exactValues: numpy.ndarray, tolerance: float = 1e-9
+):
+    binWidthRatio = 10 ** (1 / fastqAnalysis.expectedErrorHistogramBinsPerDecade)
+    assert numpy.all(binnedValues >= exactValues * (1 - tolerance))
+    assert numpy.all(
+        binnedValues
+        < numpy.maximum(exactValues, fastqAnalysis.expectedErrorHistogramLowestValue)
+        * binWidthRatio
+        * (1 + tolerance)
+    )
+
+
+def testExpectedErrorHistogramFindsBinsByUpperEdge():
+    edges = fastqAnalysis.ExpectedErrorHistogram.getBinUpperEdges()
+    binCount = fastqAnalysis.ExpectedErrorHistogram.binCount
+    assert len(edges) == binCount
+    assert numpy.isinf(edges[-1])
+    assert list(
+        fastqAnalysis.ExpectedErrorHistogram.findBins(edges[:-1] * 0.999)
+    ) == list(range(binCount - 1))
+    assert list(
+        fastqAnalysis.ExpectedErrorHistogram.findBins(
+            numpy.array([1e-12, 1e-9, edges[-2] * 1.001, 1e12])
+        )
+    ) == [0, 0, binCount - 1, binCount - 1]
+
+
+def testExpectedErrorHistogramPercentilesMatchNumpyOnUniformLengthBlock():
+    expectedErrorBlock = makeExpectedErrorBlock(0, 500, 150)
+    histogram = fastqAnalysis.ExpectedErrorHistogram()
+    histogram.addBlock(expectedErrorBlock[:200])
+    histogram.addBlock(expectedErrorBlock[200:])
+    assert histogram.readCount == 500
+    assert numpy.array_equal(histogram.counts.sum(axis=1), numpy.full(150, 500))
+    for percentile in [0, 10, 50, 83, 100]:
+        percentiles = histogram.calculatePercentiles(percentile)
+        assert len(percentiles) == 150
+        assertWithinOneBinAbove(
+            percentiles, findHigherPercentiles(expectedErrorBlock, percentile)
+        )
+
+
+def testExpectedErrorHistogramStopsWhereShortReadsRunOut():
+    longBlock = makeExpectedErrorBlock(1, 300, 150)
+    shortBlock = makeExpectedErrorBlock(2, 100, 90)
+    histogram = fastqAnalysis.ExpectedErrorHistogram()
+    histogram.addBlock(shortBlock)
+    histogram.addBlock(longBlock)
+    assert numpy.array_equal(histogram.counts[90:, -1], numpy.full(60, 100))
+    paddedShortBlock = numpy.pad(
+        shortBlock, ((0, 0), (0, 60)), constant_values=numpy.inf
+    )
+    expectedErrors = numpy.concatenate((paddedShortBlock, longBlock))
+    # a quarter of the reads end at 90, so only the lower percentiles reach the end
+    for percentile, positionCount in [(50, 150), (74, 150), (76, 90), (100, 90)]:
+        percentiles = histogram.calculatePercentiles(percentile)
+        assert len(percentiles) == positionCount
+        assert numpy.all(numpy.isfinite(percentiles))
+        assertWithinOneBinAbove(
+            percentiles,
+            findHigherPercentiles(expectedErrors, percentile)[:positionCount],
+        )
+
+
+def testExpectedErrorHistogramsOfDifferentWidthsMerge():
+    longBlock = makeExpectedErrorBlock(3, 120, 150)
+    shortBlock = makeExpectedErrorBlock(4, 80, 100)
+    longHistogram = fastqAnalysis.ExpectedErrorHistogram()
+    longHistogram.addBlock(longBlock)
+    shortHistogram = fastqAnalysis.ExpectedErrorHistogram()
+    shortHistogram.addBlock(shortBlock)
+    bothHistogram = fastqAnalysis.ExpectedErrorHistogram()
+    bothHistogram.addBlock(longBlock)
+    bothHistogram.addBlock(shortBlock)
+    for mergedHistogram in [
+        longHistogram + shortHistogram,
+        shortHistogram + longHistogram,
+        fastqAnalysis.combineExpectedErrorHistograms([shortHistogram, longHistogram]),
+    ]:
+        assert mergedHistogram.readCount == 200
+        assert numpy.array_equal(mergedHistogram.counts, bothHistogram.counts)
+    assert shortHistogram.positionCount == 100
+    shortHistogram.extendPositions(150)
+    assert numpy.array_equal(shortHistogram.counts.sum(axis=1), numpy.full(150, 80))
+    assert numpy.array_equal(shortHistogram.counts[100:, -1], numpy.full(50, 80))
+    shortHistogram.extendPositions(120)
+    assert shortHistogram.positionCount == 150
+
+
+def testCombinedExpectedErrorHistogramMatchesTheExpectedErrorMatrix(tmp_path):
+    randomState = numpy.random.RandomState(5)
+    fastqs = []
+    for sample, readCount in enumerate([250, 150]):
+        path = str(tmp_path / ("sample%s.fastq" % sample))
+        syntheticFastq.writeFastq(
+            path, syntheticFastq.makeRandomReads(randomState, readCount, 140)
+        )
+        fastqs.append(fileNamingStandards.ManualNamingStandard(path, "test", sample, 1))
+    histogram = expectedErrorCurve.makeCombinedExpectedErrorHistogramForFastqList(
+        fastqs, primerLength=10
+    )
+    expectedErrorMatrix = numpy.concatenate(
+        [
+            fastqAnalysis.buildExpectedErrorMatrix(fastq.filePath, leftTrim=10)
+            for fastq in fastqs
+        ]
+    ).astype("float64")
+    assert histogram.readCount == 400
+    for percentile in [50, 83]:
+        percentiles = histogram.calculatePercentiles(percentile)
+        assert len(percentiles) == 130
+        # the matrix holds float16 values
+        assertWithinOneBinAbove(
+            percentiles,
+            findHigherPercentiles(expectedErrorMatrix, percentile),
+            tolerance=2e-3,
+        )
+
+
+def testExpectedErrorCurvesFitReadsOfMixedLengths(tmp_path):
+    path = str(tmp_path / "sample0.fastq")
+    writeVariableLengthReads(path, 6, 600)
+    fastqs = [fileNamingStandards.ManualNamingStandard(path, "test", 0, 1)]
+    histogram = expectedErrorCurve.makeCombinedExpectedErrorHistogramForFastqList(
+        fastqs
+    )
+    percentiles = histogram.calculatePercentiles(90)
+    assert 40 < len(percentiles) < 120
+    assert numpy.all(numpy.isfinite(percentiles))
+    curves = (
+        expectedErrorCurve.calculateExpectedErrorCurvesForOneDirectionAtPercentiles(
+            fastqs, percentiles=[50, 90]
+        )
+    )
+    assert len(curves) == 2
+    assert curves[0].calculateValue(100) < curves[1].calculateValue(100)
+
+
+def testQualityScoreHistogramMatchesNumpyAtEveryPosition(tmp_path):
+    firstPath = str(tmp_path / "first.fastq")
+    secondPath = str(tmp_path / "second.fastq")
+    reads = writeVariableLengthReads(firstPath, 7, 300)
+    reads += writeVariableLengthReads(secondPath, 8, 200)
+    leftTrim = 3
+    histogram = fastqAnalysis.buildQualityScoreHistogram(
+        firstPath, leftTrim=leftTrim
+    ) + fastqAnalysis.buildQualityScoreHistogram(secondPath, leftTrim=leftTrim)
+    assert histogram.positionCount == 120 - leftTrim
+    expectedMeans = []
+    expectedPercentiles = {percentile: [] for percentile in (10, 25, 50, 75, 90)}
+    for position in range(histogram.positionCount):
+        scores = numpy.array(
+            [
+                qualities[position + leftTrim]
+                for sequence, qualities in reads
+                if len(qualities) > position + leftTrim
+            ]
+        )
+        assert histogram.readCounts[position] == len(scores)
+        assert numpy.array_equal(
+            histogram.counts[position],
+            numpy.bincount(scores, minlength=histogram.scoreCount),
+        )
+        expectedMeans.append(scores.mean())
+        for percentile in expectedPercentiles:
+            expectedPercentiles[percentile].append(
+                findHigherPercentiles(scores, percentile)
+            )
+    # short reads make the read count vary along the read
+    assert len(set(histogram.readCounts.tolist())) > 10
+    assert numpy.allclose(histogram.calculateMeans(), expectedMeans)
+    for percentile, expected in expectedPercentiles.items():
+        assert list(histogram.calculatePercentiles(percentile)) == expected
+    reportLines = histogram.makeReport(leftTrim).splitlines()
+    assert reportLines[0].split("\t")[:8] == [
+        "position",
+        "reads",
+        "mean",
+        "10th",
+        "25th",
+        "median",
+        "75th",
+        "90th",
+    ]
+    assert len(reportLines) == histogram.positionCount + 1
+    for position, line in enumerate(reportLines[1:]):
+        values = line.split("\t")
+        assert int(values[0]) == position + leftTrim + 1
+        assert int(values[1]) == histogram.readCounts[position]
+        assert float(values[2]) == round(expectedMeans[position], 2)
+        assert [int(value) for value in values[3:8]] == [
+            expectedPercentiles[percentile][position]
+            for percentile in (10, 25, 50, 75, 90)
+        ]
+        assert [int(value) for value in values[8:]] == list(histogram.counts[position])
+
+
+def testStreamedCutoffAndAverageMatchTheFullMatrix(tmp_path):
+    path = str(tmp_path / "reads.fastq")
+    reads = syntheticFastq.makeRandomReads(numpy.random.RandomState(9), 400, 130)
+    syntheticFastq.writeFastq(path, reads)
+    qualityMatrix = numpy.array([qualities for sequence, qualities in reads])
+    # the histogram gives whole scores, so compare with the "higher" percentile of each column
+    for phredScore, percentile in [(10, 10), (20, 25), (30, 50), (2, 10), (41, 90)]:
+        belowCutoff = numpy.flatnonzero(
+            findHigherPercentiles(qualityMatrix, percentile) < phredScore
+        )
+        if belowCutoff.size:
+            expectedCutoff = belowCutoff[0]
+        else:
+            expectedCutoff = qualityMatrix.shape[1]
+        assert fastqAnalysis.findCutoffByPercentile(path, phredScore, percentile) == (
+            expectedCutoff
+        )
+    qualityStrings = [
+        "".join([chr(quality + 33) for quality in qualities])
+        for sequence, qualities in reads
+    ]
+    for leftTrim in [0, 4]:
+        expectedErrorMatrix = numpy.array(
+            [
+                qualityScoreHandler.cumulativeExpectedErrorArray(
+                    qualityString[leftTrim:]
+                )
+                for qualityString in qualityStrings
+            ]
+        )
+        assert numpy.allclose(
+            fastqAnalysis.makeAverageExpectedErrorLine(path, leftTrim=leftTrim),
+            expectedErrorMatrix.mean(axis=0),
+        )
+
+
+def testStreamedAverageUsesTheReadsReachingEachPosition(tmp_path):
+    path = str(tmp_path / "reads.fastq")
+    reads = writeVariableLengthReads(path, 10)
+    averages = fastqAnalysis.makeAverageExpectedErrorLine(path)
+    assert len(averages) == 120
+    for position in [0, 39, 60, 119]:
+        expectedErrors = [
+            qualityScoreHandler.cumulativeExpectedErrorArray(
+                "".join([chr(quality + 33) for quality in qualities])
+            )[position]
+            for sequence, qualities in reads
+            if len(qualities) > position
+        ]
+        assert averages[position] == pytest.approx(numpy.mean(expectedErrors))
+
+
+def testBaseCompositionAccumulatorCountsCalledBasesOfEachRead(tmp_path):
+    firstPath = str(tmp_path / "first.fastq")
+    secondPath = str(tmp_path / "second.fastq")
+    reads = writeVariableLengthReads(firstPath, 11, 300)
+    reads += writeVariableLengthReads(secondPath, 12, 200)
+    accumulators = []
+    for path in [firstPath, secondPath]:
+        accumulator = fastqAnalysis.BaseCompositionAccumulator()
+        for block in fastqHandler.FastqFile(path, depth=0).readBlocks(blockSize=64):
+            accumulator.addBlock(block)
+        accumulators.append(accumulator)
+    accumulator = fastqAnalysis.combineBlockAccumulators(accumulators)
+    assert accumulator.positionCount == 120
+    for position in range(120):
+        bases = [
+            sequence[position]
+            for sequence, qualities in reads
+            if len(sequence) > position
+        ]
+        assert accumulator.positionCounts[position].tolist() == [
+            bases.count(base) for base in fastqHandler.compositionBases
+        ]
+    expectedGCPercentCounts = numpy.zeros(101, dtype="int64")
+    for sequence, qualities in reads:
+        calledBases = len(sequence) - sequence.count("N")
+        gcBases = sequence.count("G") + sequence.count("C")
+        expectedGCPercentCounts[int(round(gcBases / calledBases * 100))] += 1
+    assert numpy.array_equal(accumulator.gcPercentCounts, expectedGCPercentCounts)
+    positionLines = accumulator.makePositionReport().splitlines()
+    assert positionLines[0].split("\t") == ["position", "A", "C", "G", "T", "N", "GC"]
+    for position, line in enumerate(positionLines[1:]):
+        a, c, g, t, n = accumulator.positionCounts[position].tolist()
+        assert float(line.split("\t")[-1]) == round((g + c) / (a + c + g + t), 4)
+    gcContentLines = accumulator.makeGCContentReport().splitlines()
+    assert len(gcContentLines) == 102
+    assert sum(int(line.split("\t")[1]) for line in gcContentLines[1:]) == len(reads)
+
+
+def writeReadsWithSharedPrefixes(path: str, seed: int, readCount: int):
+    """
+    Writes reads whose first 20 bases come from a pool of 300 prefixes, with random bases after that and about one read in ten cut short.
+    """
+    randomState = numpy.random.RandomState(seed)
+    prefixPool = syntheticFastq.makeRandomReads(randomState, 300, 20)
+    reads = []
+    for sequence, qualities in syntheticFastq.makeRandomReads(
+        randomState, readCount, 60
+    ):
+        prefix = prefixPool[randomState.randint(0, 300)][0]
+        length = 60 if randomState.random_sample() > 0.1 else 35
+        reads.append(((prefix + sequence[20:])[:length], qualities[:length]))
+    syntheticFastq.writeFastq(path, reads)
+    return reads
+
+
+def sketchFile(path: str):
+    sketch = fastqAnalysis.UniqueSequenceSketch()
+    fastq = fastqHandler.FastqFile(path, depth=0)
+    for block in fastq.readBlocks(1000):
+        sketch.addBlock(block, fastq.qualityScoreScheme)
+    fastq.close()
+    return sketch
+
+
+def testUniqueSequenceSketchEstimatesTheDistinctPrefixCount(tmp_path):
+    path = str(tmp_path / "reads.fastq")
+    reads = writeReadsWithSharedPrefixes(path, 0, 20000)
+    sketch = sketchFile(path)
+    assert list(sketch.prefixLengths) == [10, 20, 30, 40, 50, 60]
+    estimates = sketch.estimateUniqueCounts()
+    for row, prefixLength in enumerate(sketch.prefixLengths):
+        prefixes = set(
+            [
+                sequence[:prefixLength]
+                for sequence, qualities in reads
+                if len(sequence) >= prefixLength
+            ]
+        )
+        assert sketch.readCounts[row] == len(
+            [sequence for sequence, qualities in reads if len(sequence) >= prefixLength]
+        )
+        # the standard error at precision 12 is about 1.6%
+        assert abs(estimates[row] - len(prefixes)) <= 0.05 * len(prefixes)
+    assert list(sketch.estimateUniqueCountsAtLengths([19, 21, 200])) == [
+        int(round(estimates[1])),
+        int(round(estimates[1])),
+        int(round(estimates[5])),
+    ]
+
+
+def testMergedUniqueSequenceSketchesMatchOneSketchOfBothFiles(tmp_path):
+    firstPath = str(tmp_path / "first.fastq")
+    secondPath = str(tmp_path / "second.fastq")
+    bothPath = str(tmp_path / "both.fastq")
+    firstReads = writeReadsWithSharedPrefixes(firstPath, 1, 3000)
+    secondReads = writeReadsWithSharedPrefixes(secondPath, 2, 2000)
+    syntheticFastq.writeFastq(bothPath, firstReads + secondReads)
+    mergedSketch = sketchFile(firstPath) + sketchFile(secondPath)
+    bothSketch = sketchFile(bothPath)
+    assert numpy.array_equal(mergedSketch.registers, bothSketch.registers)
+    assert numpy.array_equal(mergedSketch.readCounts, bothSketch.readCounts)
+    with pytest.raises(ValueError):
+        mergedSketch.merge(fastqAnalysis.UniqueSequenceSketch(precision=10))
+
+
+def makePrimedReadBlock(seed: int, primer: str, readCount: int = 500):
+    """
+    :param primer: sequence every read starts with, where R is a 2-fold degenerate A or G base
+    """
+    randomState = numpy.random.RandomState(seed)
+    sequences = []
+    for sequence, qualities in syntheticFastq.makeRandomReads(
+        randomState, readCount, 100, nRate=0.01
+    ):
+        primerBases = [
+            randomState.choice(["A", "G"]) if base == "R" else base for base in primer
+        ]
+        sequences.append("".join(primerBases) + sequence[len(primer) :])
+    # some short reads, which k-mers running past their end are not counted for
+    sequences[::9] = [sequence[:30] for sequence in sequences[::9]]
+    return fastqHandler.FastqReadBlock(
+        sequences, ["I" * len(sequence) for sequence in sequences]
+    )
+
+
+def testKmerEntropiesMatchCountingEveryKmer():
+    block = makePrimedReadBlock(13, "GTGCCAGCMGCCGCGGTAA".replace("M", "R"))
+    sequences = [
+        bytes(row[:length]).decode()
+        for row, length in zip(block.sequences, block.readLengths)
+    ]
+    for kmerLength, searchLength in [(4, 40), (1, 25), (3, 60)]:
+        entropies = fastqAnalysis.calculateKmerEntropies(
+            block, kmerLength, searchLength
+        )
+        assert len(entropies) == min(searchLength, 100) - kmerLength + 1
+        for start, entropy in enumerate(entropies):
+            kmers = [
+                sequence[start : start + kmerLength]
+                for sequence in sequences
+                if len(sequence) >= start + kmerLength
+                and "N" not in sequence[start : start + kmerLength]
+            ]
+            frequencies = numpy.array([kmers.count(kmer) for kmer in set(kmers)]) / len(
+                kmers
+            )
+            assert entropy == pytest.approx(
+                -(frequencies * numpy.log2(frequencies)).sum(), abs=1e-9
+            )
+
+
+def testConservedPrefixLengthFindsTheEndOfThePrimer():
+    primer = "GTGYCAGCMGCCGCGGTAA".replace("Y", "R").replace("M", "R")
+    assert fastqAnalysis.estimateConservedPrefixLength(
+        makePrimedReadBlock(14, primer)
+    ) == len(primer)
+    assert (
+        fastqAnalysis.estimateConservedPrefixLength(
+            makePrimedReadBlock(15, "ACGTACGTAC")
+        )
+        == 10
+    )
+    assert fastqAnalysis.estimateConservedPrefixLength(makePrimedReadBlock(16, "")) == 0
+    assert (
+        fastqAnalysis.estimateConservedPrefixLength(makePrimedReadBlock(17, "A" * 50))
+        == fastqAnalysis.primerCheckSearchLength
+    )
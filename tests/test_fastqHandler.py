@@ -0,0 +1,230 @@
+import gzip
+
+import numpy
+import pytest
+
+from figaro import fastqHandler
+from figaro import qualityScoreHandler
+from figaro import readPairOverlap
+
+import syntheticFastq
+
+
+def testEstimateReadCount(tmp_path):
+    reads = syntheticFastq.makeRandomReads(numpy.random.RandomState(0), 2000, 150)
+    plainPath = str(tmp_path / "reads.fastq")
+    syntheticFastq.writeFastq(plainPath, reads)
+    assert abs(fastqHandler.estimateReadCount(plainPath) - 2000) < 50
+    gzippedPath = str(tmp_path / "reads.fastq.gz")
+    syntheticFastq.writeFastq(gzippedPath, reads, gzipped=True)
+    assert fastqHandler.estimateReadCount(gzippedPath) > 0
+
+
+def testSpreadSubsampleReachesTheEndOfTheFile(tmp_path):
+    reads = syntheticFastq.makeRandomReads(numpy.random.RandomState(1), 1000, 100)
+    path = str(tmp_path / "reads.fastq")
+    syntheticFastq.writeFastq(path, reads)
+    assert fastqHandler.findSpreadSubsample(path, 0, 3) == 3
+    assert fastqHandler.findSpreadSubsample(path, 5000) == 1
+    assert fastqHandler.findSpreadSubsample(path, 100) == 10
+    assert fastqHandler.findSpreadSubsample(path, 100, 3) == 9
+    fastq = fastqHandler.FastqFile(
+        path, subsample=fastqHandler.findSpreadSubsample(path, 100)
+    )
+    block = fastq.getNextReadBlock(100)
+    fastq.close()
+    assert len(block) == 100
+    assert bytes(block.sequences[-1]).decode() == reads[990][0]
+
+
+def testReadPairSampleIsSpreadAcrossTheFiles(tmp_path):
+    randomState = numpy.random.RandomState(2)
+    forwardReads = syntheticFastq.makeRandomReads(randomState, 1000, 100)
+    reverseReads = syntheticFastq.makeRandomReads(randomState, 1000, 90)
+    forwardPath = str(tmp_path / "sample_R1.fastq")
+    reversePath = str(tmp_path / "sample_R2.fastq")
+    syntheticFastq.writeFastq(forwardPath, forwardReads)
+    syntheticFastq.writeFastq(reversePath, reverseReads)
+    readPairSample = readPairOverlap.readPairSampleFromFiles(
+        forwardPath, reversePath, 50, forwardPrimerLength=5, reversePrimerLength=4
+    )
+    assert readPairSample.pairCount == 50
+    keptReads = numpy.arange(0, 1000, 20)
+    expectedForward = fastqHandler.baseCodeTable[
+        fastqHandler.stringListToByteMatrix(
+            [forwardReads[read][0][5:] for read in keptReads]
+        )
+    ]
+    expectedReverse = fastqHandler.baseCodeTable[
+        fastqHandler.stringListToByteMatrix(
+            [reverseReads[read][0][4:] for read in keptReads]
+        )
+    ]
+    assert numpy.array_equal(readPairSample.forwardCodes, expectedForward)
+    assert numpy.array_equal(readPairSample.reverseCodes, expectedReverse)
+
+
+def testReencodedFilesMatchTheConversionTable(tmp_path):
+    randomState = numpy.random.RandomState(4)
+    illumina = qualityScoreHandler.encodingSchemes.illumina
+    for inputScheme in [
+        qualityScoreHandler.encodingSchemes.solexa,
+        qualityScoreHandler.encodingSchemes.illumina1_5,
+    ]:
+        lines = []
+        for read in range(25):
+            readLength = randomState.randint(30, 90)
+            lines.append("@read%s" % read)
+            lines.append("".join(randomState.choice(list("ACGTN"), readLength)))
+            lines.append("+")
+            lines.append(
+                "".join(randomState.choice(inputScheme.characterSet, readLength))
+            )
+        inputPath = str(tmp_path / "input.fastq")
+        with open(inputPath, "w") as inputFile:
+            inputFile.write("\n".join(lines) + "\n")
+        conversionTable = qualityScoreHandler.makeConversionTable(inputScheme, illumina)
+        for outputPath in [
+            str(tmp_path / "output.fastq"),
+            str(tmp_path / "output.fastq.gz"),
+        ]:
+            assert (
+                fastqHandler.reencodeFastqFile(
+                    inputPath, outputPath, illumina, inputScheme, blockSize=7
+                )
+                == 25
+            )
+            if outputPath.endswith(".gz"):
+                with gzip.open(outputPath, "rb") as outputFile:
+                    outputLines = outputFile.read().decode().splitlines()
+            else:
+                with open(outputPath, "rb") as outputFile:
+                    outputLines = outputFile.read().decode().splitlines()
+            assert len(outputLines) == len(lines)
+            for lineNumber, (line, outputLine) in enumerate(zip(lines, outputLines)):
+                if lineNumber % 4 == 3:
+                    assert (
+                        outputLine == line.encode().translate(conversionTable).decode()
+                    )
+                    assert all(
+                        character in illumina.characterSet for character in outputLine
+                    )
+                else:
+                    assert outputLine == line
+        if inputScheme.fromPErrorFormula == illumina.fromPErrorFormula:
+            roundTripPath = str(tmp_path / "roundTrip.fastq")
+            fastqHandler.reencodeFastqFile(
+                str(tmp_path / "output.fastq"), roundTripPath, inputScheme, illumina
+            )
+            with open(roundTripPath) as roundTripFile:
+                assert roundTripFile.read().splitlines() == lines
+
+
+def findFirstPositionByScan(values: str, isHit):
+    for position, value in enumerate(values):
+        if isHit(value):
+            return position
+    return len(values)
+
+
+def makeFirstPositionTestBlock():
+    randomState = numpy.random.RandomState(5)
+    sequences = []
+    qualityStrings = []
+    for read in range(60):
+        readLength = randomState.randint(1, 80)
+        sequence = list(randomState.choice(list("ACGT"), readLength))
+        qualities = randomState.randint(2, 41, readLength)
+        if read % 5 == 1:
+            sequence[0] = "N"
+        elif read % 5 == 2:
+            sequence[randomState.randint(readLength)] = randomState.choice(list("Nn."))
+        if read % 3 == 0:
+            qualities = numpy.maximum(qualities, 21)
+        sequences.append("".join(sequence))
+        qualityStrings.append("".join([chr(quality + 33) for quality in qualities]))
+    # a read with no N or low quality base that is shorter than the block, followed by padding bytes
+    sequences.append("ACGT")
+    qualityStrings.append("IIII")
+    return fastqHandler.FastqReadBlock(sequences, qualityStrings)
+
+
+def testFirstNBaseAndLowQualityPositionsMatchAPerReadScan():
+    block = makeFirstPositionTestBlock()
+    illumina = qualityScoreHandler.encodingSchemes.illumina
+    sequences = [
+        bytes(row[:length]).decode()
+        for row, length in zip(block.sequences, block.readLengths)
+    ]
+    qualityStrings = [
+        bytes(row[:length]).decode()
+        for row, length in zip(block.qualities, block.readLengths)
+    ]
+    assert block.sequences.shape[1] > len(sequences[-1])
+    assert any(sequence.startswith("N") for sequence in sequences)
+    assert not all("N" in sequence for sequence in sequences)
+    for lowQualityScore in [2, 11, 20]:
+        firstNBasePositions, firstLowQualityPositions = (
+            fastqHandler.findFirstNBaseAndLowQualityPositions(
+                block, illumina, lowQualityScore
+            )
+        )
+        assert list(firstNBasePositions) == [
+            findFirstPositionByScan(sequence, lambda base: base in "Nn.")
+            for sequence in sequences
+        ]
+        expectedLowQualityPositions = [
+            findFirstPositionByScan(
+                qualityString,
+                lambda character: ord(character) - 33 <= lowQualityScore,
+            )
+            for qualityString in qualityStrings
+        ]
+        assert list(firstLowQualityPositions) == expectedLowQualityPositions
+        assert expectedLowQualityPositions[-1] == 4
+    scores = [2, 11, 20]
+    firstLowQualityPositionsForScores = (
+        fastqHandler.findFirstLowQualityPositionsForScores(block, illumina, scores)
+    )
+    for row, lowQualityScore in enumerate(scores):
+        assert list(firstLowQualityPositionsForScores[row]) == [
+            findFirstPositionByScan(
+                qualityString,
+                lambda character: ord(character) - 33 <= lowQualityScore,
+            )
+            for qualityString in qualityStrings
+        ]
+
+
+def testBlockBaseCompositionLeavesOutPaddingAndNBases():
+    sequences = ["ACGTNacgtn..", "GGCC", "NNNN", "ATAT", "GCGCNNNNNN"]
+    block = fastqHandler.FastqReadBlock(
+        sequences, ["I" * len(sequence) for sequence in sequences]
+    )
+    perReadCounts, perPositionCounts = fastqHandler.countBlockBaseComposition(block)
+    assert perReadCounts.tolist() == [
+        [2, 2, 2, 2, 4],
+        [0, 2, 2, 0, 0],
+        [0, 0, 0, 0, 4],
+        [2, 0, 0, 2, 0],
+        [0, 2, 2, 0, 6],
+    ]
+    assert perPositionCounts.shape == (12, 5)
+    # padding bytes past the end of the short reads are not counted as any base
+    assert perPositionCounts.sum(axis=1).tolist() == [
+        sum([len(sequence) > position for sequence in sequences])
+        for position in range(12)
+    ]
+    assert perPositionCounts[11].tolist() == [0, 0, 0, 0, 1]
+    # GC is a fraction of the called bases only, and 0 when there are none
+    assert fastqHandler.calculateGCContentFromCounts(perReadCounts).tolist() == [
+        0.5,
+        1.0,
+        0.0,
+        0.0,
+        1.0,
+    ]
+    for row, sequence in enumerate(sequences):
+        assert fastqHandler.calculateGCContentFromCounts(
+            perReadCounts[row]
+        ) == pytest.approx(fastqHandler.SequenceLine(sequence, True).gcContent)
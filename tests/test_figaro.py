@@ -0,0 +1,69 @@
+import pytest
+
+from figaro import figaro
+
+from test_trimParameterPrediction import writeSyntheticRun
+
+
+def testSingleEndAnalysisReportsTheTopResults(tmp_path):
+    writeSyntheticRun(tmp_path)
+    resultTable, curve = figaro.runAnalysis(
+        str(tmp_path),
+        0,
+        0,
+        0,
+        fileNamingStandard="nononsense",
+        subsample=1,
+        singleEnd=True,
+        minimumReadLength=30,
+        topResultCount=3,
+    )
+    assert len(resultTable) == 3
+    assert resultTable[0].score >= resultTable[1].score >= resultTable[2].score
+
+
+def testSingleEndAnalysisRejectsPairedReadOptions(tmp_path):
+    with pytest.raises(ValueError, match="fullGridSearch, truncQ"):
+        figaro.runAnalysis(
+            str(tmp_path),
+            0,
+            0,
+            0,
+            singleEnd=True,
+            minimumReadLength=30,
+            fullGridSearch=True,
+            truncQ=[2],
+        )
+
+
+def testRunAnalysisGathersReports(tmp_path):
+    writeSyntheticRun(tmp_path)
+    reports = {}
+    resultTable, forwardCurve, reverseCurve = figaro.runAnalysis(
+        str(tmp_path),
+        60,
+        0,
+        0,
+        fileNamingStandard="nononsense",
+        subsample=1,
+        topResultCount=5,
+        qualityReport=True,
+        estimateUniqueSequences=True,
+        estimateMergeRate=True,
+        paretoFront=True,
+        influenceReport=True,
+        sampleRetentionReport=True,
+        reports=reports,
+    )
+    assert len(resultTable) == 5
+    assert resultTable[0].mergeRate is not None
+    assert resultTable[0].uniqueSequenceEstimates is not None
+    for reportFileName in (
+        "forwardQualityDistribution.tsv",
+        "reverseQualityDistribution.tsv",
+        "sampleUniqueSequences.tsv",
+        "trimParameterParetoFront.json",
+        "sampleInfluence.tsv",
+        "sampleRetention.tsv",
+    ):
+        assert reports[reportFileName]
@@ -0,0 +1,98 @@
+import numpy
+import pytest
+
+from figaro import qualityScoreHandler
+
+import syntheticFastq
+
+
+def passesAtFixedPoint(expectedErrors, maxExpectedError):
+    return qualityScoreHandler.expectedErrorToFixedPoint(
+        expectedErrors
+    ) <= qualityScoreHandler.maxExpectedErrorToFixedPoint(maxExpectedError)
+
+
+def testFixedPointMatchesTheMaxExpectedErrorTestAtWholeNumbers():
+    randomState = numpy.random.RandomState(0)
+    expectedErrors = numpy.concatenate(
+        [
+            randomState.uniform(0, 12, 100000),
+            numpy.arange(0, 12.01, 0.5),
+            numpy.arange(0, 12.01, 1 / 256),
+            numpy.nextafter(numpy.arange(1, 12.0), numpy.inf),
+            numpy.nextafter(numpy.arange(1, 12.0), -numpy.inf),
+        ]
+    )
+    for maxExpectedError in [0.5, 1, 2, 3, 5, 8, 11, 2 + 3 / 256]:
+        assert numpy.array_equal(
+            passesAtFixedPoint(expectedErrors, maxExpectedError),
+            expectedErrors <= maxExpectedError,
+        )
+
+
+def testFixedPointNeverPassesAReadOverAnyLimit():
+    randomState = numpy.random.RandomState(1)
+    expectedErrors = randomState.uniform(0, 4, 100000)
+    for maxExpectedError in [0.1, 0.3, 1.7, 2.05, 3.999]:
+        passing = passesAtFixedPoint(expectedErrors, maxExpectedError)
+        assert not numpy.any(passing & (expectedErrors > maxExpectedError))
+        assert numpy.all(passing[expectedErrors <= maxExpectedError - 1 / 256])
+
+
+def testFixedPointSaturatesAndSaturatedValuesNeverPass():
+    fixedPoint = qualityScoreHandler.expectedErrorToFixedPoint(
+        numpy.array([255.9, 256, 300, 1e9, numpy.inf])
+    )
+    assert fixedPoint.dtype == numpy.uint16
+    assert fixedPoint[0] < qualityScoreHandler.expectedErrorFixedPointMax
+    assert numpy.all(fixedPoint[1:] == qualityScoreHandler.expectedErrorFixedPointMax)
+    assert not numpy.any(passesAtFixedPoint(numpy.array([300, 1e9]), 1000))
+
+
+def testBlockExpectedErrorMatchesThePerReadCalculation():
+    reads = syntheticFastq.makeRandomReads(numpy.random.RandomState(2), 50, 120)
+    qualityStrings = [
+        "".join([chr(quality + 33) for quality in qualities])
+        for sequence, qualities in reads
+    ]
+    qualityBlock = numpy.array(
+        [qualityScoreHandler.qualityStringToByteArray(text) for text in qualityStrings]
+    )
+    block = qualityScoreHandler.cumulativeExpectedErrorBlock(qualityBlock)
+    for row, text in enumerate(qualityStrings):
+        assert numpy.allclose(
+            block[row],
+            qualityScoreHandler.cumulativeExpectedErrorArrayDada2Exact(text),
+            rtol=1e-12,
+        )
+
+
+def testErrorTablesMatchToPErrorForEveryEncoding():
+    randomState = numpy.random.RandomState(3)
+    for encoding in qualityScoreHandler.makeEncodingTable():
+        for character in encoding.characterSet:
+            assert encoding.pErrorTable[ord(character)] == pytest.approx(
+                encoding.toPError(character), rel=1e-12
+            )
+        qualityStrings = [
+            "".join(randomState.choice(encoding.characterSet, 80)) for read in range(20)
+        ]
+        qualityBlock = numpy.array(
+            [
+                qualityScoreHandler.qualityStringToByteArray(text)
+                for text in qualityStrings
+            ]
+        )
+        block = qualityScoreHandler.cumulativeExpectedErrorBlock(qualityBlock, encoding)
+        for row, text in enumerate(qualityStrings):
+            runningSum = []
+            cumulativeExpectedError = 0.0
+            for character in text:
+                cumulativeExpectedError += encoding.toPError(character)
+                runningSum.append(cumulativeExpectedError)
+            assert numpy.allclose(block[row], runningSum, rtol=1e-12)
+            expectedErrors = qualityScoreHandler.cumulativeExpectedErrorArray(
+                text, encoding
+            )
+            assert isinstance(expectedErrors, list)
+            assert expectedErrors == pytest.approx(runningSum, rel=1e-12)
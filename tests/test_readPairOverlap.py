@@ -0,0 +1,161 @@
+import numpy
+
+from figaro import readPairOverlap
+
+
+def makeSyntheticReadPairSample(
+    randomState: numpy.random.RandomState,
+    ampliconLengths: numpy.ndarray,
+    forwardLengths: numpy.ndarray,
+    reverseLengths: numpy.ndarray,
+    errorRate: float = 0.02,
+    nRate: float = 0.01,
+):
+    """
+    Reads both ends of random amplicons, adding substitutions and N bases, and pads the reads the way a read block does.
+    """
+    paddingCode = 5
+    forwardWidth = int(forwardLengths.max())
+    reverseWidth = int(reverseLengths.max())
+    forwardCodes = numpy.full(
+        (len(ampliconLengths), forwardWidth), paddingCode, "uint8"
+    )
+    reverseCodes = numpy.full(
+        (len(ampliconLengths), reverseWidth), paddingCode, "uint8"
+    )
+    for pair, (ampliconLength, forwardLength, reverseLength) in enumerate(
+        zip(ampliconLengths, forwardLengths, reverseLengths)
+    ):
+        # reads can run past the end of the amplicon into sequence that matches neither mate
+        amplicon = randomState.randint(0, 4, ampliconLength)
+        forwardRead = numpy.concatenate(
+            [amplicon, randomState.randint(0, 4, forwardLength)]
+        )[:forwardLength]
+        reverseRead = numpy.concatenate(
+            [3 - amplicon[::-1], randomState.randint(0, 4, reverseLength)]
+        )[:reverseLength]
+        for read in (forwardRead, reverseRead):
+            errors = randomState.random_sample(len(read)) < errorRate
+            read[errors] = (read[errors] + randomState.randint(1, 4, errors.sum())) % 4
+            read[randomState.random_sample(len(read)) < nRate] = 4
+        forwardCodes[pair, :forwardLength] = forwardRead
+        reverseCodes[pair, :reverseLength] = reverseRead
+    return readPairOverlap.ReadPairSample(
+        forwardCodes, reverseCodes, forwardLengths, reverseLengths
+    )
+
+
+def countMergeablePairsByBruteForce(
+    readPairSample: readPairOverlap.ReadPairSample,
+    ampliconLengths: numpy.ndarray,
+    minimumOverlap: int,
+    maxMismatch: int,
+):
+    forwardWidth = readPairSample.forwardCodes.shape[1]
+    reverseWidth = readPairSample.reverseCodes.shape[1]
+    mergeableCounts = numpy.zeros((forwardWidth, reverseWidth), dtype="int64")
+    for pair in range(readPairSample.pairCount):
+        forwardRead = readPairSample.forwardCodes[pair]
+        reverseRead = readPairSample.reverseCodes[pair]
+        ampliconLength = int(ampliconLengths[pair])
+        for forwardLength in range(1, int(readPairSample.forwardLengths[pair]) + 1):
+            for reverseLength in range(1, int(readPairSample.reverseLengths[pair]) + 1):
+                overlap = range(
+                    max(0, ampliconLength - reverseLength),
+                    min(forwardLength, ampliconLength),
+                )
+                if len(overlap) < minimumOverlap:
+                    continue
+                mismatches = 0
+                for position in overlap:
+                    forwardBase = forwardRead[position]
+                    reverseBase = reverseRead[ampliconLength - 1 - position]
+                    if forwardBase < 4 and reverseBase < 4:
+                        mismatches += forwardBase != 3 - reverseBase
+                if mismatches <= maxMismatch:
+                    mergeableCounts[forwardLength - 1, reverseLength - 1] += 1
+    return mergeableCounts
+
+
+def testMergeSurfaceMatchesBruteForce():
+    randomState = numpy.random.RandomState(1)
+    pairCount = 60
+    ampliconLengths = randomState.randint(15, 45, pairCount)
+    readPairSample = makeSyntheticReadPairSample(
+        randomState,
+        ampliconLengths,
+        randomState.randint(20, 31, pairCount),
+        randomState.randint(20, 31, pairCount),
+    )
+    for minimumOverlap, maxMismatch in ((12, 0), (5, 1), (8, 2)):
+        expected = countMergeablePairsByBruteForce(
+            readPairSample, ampliconLengths, minimumOverlap, maxMismatch
+        )
+        for chunkElementLimit in (readPairOverlap.mergeSurfaceChunkElementLimit, 64):
+            readPairOverlap.mergeSurfaceChunkElementLimit = chunkElementLimit
+            try:
+                mergeableCounts = readPairOverlap.countMergeablePairsOnSurface(
+                    readPairSample, ampliconLengths, minimumOverlap, maxMismatch
+                )
+            finally:
+                readPairOverlap.mergeSurfaceChunkElementLimit = 2**22
+            numpy.testing.assert_array_equal(mergeableCounts, expected)
+
+
+def testForwardTrimPastTheAmpliconStillNeedsTheMinimumOverlap():
+    readPairSample = makeSyntheticReadPairSample(
+        numpy.random.RandomState(0),
+        numpy.array([30]),
+        numpy.array([40]),
+        numpy.array([40]),
+        errorRate=0,
+        nRate=0,
+    )
+    mergeableCounts = readPairOverlap.countMergeablePairsOnSurface(
+        readPairSample, numpy.array([30]), minimumOverlap=12
+    )
+    # trims are zero-indexed, so reverse trim 6 keeps 7 bases and overlaps a forward read past the amplicon by only 7
+    assert mergeableCounts[34, 6] == 0
+    assert mergeableCounts[34, 11] == 1
+    assert mergeableCounts[29, 10] == 0
+    assert mergeableCounts[29, 11] == 1
+
+
+def testBestOverlapFindsEachPairsAmpliconLength():
+    randomState = numpy.random.RandomState(3)
+    pairCount = 300
+    ampliconLengths = randomState.randint(160, 260, pairCount)
+    readPairSample = makeSyntheticReadPairSample(
+        randomState,
+        ampliconLengths,
+        numpy.full(pairCount, 150),
+        numpy.full(pairCount, 150),
+        errorRate=0.01,
+    )
+    estimatedAmpliconLengths = readPairOverlap.findBestOverlapAmpliconLengths(
+        readPairSample
+    )
+    assert numpy.mean(estimatedAmpliconLengths == ampliconLengths) > 0.98
+
+
+def testBestOverlapGivesNoLengthWithoutOverlap():
+    randomState = numpy.random.RandomState(4)
+    readPairSample = makeSyntheticReadPairSample(
+        randomState,
+        numpy.full(50, 400),
+        numpy.full(50, 150),
+        numpy.full(50, 150),
+    )
+    estimatedAmpliconLengths = readPairOverlap.findBestOverlapAmpliconLengths(
+        readPairSample
+    )
+    assert not estimatedAmpliconLengths.any()
+    assert readPairOverlap.suggestAmpliconLength(estimatedAmpliconLengths) == 0
+
+
+def testSuggestedAmpliconLengthIsTheHigherPercentile():
+    ampliconLengths = numpy.array([0, 0] + list(range(201, 301)))
+    assert readPairOverlap.suggestAmpliconLength(ampliconLengths) == 300
+    assert readPairOverlap.suggestAmpliconLength(ampliconLengths, 50) == 251
+    assert readPairOverlap.suggestAmpliconLength(ampliconLengths, 0) == 201
+    assert readPairOverlap.suggestAmpliconLength(numpy.array([250])) == 250
@@ -0,0 +1,95 @@
+import numpy
+import pytest
+
+from figaro import retentionBootstrap
+
+
+def makeKeptMatrix(randomState: numpy.random.RandomState, readCount: int):
+    """
+    Makes candidates that keep overlapping sets of reads, the way nearby trim parameter sets do. The last candidate keeps the same reads as the first.
+    """
+    readQuality = randomState.random_sample(readCount)
+    thresholds = numpy.array([0.3, 0.35, 0.5, 0.6])
+    keptMatrix = readQuality[numpy.newaxis, :] > thresholds[:, numpy.newaxis]
+    return numpy.concatenate([keptMatrix, keptMatrix[:1]])
+
+
+def testKeptReadPatternsRebuildTheKeptCounts():
+    randomState = numpy.random.RandomState(0)
+    keptMatrix = makeKeptMatrix(randomState, 1000)
+    readWeights = numpy.repeat([0.5, 2.0], 500)
+    for weights in (None, readWeights):
+        patterns, readCounts, groupWeights = retentionBootstrap.makeKeptReadPatterns(
+            keptMatrix, weights
+        )
+        assert readCounts.sum() == 1000
+        expectedKept = (
+            keptMatrix.sum(axis=1) if weights is None else keptMatrix @ weights
+        )
+        numpy.testing.assert_allclose(
+            patterns @ (readCounts * groupWeights), expectedKept
+        )
+
+
+def testReadBootstrapCentersOnTheObservedRetention():
+    randomState = numpy.random.RandomState(1)
+    keptMatrix = makeKeptMatrix(randomState, 2000)
+    replicateRetentions = retentionBootstrap.bootstrapReadRetention(keptMatrix, 2000)
+    assert replicateRetentions.shape == (2000, 5)
+    numpy.testing.assert_allclose(
+        replicateRetentions.mean(axis=0), keptMatrix.mean(axis=1), atol=0.003
+    )
+    # a binomial proportion's standard error
+    expectedErrors = numpy.sqrt(
+        keptMatrix.mean(axis=1) * (1 - keptMatrix.mean(axis=1)) / 2000
+    )
+    numpy.testing.assert_allclose(
+        replicateRetentions.std(axis=0), expectedErrors, rtol=0.1
+    )
+
+
+def testSampleBootstrapMatchesResamplingSamplesDirectly():
+    randomState = numpy.random.RandomState(2)
+    sampleReadCounts = numpy.array([120, 0, 300, 80, 200])
+    sampleOffsets = numpy.concatenate([[0], numpy.cumsum(sampleReadCounts)[:-1]])
+    keptMatrix = makeKeptMatrix(randomState, sampleReadCounts.sum())
+    replicateCount = 20
+    replicateRetentions = retentionBootstrap.bootstrapSampleRetention(
+        keptMatrix, sampleOffsets, replicateCount, seed=3
+    )
+    sampleDraws = numpy.random.RandomState(3).randint(
+        0, len(sampleReadCounts), size=(replicateCount, len(sampleReadCounts))
+    )
+    for replicate in range(replicateCount):
+        columns = numpy.concatenate(
+            [
+                numpy.arange(
+                    sampleOffsets[sample],
+                    sampleOffsets[sample] + sampleReadCounts[sample],
+                )
+                for sample in sampleDraws[replicate]
+            ]
+        )
+        expected = keptMatrix[:, columns].mean(axis=1) if len(columns) else 0
+        numpy.testing.assert_allclose(replicateRetentions[replicate], expected)
+
+
+def testRankedFirstSplitsTies():
+    replicateRetentions = numpy.array(
+        [
+            [0.90, 0.80, 0.90],
+            [0.70, 0.85, 0.70],
+            [0.90, 0.80, 0.95],
+            [0.90, 0.90, 0.90],
+        ]
+    )
+    lowerBounds, upperBounds, rankedFirstRates = (
+        retentionBootstrap.summarizeRetentionReplicates(
+            replicateRetentions, numpy.zeros(3)
+        )
+    )
+    numpy.testing.assert_allclose(
+        rankedFirstRates, [(0.5 + 1 / 3) / 4, (1 + 1 / 3) / 4, (0.5 + 1 + 1 / 3) / 4]
+    )
+    assert rankedFirstRates.sum() == pytest.approx(1)
+    assert (lowerBounds <= upperBounds).all()
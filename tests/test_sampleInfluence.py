@@ -0,0 +1,175 @@
+import numpy
+import pytest
+
+from figaro import fastqAnalysis
+from figaro import sampleInfluence
+from figaro import trimParameterPrediction
+
+import syntheticFastq
+
+
+def makeSampleCrossings(seed: int, sampleReadCounts: list):
+    randomState = numpy.random.RandomState(seed)
+    readCount = sum(sampleReadCounts)
+    return (
+        randomState.randint(0, 45, readCount),
+        randomState.randint(0, 35, readCount),
+        numpy.array(sampleReadCounts, dtype="int64"),
+    )
+
+
+def testPerSampleSurfacesMatchEachSampleOnItsOwn():
+    forwardCrossings, reverseCrossings, sampleReadCounts = makeSampleCrossings(
+        0, [120, 0, 80, 200, 45]
+    )
+    randomState = numpy.random.RandomState(1)
+    forwardTrimPositions = randomState.randint(0, 40, 30)
+    reverseTrimPositions = randomState.randint(0, 30, 30)
+    sampleOffsets = numpy.concatenate([[0], numpy.cumsum(sampleReadCounts)])
+    # a small limit makes the samples go through in several chunks
+    for chunkElementLimit in [sampleInfluence.surfaceChunkElementLimit, 2000]:
+        keptReadCounts = sampleInfluence.countKeptReadsBySampleOnSurfaces(
+            forwardCrossings,
+            reverseCrossings,
+            sampleReadCounts,
+            forwardTrimPositions,
+            reverseTrimPositions,
+            chunkElementLimit,
+        )
+        for sample in range(len(sampleReadCounts)):
+            reads = slice(sampleOffsets[sample], sampleOffsets[sample + 1])
+            surface = trimParameterPrediction.calculateRetentionSurface(
+                forwardCrossings[reads], reverseCrossings[reads], 40, 30
+            )
+            assert list(keptReadCounts[sample]) == list(
+                surface[forwardTrimPositions, reverseTrimPositions]
+            )
+
+
+def testLeaveOneOutBySubtractionMatchesRecounting():
+    forwardCrossings, reverseCrossings, sampleReadCounts = makeSampleCrossings(
+        2, [150, 60, 0, 300]
+    )
+    randomState = numpy.random.RandomState(3)
+    forwardTrimPositions = randomState.randint(0, 40, 20)
+    reverseTrimPositions = randomState.randint(0, 30, 20)
+    forwardMaxExpectedErrors = randomState.randint(1, 5, 20)
+    reverseMaxExpectedErrors = randomState.randint(1, 5, 20)
+    scorePenalties = -trimParameterPrediction.calculateTrimParameterScore(
+        0, forwardMaxExpectedErrors, reverseMaxExpectedErrors
+    )
+    sampleKeptCounts = sampleInfluence.countKeptReadsBySampleOnSurfaces(
+        forwardCrossings,
+        reverseCrossings,
+        sampleReadCounts,
+        forwardTrimPositions,
+        reverseTrimPositions,
+    )
+    leaveOneOutScores = sampleInfluence.calculateLeaveOneOutScores(
+        sampleKeptCounts,
+        sampleReadCounts,
+        sampleKeptCounts.sum(axis=0),
+        scorePenalties,
+    )
+    sampleIndices = numpy.repeat(numpy.arange(len(sampleReadCounts)), sampleReadCounts)
+    for leftOutSample in range(len(sampleReadCounts)):
+        remaining = sampleIndices != leftOutSample
+        surface = trimParameterPrediction.calculateRetentionSurface(
+            forwardCrossings[remaining], reverseCrossings[remaining], 40, 30
+        )
+        expectedScores = trimParameterPrediction.calculateTrimParameterScore(
+            surface[forwardTrimPositions, reverseTrimPositions]
+            / numpy.count_nonzero(remaining),
+            forwardMaxExpectedErrors,
+            reverseMaxExpectedErrors,
+        )
+        assert leaveOneOutScores[leftOutSample] == pytest.approx(expectedScores)
+
+
+def testInfluenceReportRowsMatchTheLeaveOneOutScores(tmp_path):
+    randomState = numpy.random.RandomState(4)
+    sampleReadCounts = numpy.array([200, 120, 60])
+    sampleNames = ["sample%s" % sample for sample in range(len(sampleReadCounts))]
+    crossingTables = []
+    for readLength in (60, 50):
+        tables = []
+        for sample, readCount in enumerate(sampleReadCounts):
+            path = str(tmp_path / ("sample%s_%s.fastq" % (sample, readLength)))
+            syntheticFastq.writeFastq(
+                path,
+                syntheticFastq.makeRandomReads(
+                    randomState, readCount, readLength, nRate=0.002
+                ),
+            )
+            tables.append(
+                fastqAnalysis.buildExpectedErrorCrossingTable(
+                    path, 4, limitToFirstFailures=True
+                )
+            )
+        crossingTables.append(fastqAnalysis.combineCrossingTables(tables))
+    forwardCrossingTable, reverseCrossingTable = crossingTables
+    candidateCount = 40
+    forwardTrimPositions = randomState.randint(20, 61, candidateCount)
+    reverseTrimPositions = randomState.randint(20, 51, candidateCount)
+    forwardMaxExpectedErrors = randomState.randint(1, 5, candidateCount)
+    reverseMaxExpectedErrors = randomState.randint(1, 5, candidateCount)
+    sampleOffsets = numpy.append(
+        forwardCrossingTable.sampleOffsets, sampleReadCounts.sum()
+    )
+    sampleKeptCounts = numpy.zeros((len(sampleReadCounts), candidateCount), "int64")
+    for candidate in range(candidateCount):
+        kept = forwardCrossingTable.passingMask(
+            forwardTrimPositions[candidate] - 1, forwardMaxExpectedErrors[candidate]
+        ) & reverseCrossingTable.passingMask(
+            reverseTrimPositions[candidate] - 1, reverseMaxExpectedErrors[candidate]
+        )
+        for sample in range(len(sampleReadCounts)):
+            sampleKeptCounts[sample, candidate] = numpy.count_nonzero(
+                kept[sampleOffsets[sample] : sampleOffsets[sample + 1]]
+            )
+    candidateResults = trimParameterPrediction.TrimParameterResults(
+        forwardTrimPositions,
+        reverseTrimPositions,
+        forwardMaxExpectedErrors,
+        reverseMaxExpectedErrors,
+        sampleKeptCounts.sum(axis=0),
+        int(sampleReadCounts.sum()),
+    )
+    report = trimParameterPrediction.makeSampleInfluenceReport(
+        candidateResults,
+        {None: (forwardCrossingTable, reverseCrossingTable)},
+        sampleNames,
+    )
+    leaveOneOutScores = sampleInfluence.calculateLeaveOneOutScores(
+        sampleKeptCounts,
+        sampleReadCounts,
+        candidateResults.keptReadCounts,
+        -trimParameterPrediction.calculateTrimParameterScore(
+            0, forwardMaxExpectedErrors, reverseMaxExpectedErrors
+        ),
+    )
+    recommendationIndex = candidateResults.getRankedIndices(1)[0]
+    rows = [line.split("\t") for line in report.splitlines()[1:]]
+    assert sorted([row[0] for row in rows]) == sampleNames
+    for row in rows:
+        sample = sampleNames.index(row[0])
+        best = int(numpy.argmax(leaveOneOutScores[sample]))
+        assert row[1:5] == [
+            str(sampleReadCounts[sample]),
+            "%s,%s" % (forwardTrimPositions[best], reverseTrimPositions[best]),
+            "%s,%s" % (forwardMaxExpectedErrors[best], reverseMaxExpectedErrors[best]),
+            "none",
+        ]
+        assert float(row[5]) == pytest.approx(
+            leaveOneOutScores[sample, best]
+            - leaveOneOutScores[sample, recommendationIndex],
+            abs=1e-4,
+        )
+    assert (
+        trimParameterPrediction.makeSampleInfluenceReport(
+            candidateResults,
+            {None: (forwardCrossingTable, reverseCrossingTable)},
+            sampleNames[:1],
+        )
+        is None
+    )
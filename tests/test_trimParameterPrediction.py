@@ -0,0 +1,438 @@
+import numpy
+import pytest
+
+from figaro import fastqAnalysis
+from figaro import fastqHandler
+from figaro import trimParameterPrediction
+
+import syntheticFastq
+
+forwardReadLength = 60
+reverseReadLength = 50
+minimumCombinedReadLength = 80
+
+
+def writeSyntheticRun(directory, sampleReadCounts: tuple = (300, 300), seed: int = 0):
+    """
+    Writes paired fastq files for a small run. The first reads of each file (the ones the read length checks probe) have the full length, and some later ones are shorter.
+    :return: list of (forward reads, reverse reads) for each sample
+    """
+    randomState = numpy.random.RandomState(seed)
+    samples = []
+    for sample, readCount in enumerate(sampleReadCounts):
+        readPairs = []
+        for readLength, fileName in (
+            (forwardReadLength, "sample%s_R1.fastq" % sample),
+            (reverseReadLength, "sample%s_R2.fastq" % sample),
+        ):
+            reads = syntheticFastq.makeRandomReads(
+                randomState, readCount, readLength, nRate=0.002
+            )
+            for read in range(100, readCount, 7):
+                shortLength = randomState.randint(20, readLength)
+                sequence, qualities = reads[read]
+                reads[read] = (sequence[:shortLength], qualities[:shortLength])
+            syntheticFastq.writeFastq(str(directory / fileName), reads)
+            readPairs.append(reads)
+        samples.append(readPairs)
+    return samples
+
+
+def isReadPairKept(forwardRead, reverseRead, trimParameterSet, lite: bool = False):
+    kept = True
+    for (sequence, qualities), trimPosition, maxExpectedError in (
+        (
+            forwardRead,
+            trimParameterSet.forwardTrimPosition,
+            trimParameterSet.forwardMaxExpectedError,
+        ),
+        (
+            reverseRead,
+            trimParameterSet.reverseTrimPosition,
+            trimParameterSet.reverseMaxExpectedError,
+        ),
+    ):
+        if len(sequence) < trimPosition:
+            kept = False
+            continue
+        expectedError = sum(
+            [10 ** (-quality / 10) for quality in qualities[:trimPosition]]
+        )
+        if expectedError > maxExpectedError:
+            kept = False
+        if not lite and (
+            "N" in sequence[:trimPosition] or min(qualities[:trimPosition]) <= 2
+        ):
+            kept = False
+    return kept
+
+
+def countKeptReadPairsByBruteForce(samples: list, trimParameterSet, lite: bool):
+    keptReadPairs = 0
+    readPairCount = 0
+    for forwardReads, reverseReads in samples:
+        for forwardRead, reverseRead in zip(forwardReads, reverseReads):
+            readPairCount += 1
+            keptReadPairs += isReadPairKept(
+                forwardRead, reverseRead, trimParameterSet, lite
+            )
+    return keptReadPairs / readPairCount
+
+
+def calculateSampleRetentionsByBruteForce(
+    samples: list, trimParameterSet, strides: list = None, readLimit: int = 0
+):
+    """
+    :param strides: keep every n-th read pair of each sample, as subsampling does
+    :param readLimit: only use this many of the kept read pairs from each sample (0 for all of them)
+    :return: read retention of each sample
+    """
+    sampleRetentions = []
+    for sample, (forwardReads, reverseReads) in enumerate(samples):
+        stride = strides[sample] if strides else 1
+        readPairs = list(zip(forwardReads, reverseReads))[::stride]
+        if readLimit:
+            readPairs = readPairs[:readLimit]
+        keptReadPairs = sum(
+            [
+                isReadPairKept(forwardRead, reverseRead, trimParameterSet)
+                for forwardRead, reverseRead in readPairs
+            ]
+        )
+        sampleRetentions.append(keptReadPairs / len(readPairs))
+    return sampleRetentions
+
+
+def runAnalysis(directory, **kwargs):
+    resultTable, forwardCurve, reverseCurve = (
+        trimParameterPrediction.performAnalysisForPercentiles(
+            str(directory),
+            minimumCombinedReadLength,
+            subsample=1,
+            percentiles=[83],
+            makeExpectedErrorPlots=False,
+            namingStandardAlias="nononsense",
+            **kwargs
+        )[0]
+    )
+    return resultTable
+
+
+@pytest.mark.parametrize("lite", [False, True])
+def testMatrixAndCrossingTablePathsMatchBruteForce(tmp_path, lite):
+    samples = writeSyntheticRun(tmp_path)
+    crossingTableResults = runAnalysis(tmp_path, lite=lite)
+    matrixResults = runAnalysis(tmp_path, lite=lite, useCrossingTables=False)
+    assert crossingTableResults
+    assert [trimParameterSet.toDict() for trimParameterSet in matrixResults] == [
+        trimParameterSet.toDict() for trimParameterSet in crossingTableResults
+    ]
+    for trimParameterSet in crossingTableResults:
+        assert trimParameterSet.readRetention == pytest.approx(
+            countKeptReadPairsByBruteForce(samples, trimParameterSet, lite)
+        )
+
+
+def truncateAtFirstLowQualityScore(read, truncQ: int):
+    sequence, qualities = read
+    for position, quality in enumerate(qualities):
+        if quality <= truncQ:
+            return sequence[:position], qualities[:position]
+    return read
+
+
+def testTruncQResultsMatchRecountingTruncatedReads(tmp_path):
+    samples = writeSyntheticRun(tmp_path)
+    results = runAnalysis(tmp_path, truncQValues=[2, 11])
+    assert set([trimParameterSet.truncQ for trimParameterSet in results]) == {2, 11}
+    for trimParameterSet in results:
+        truncatedSamples = [
+            [
+                [
+                    truncateAtFirstLowQualityScore(read, trimParameterSet.truncQ)
+                    for read in reads
+                ]
+                for reads in readPairs
+            ]
+            for readPairs in samples
+        ]
+        # what is left of each read is above truncQ, so the brute force Q<=2 check never applies
+        assert trimParameterSet.readRetention == pytest.approx(
+            countKeptReadPairsByBruteForce(truncatedSamples, trimParameterSet, False)
+        )
+
+
+def testMatrixPathRejectsCrossingTableOptions(tmp_path):
+    with pytest.raises(ValueError, match="fullGridSearch, truncQValues"):
+        runAnalysis(
+            tmp_path, useCrossingTables=False, fullGridSearch=True, truncQValues=[2]
+        )
+
+
+def testRankScoresMatchesAFullStableSort():
+    randomState = numpy.random.RandomState(5)
+    scores = randomState.randint(0, 20, 500).astype("float64")
+    fullRanking = numpy.array(
+        sorted(range(len(scores)), key=lambda index: -scores[index])
+    )
+    numpy.testing.assert_array_equal(
+        trimParameterPrediction.rankScores(scores), fullRanking
+    )
+    for count in (1, 7, 50, 499, 500, 600):
+        numpy.testing.assert_array_equal(
+            trimParameterPrediction.rankScores(scores, count), fullRanking[:count]
+        )
+
+
+def testSingleEndResultsRankLikeSortedTrimParameterSets():
+    randomState = numpy.random.RandomState(6)
+    candidateCount = 200
+    singleEndResults = trimParameterPrediction.SingleEndTrimParameterResults(
+        numpy.arange(candidateCount) + 50,
+        randomState.randint(1, 4, candidateCount),
+        randomState.randint(0, 1000, candidateCount),
+        1000,
+    )
+    trimParameterSets = singleEndResults.makeTrimParameterSets(range(candidateCount))
+    trimParameterSets.sort(key=lambda trimParameterSet: -trimParameterSet.score)
+    expected = [trimParameterSet.toDict() for trimParameterSet in trimParameterSets]
+    assert [
+        trimParameterSet.toDict()
+        for trimParameterSet in singleEndResults.makeRankedTrimParameterSets()
+    ] == expected
+    assert [
+        trimParameterSet.toDict()
+        for trimParameterSet in singleEndResults.makeRankedTrimParameterSets(10)
+    ] == expected[:10]
+
+
+def testSingleEndResultsWithoutReadsReportZeroRetention():
+    singleEndResults = trimParameterPrediction.SingleEndTrimParameterResults(
+        [120, 130], [1, 2], [0, 0], 0
+    )
+    trimParameterSets = singleEndResults.makeRankedTrimParameterSets()
+    assert len(trimParameterSets) == 2
+    for trimParameterSet in trimParameterSets:
+        assert trimParameterSet.readRetention == 0
+
+
+def testParetoFrontMatchesBruteForce():
+    randomState = numpy.random.RandomState(7)
+    candidateCount = 400
+    results = trimParameterPrediction.TrimParameterResults(
+        randomState.randint(100, 130, candidateCount),
+        randomState.randint(100, 130, candidateCount),
+        randomState.randint(1, 4, candidateCount),
+        randomState.randint(1, 4, candidateCount),
+        randomState.randint(0, 50, candidateCount),
+        50,
+    )
+    retention = results.keptReadCounts
+    totalMaxExpectedErrors = (
+        results.forwardMaxExpectedErrors + results.reverseMaxExpectedErrors
+    )
+    combinedLengths = results.forwardTrimPositions + results.reverseTrimPositions
+    expectedFront = []
+    for candidate in range(candidateCount):
+        noWorse = (
+            (retention >= retention[candidate])
+            & (totalMaxExpectedErrors <= totalMaxExpectedErrors[candidate])
+            & (combinedLengths >= combinedLengths[candidate])
+        )
+        better = (
+            (retention > retention[candidate])
+            | (totalMaxExpectedErrors < totalMaxExpectedErrors[candidate])
+            | (combinedLengths > combinedLengths[candidate])
+        )
+        if not (noWorse & better).any():
+            expectedFront.append(candidate)
+    front = results.getParetoFrontIndices()
+    assert sorted(front.tolist()) == expectedFront
+    assert list(front) == sorted(front, key=lambda index: -results.scores[index])
+
+
+def testResultsWithoutReadsReportZeroRetention():
+    results = trimParameterPrediction.TrimParameterResults(
+        [120, 125], [110, 100], [2, 1], [2, 3], [0, 0], 0
+    )
+    trimParameterSets = results.makeRankedTrimParameterSets()
+    assert len(trimParameterSets) == 2
+    for trimParameterSet in trimParameterSets:
+        assert trimParameterSet.readRetention == 0
+
+
+def testEqualSampleWeightsAverageTheSampleRetentions(tmp_path):
+    samples = writeSyntheticRun(tmp_path, (300, 900))
+    resultTable = runAnalysis(tmp_path, equalSampleWeights=True, retentionPrecision=0)
+    for trimParameterSet in resultTable:
+        assert trimParameterSet.readRetention == pytest.approx(
+            numpy.mean(calculateSampleRetentionsByBruteForce(samples, trimParameterSet))
+        )
+
+
+def testSampleReadLimitIsSpreadAcrossEachSample(tmp_path):
+    samples = writeSyntheticRun(tmp_path, (300, 900))
+    # a 5 point standard error needs 100 reads from each sample
+    readLimit = 100
+    strides = [
+        fastqHandler.findSpreadSubsample(
+            str(tmp_path / ("sample%s_R1.fastq" % sample)), readLimit
+        )
+        for sample in range(len(samples))
+    ]
+    # estimated read counts are only approximate, but the reads should still be spread out
+    assert strides[0] > 1 and strides[1] > strides[0]
+    resultTable = runAnalysis(tmp_path, equalSampleWeights=True, retentionPrecision=5)
+    for trimParameterSet in resultTable:
+        assert trimParameterSet.readRetention == pytest.approx(
+            numpy.mean(
+                calculateSampleRetentionsByBruteForce(
+                    samples, trimParameterSet, strides, readLimit
+                )
+            )
+        )
+
+
+def makeRandomCrossingTable(
+    randomState: numpy.random.RandomState, maxLevel: int, readCount: int, length: int
+):
+    # crossings can only grow with the level
+    crossings = numpy.sort(
+        randomState.randint(0, length + 5, (maxLevel, readCount)), axis=0
+    ).astype("uint16")
+    return fastqAnalysis.ExpectedErrorCrossingTable(crossings)
+
+
+def testRetentionSurfaceMatchesBruteForce():
+    randomState = numpy.random.RandomState(0)
+    forwardCrossings = randomState.randint(0, 45, 500)
+    reverseCrossings = randomState.randint(0, 35, 500)
+    readWeights = randomState.uniform(0, 3, 500)
+    surface = trimParameterPrediction.calculateRetentionSurface(
+        forwardCrossings, reverseCrossings, 40, 30
+    )
+    weightedSurface = trimParameterPrediction.calculateRetentionSurface(
+        forwardCrossings, reverseCrossings, 40, 30, readWeights
+    )
+    assert surface.shape == (40, 30)
+    for forwardPosition in range(40):
+        for reversePosition in range(30):
+            kept = (forwardCrossings > forwardPosition) & (
+                reverseCrossings > reversePosition
+            )
+            assert surface[forwardPosition, reversePosition] == kept.sum()
+            assert weightedSurface[forwardPosition, reversePosition] == pytest.approx(
+                readWeights[kept].sum()
+            )
+
+
+def testCountReadsOnRetentionSurfacesMatchesBruteForce():
+    randomState = numpy.random.RandomState(1)
+    forwardTable = makeRandomCrossingTable(randomState, 4, 300, 40)
+    reverseTable = makeRandomCrossingTable(randomState, 4, 320, 30)
+    forwardTrimPositions = randomState.randint(0, 40, 12)
+    reverseTrimPositions = randomState.randint(0, 30, 9)
+    forwardMaxExpectedErrors = randomState.randint(1, 5, 12)
+    reverseMaxExpectedErrors = randomState.randint(1, 5, 9)
+    keptReadCounts = trimParameterPrediction.countReadsOnRetentionSurfaces(
+        forwardTable,
+        reverseTable,
+        forwardTrimPositions,
+        reverseTrimPositions,
+        forwardMaxExpectedErrors,
+        reverseMaxExpectedErrors,
+    )
+    # reads past the end of the shorter table have no mate
+    readCount = 300
+    for forwardIndex, forwardPosition in enumerate(forwardTrimPositions):
+        forwardPassing = forwardTable.passingMask(
+            forwardPosition, forwardMaxExpectedErrors[forwardIndex]
+        )
+        for reverseIndex, reversePosition in enumerate(reverseTrimPositions):
+            reversePassing = reverseTable.passingMask(
+                reversePosition, reverseMaxExpectedErrors[reverseIndex]
+            )[:readCount]
+            assert keptReadCounts[forwardIndex, reverseIndex] == numpy.count_nonzero(
+                forwardPassing & reversePassing
+            )
+
+
+def testBestMaxExpectedErrorPairsMatchBruteForce():
+    randomState = numpy.random.RandomState(2)
+    forwardTable = makeRandomCrossingTable(randomState, 5, 400, 40)
+    reverseTable = makeRandomCrossingTable(randomState, 5, 400, 30)
+    forwardTrimPositions = randomState.randint(0, 40, 25)
+    reverseTrimPositions = randomState.randint(0, 30, 25)
+    bestForward, bestReverse, bestKeptReadCounts = (
+        trimParameterPrediction.findBestMaxExpectedErrorPairs(
+            forwardTable,
+            reverseTable,
+            forwardTrimPositions,
+            reverseTrimPositions,
+            [3, 1, 2, 5],
+            [4, 2, 1],
+        )
+    )
+    for candidate in range(25):
+        bestScore = None
+        for forwardMaxExpectedError in [1, 2, 3, 5]:
+            for reverseMaxExpectedError in [1, 2, 4]:
+                keptReadCount = numpy.count_nonzero(
+                    forwardTable.passingMask(
+                        forwardTrimPositions[candidate], forwardMaxExpectedError
+                    )
+                    & reverseTable.passingMask(
+                        reverseTrimPositions[candidate], reverseMaxExpectedError
+                    )
+                )
+                score = trimParameterPrediction.calculateTrimParameterScore(
+                    keptReadCount / 400,
+                    forwardMaxExpectedError,
+                    reverseMaxExpectedError,
+                )
+                # ties go to the lowest max expected errors
+                if bestScore is None or score > bestScore:
+                    bestScore = score
+                    expected = (
+                        forwardMaxExpectedError,
+                        reverseMaxExpectedError,
+                        keptReadCount,
+                    )
+        assert (
+            bestForward[candidate],
+            bestReverse[candidate],
+            bestKeptReadCounts[candidate],
+        ) == expected
+
+
+def testRetentionCurveMatchesBruteForce():
+    randomState = numpy.random.RandomState(3)
+    crossings = randomState.randint(0, 55, 500)
+    readWeights = randomState.uniform(0, 3, 500)
+    curve = trimParameterPrediction.calculateRetentionCurve(crossings, 50)
+    weightedCurve = trimParameterPrediction.calculateRetentionCurve(
+        crossings, 50, readWeights
+    )
+    assert len(curve) == 50
+    for position in range(50):
+        assert curve[position] == numpy.count_nonzero(crossings > position)
+        assert weightedCurve[position] == pytest.approx(
+            readWeights[crossings > position].sum()
+        )
+
+
+@pytest.mark.parametrize(
+    "primerLength, consistent",
+    [(20, True), (19, True), (22, True), (30, False), (15, False), (0, False)],
+)
+def testPrimerLengthCheckWarnsOnMismatches(caplog, primerLength, consistent):
+    with caplog.at_level("WARNING", logger=trimParameterPrediction.logger.name):
+        assert (
+            trimParameterPrediction.checkPrimerLength(
+                [19, 20, 21], primerLength, "forward"
+            )
+            == consistent
+        )
+    assert bool(caplog.records) != consistent
+    if not consistent:
+        assert caplog.records[0].message.startswith("Forward reads")